@@ -6,6 +6,8 @@
 访问地址: http://localhost:3000
 """
 
+import http.client
+import http.cookiejar
 import http.server
 import json
 import os
@@ -13,21 +15,49 @@ import uuid
 from datetime import datetime, timezone
 from urllib.parse import urlparse, parse_qs
 import socketserver
+import socket
+import selectors
+import queue
 import urllib.request
 import urllib.error
 import urllib.parse
 import concurrent.futures
+import multiprocessing
+import contextlib
+import copy
 import re
 import html as html_lib
+from html.parser import HTMLParser
+import codecs
+import signal
+import sys
 import threading
+import time
+import zlib
+import sqlite3
+import functools
+import base64
+import bisect
+import heapq
+import math
+import gzip
+import hashlib
+import mimetypes
+import email.utils
+from collections import Counter, OrderedDict, deque
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 try:
     import psycopg2
+    import psycopg2.extensions
 except ImportError:
     psycopg2 = None
 
 SEARCH_USER_AGENT = 'ReadingClubApp/1.0 (+https://openlibrary.org)'
-DOUBAN_CACHE = {}
 
 PORT = int(os.environ.get('PORT', 3000))
 DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
@@ -35,24 +65,148 @@ DATA_FILE = os.path.join(DATA_DIR, 'books.json')
 PUBLIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public')
 DATABASE_URL = os.environ.get('DATABASE_URL', '').strip()
 USE_POSTGRES = bool(DATABASE_URL)
+PG_POOL_SIZE = int(os.environ.get('PG_POOL_SIZE', '8'))
+PG_POOL_IDLE_TIMEOUT = float(os.environ.get('PG_POOL_IDLE_TIMEOUT', '300'))
+PG_POOL_TIMEOUT = float(os.environ.get('PG_POOL_TIMEOUT', '10'))
 DATA_LOCK = threading.Lock()
+STORE_REFRESH_INTERVAL = float(os.environ.get('STORE_REFRESH_INTERVAL', '1.0'))
+DATA_STORAGE = os.environ.get('DATA_STORAGE', 'file').strip().lower()
+JOURNAL_FILE = os.path.join(DATA_DIR, 'books.journal')
+JOURNAL_FSYNC = os.environ.get('JOURNAL_FSYNC', '').strip() in ('1', 'true', 'yes')
+JOURNAL_COMPACT_INTERVAL = float(os.environ.get('JOURNAL_COMPACT_INTERVAL', '30'))
+JOURNAL_COMPACT_BYTES = int(os.environ.get('JOURNAL_COMPACT_BYTES', str(4 * 1024 * 1024)))
 DOUBAN_COOKIE = os.environ.get('DOUBAN_COOKIE', '').strip()
+# 增量同步变更日志每个群组保留的条目数
+CHANGE_LOG_SIZE = int(os.environ.get('CHANGE_LOG_SIZE', '500'))
+# 物化视图一致性检查间隔（秒），0 表示不检查
+VIEW_CHECK_INTERVAL = float(os.environ.get('VIEW_CHECK_INTERVAL', '3600'))
+# 全文检索：书籍文档中各字段的词频权重
+SEARCH_FIELD_WEIGHTS = {'title': 3, 'author': 2, 'synopsis': 1}
+# /api/books 分页：每页最多返回的书籍数
+BOOKS_PAGE_MAX = int(os.environ.get('BOOKS_PAGE_MAX', '200'))
+# 开发模式：静态文件修改后自动重新加载
+STATIC_DEV = os.environ.get('STATIC_DEV', '').strip().lower() in ('1', 'true', 'yes')
+# SSE 推送：每个群组补发缓冲的事件数、单连接最大待发字节数、心跳间隔（秒）、订阅连接上限
+SSE_BACKLOG = 256
+SSE_MAX_BUFFER = 256 * 1024
+SSE_HEARTBEAT = 15
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', '1000'))
+# threaded 引擎下每个订阅连接要占住一个处理线程，单独限制并发订阅数
+SSE_THREADED_MAX_SUBSCRIBERS = int(os.environ.get('SSE_THREADED_MAX_SUBSCRIBERS', '32'))
+# 服务引擎：threaded（每个连接一个线程）或 pool（固定线程池，支持长连接）
+SERVER_ENGINE = os.environ.get('SERVER_ENGINE', 'threaded').strip().lower()
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '16'))
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', '8'))
+SERVER_QUEUE_SIZE = int(os.environ.get('SERVER_QUEUE_SIZE', '64'))
+SERVER_BACKLOG = int(os.environ.get('SERVER_BACKLOG', '128'))
+REQUEST_TIMEOUT = 30
+KEEPALIVE_TIMEOUT = 15
+MAX_IDLE_CONNECTIONS = 512
+# 单次豆瓣查询的总时限（秒），到期时返回已获取到的最佳结果
+DOUBAN_DEADLINE = float(os.environ.get('DOUBAN_DEADLINE', '12'))
+DOUBAN_CONCURRENCY = int(os.environ.get('DOUBAN_CONCURRENCY', '8'))
+# 一次搜索（候选获取 + 元数据补充）的总时限（秒）
+ENRICH_BUDGET = float(os.environ.get('ENRICH_BUDGET', '15'))
+LOOKUP_CONCURRENCY = int(os.environ.get('LOOKUP_CONCURRENCY', '16'))
+# 书名、作者归一化结果的 LRU 缓存条数；超过 NORMALIZE_CACHE_MAX_LEN 字符的文本不缓存
+NORMALIZE_CACHE_SIZE = int(os.environ.get('NORMALIZE_CACHE_SIZE', '20000'))
+NORMALIZE_CACHE_MAX_LEN = 200
+# 书名联想：本地命中不少于该数量时不再查询外部来源；外部联想的总时限（秒）
+SUGGEST_LOCAL_MIN = int(os.environ.get('SUGGEST_LOCAL_MIN', '5'))
+SUGGEST_DEADLINE = float(os.environ.get('SUGGEST_DEADLINE', '2.5'))
+# 本地联想中保留的外部来源书名数，超出时淘汰最久未更新的
+RESOLVED_TITLES_SIZE = int(os.environ.get('RESOLVED_TITLES_SIZE', '20000'))
+# 解析、清洗与打分使用的子进程数，0 为关闭（在请求线程内执行）；单个任务最长等待秒数
+CPU_POOL_WORKERS = int(os.environ.get('CPU_POOL_WORKERS', '0'))
+CPU_POOL_TIMEOUT = float(os.environ.get('CPU_POOL_TIMEOUT', '10'))
+# 各外部来源每秒最多发起的请求数，可用 SOURCE_RATE_LIMITS=douban=2,openlibrary=5 覆盖
+SOURCE_RATE_LIMITS = {
+    'douban': 4,
+    'openlibrary': 8,
+    'googlebooks': 8,
+    'gutendex': 4,
+}
+SOURCE_HOSTS = [
+    ('douban.com', 'douban'),
+    ('openlibrary.org', 'openlibrary'),
+    ('googleapis.com', 'googlebooks'),
+    ('gutendex.com', 'gutendex'),
+]
+# 每个外部主机同时进行的请求数上限（连接池按主机复用长连接）
+UPSTREAM_HOST_CONCURRENCY = int(os.environ.get('UPSTREAM_HOST_CONCURRENCY', '6'))
+# 熔断：连续失败次数阈值与初始冷却秒数（半开探测失败后冷却时间加倍）
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_COOLDOWN = float(os.environ.get('CIRCUIT_COOLDOWN', '30'))
+CIRCUIT_MAX_COOLDOWN = 300
+IMPORT_JOB_DIR = os.path.join(DATA_DIR, 'import_jobs')
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', '4'))
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '10'))
+IMPORT_JOB_RETENTION = 7 * 86400
+LOOKUP_CACHE_FILE = os.environ.get('LOOKUP_CACHE_FILE', os.path.join(DATA_DIR, 'lookup_cache.sqlite3')).strip()
+LOOKUP_CACHE_SIZE = int(os.environ.get('LOOKUP_CACHE_SIZE', '2000'))
+LOOKUP_CACHE_DISK_ROWS = int(os.environ.get('LOOKUP_CACHE_DISK_ROWS', '50000'))
+LOOKUP_CACHE_MISS_TTL = 3600
+LOOKUP_CACHE_ERROR_TTL = 120
+# 各来源的缓存有效期（秒）
+LOOKUP_CACHE_TTLS = {
+    'douban': 7 * 86400,
+    'openlibrary': 3 * 86400,
+    'openlibrary.best': 3 * 86400,
+    'openlibrary.work': 30 * 86400,
+    'googlebooks': 3 * 86400,
+    'googlebooks.best': 3 * 86400,
+    'gutendex': 7 * 86400,
+    'suggest.openlibrary': 86400,
+    'suggest.googlebooks': 86400,
+}
+
+
+WHITESPACE_RE = re.compile(r'\s+')
+NON_WORD_RE = re.compile(r'[^\w\u4e00-\u9fff]+')
+
+
+def _normalize(text):
+    norm = WHITESPACE_RE.sub(' ', text.strip().lower())
+    return norm, NON_WORD_RE.sub('', norm)
+
+
+# 书名、作者等短文本反复出现（同一查询对比每个候选、批量导入重复比较），结果放进有界 LRU
+_normalize_cached = functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)(_normalize)
+
+
+def normalized(value):
+    """返回 (normalize_text, normalize_match_token)；长文本（简介、书评）不进缓存"""
+    text = str(value or '')
+    if len(text) > NORMALIZE_CACHE_MAX_LEN:
+        return _normalize(text)
+    return _normalize_cached(text)
 
 
 def normalize_text(value):
-    text = str(value or '').strip().lower()
-    text = re.sub(r'\s+', ' ', text)
-    return text
+    return normalized(value)[0]
 
 
 def normalize_match_token(value):
-    text = normalize_text(value)
-    return re.sub(r'[^\w\u4e00-\u9fff]+', '', text)
+    return normalized(value)[1]
+
+
+SEARCH_TOKEN_RE = re.compile(r'[\u4e00-\u9fff]+|[^\W_\u4e00-\u9fff]+')
+
+
+def search_tokens(value):
+    """全文检索分词：中文按相邻两字切分（单字保留原字），其它文字按词切分"""
+    tokens = []
+    for run in SEARCH_TOKEN_RE.findall(normalize_text(value)):
+        if '\u4e00' <= run[0] <= '\u9fff' and len(run) > 1:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
 
 
 def normalize_key(title, author):
-    raw = f"{normalize_text(title)}|{normalize_text(author)}"
-    return re.sub(r'[^\w\u4e00-\u9fff]+', '', raw)
+    # 逐字符删除，与对 "书名|作者" 整体替换的结果相同
+    return normalized(title)[1] + normalized(author)[1]
 
 
 def is_reasonable_cjk_title_override(query_title, candidate_title):
@@ -88,50 +242,68 @@ def to_float(value):
         return None
 
 
-def score_match(query_title, query_author, candidate_title, candidate_author):
-    title_q = normalize_text(query_title)
-    author_q = normalize_text(query_author)
-    title_c = normalize_text(candidate_title)
-    author_c = normalize_text(candidate_author)
-    title_q_key = normalize_match_token(query_title)
-    author_q_key = normalize_match_token(query_author)
-    title_c_key = normalize_match_token(candidate_title)
-    author_c_key = normalize_match_token(candidate_author)
-
-    score = 0
-    if title_q:
-        if title_c == title_q:
-            score += 85
-        elif title_c.startswith(title_q):
-            score += 55
-        elif title_q in title_c:
-            score += 35
-
-    if title_q_key and title_c_key:
-        if title_c_key == title_q_key:
-            score += 35
-        elif title_c_key.startswith(title_q_key):
-            score += 22
-        elif title_q_key in title_c_key:
-            score += 14
-
-    if author_q:
-        if author_c == author_q:
-            score += 35
-        elif author_c.startswith(author_q):
-            score += 22
-        elif author_q in author_c:
-            score += 15
-
-    if author_q_key and author_c_key:
-        if author_c_key == author_q_key:
-            score += 12
-        elif author_c_key.startswith(author_q_key):
-            score += 8
-        elif author_q_key in author_c_key:
-            score += 5
+class QueryFeatures:
+    """归一化一次的查询书名与作者，用来给一批候选打分"""
+
+    __slots__ = ('title', 'author', 'title_key', 'author_key')
+
+    def __init__(self, title, author=''):
+        self.title, self.title_key = normalized(title)
+        self.author, self.author_key = normalized(author)
+
+    def score(self, candidate_title, candidate_author):
+        title_c, title_c_key = normalized(candidate_title)
+        author_c, author_c_key = normalized(candidate_author)
+        title_q, title_q_key = self.title, self.title_key
+        author_q, author_q_key = self.author, self.author_key
+
+        score = 0
+        if title_q:
+            if title_c == title_q:
+                score += 85
+            elif title_c.startswith(title_q):
+                score += 55
+            elif title_q in title_c:
+                score += 35
+
+        if title_q_key and title_c_key:
+            if title_c_key == title_q_key:
+                score += 35
+            elif title_c_key.startswith(title_q_key):
+                score += 22
+            elif title_q_key in title_c_key:
+                score += 14
+
+        if author_q:
+            if author_c == author_q:
+                score += 35
+            elif author_c.startswith(author_q):
+                score += 22
+            elif author_q in author_c:
+                score += 15
+
+        if author_q_key and author_c_key:
+            if author_c_key == author_q_key:
+                score += 12
+            elif author_c_key.startswith(author_q_key):
+                score += 8
+            elif author_q_key in author_c_key:
+                score += 5
+
+        return score
+
+    def score_batch(self, candidates):
+        """candidates 为 (书名, 作者) 序列，返回对应的分数列表"""
+        return [self.score(title, author) for title, author in candidates]
+
+
+@functools.lru_cache(maxsize=256)
+def query_features(title, author=''):
+    return QueryFeatures(title, author)
 
-    return score
+
+def score_match(query_title, query_author, candidate_title, candidate_author):
+    return query_features(str(query_title or ''), str(query_author or '')).score(candidate_title, candidate_author)
 
 
 def merge_resources(resources):
@@ -195,159 +367,1312 @@ def clean_html_text(raw_html):
     text = re.sub(r'<br\s*/?>', '\n', raw_html, flags=re.I)
     text = re.sub(r'</p\s*>', '\n', text, flags=re.I)
     text = re.sub(r'<[^>]+>', '', text)
-    text = html_lib.unescape(text)
+    return collapse_text(html_lib.unescape(text))
+
+
+def collapse_text(text):
+    """合并连续空白与空行"""
     text = re.sub(r'[ \t\r\f\v]+', ' ', text)
-    text = re.sub(r'\n+', '\n', text).strip()
-    return text
+    return re.sub(r'\n+', '\n', text).strip()
 
 
-def fetch_douban_best_metadata(title, author=''):
-    cache_key = normalize_key(title, author)
-    cached = DOUBAN_CACHE.get(cache_key)
-    if cached:
-        return cached
+class UpstreamLookupError(Exception):
+    """外部数据源查询失败（可能来自负缓存）"""
 
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0 Safari/537.36',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Referer': 'https://book.douban.com/'
-        }
-        if DOUBAN_COOKIE:
-            headers['Cookie'] = DOUBAN_COOKIE
-
-        def fetch_text(url, timeout=8):
-            req = urllib.request.Request(url, headers=headers)
-            return urllib.request.urlopen(req, timeout=timeout).read().decode('utf-8', 'ignore')
-
-        def collect_subject_ids(page_html):
-            ids = []
-            patterns = [
-                r'book\.douban\.com/subject/(\d+)',
-                r'/book/subject/(\d+)',
-                r'"subject/(\d+)"',
-                r'\\u002Fsubject\\u002F(\d+)'
-            ]
-            for pattern in patterns:
-                for sid in re.findall(pattern, page_html or ''):
-                    if sid not in ids:
-                        ids.append(sid)
-            return ids
-
-        query_terms = []
-        for raw_q in [f"{title} {author}".strip(), str(title or '').strip()]:
-            if raw_q and raw_q not in query_terms:
-                query_terms.append(raw_q)
-
-        unique_ids = []
-
-        # 第一优先：建议接口，通常比页面结构解析更稳定
-        for raw_q in query_terms:
-            suggest_q = urllib.parse.quote(raw_q)
-            suggest_url = f"https://book.douban.com/j/subject_suggest?q={suggest_q}"
-            try:
-                suggest_data = json.loads(fetch_text(suggest_url, timeout=8))
-                for item in (suggest_data or [])[:12]:
-                    sid = str(item.get('id', '')).strip()
-                    if sid.isdigit() and sid not in unique_ids:
-                        unique_ids.append(sid)
-            except Exception:
+
+class UpstreamSkipped(UpstreamLookupError):
+    """请求没有发出（本地限速、并发已满或来源熔断），不计入负缓存"""
+
+
+class UpstreamRateLimited(UpstreamSkipped):
+    """本地限速拒绝了请求"""
+
+
+class SourceCircuitOpen(UpstreamSkipped):
+    """来源近期连续失败，暂时不再请求"""
+
+
+class RateLimiter:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 burst 个"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout):
+        """取一个令牌，必要时等待；timeout 内拿不到返回 False"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+            if wait > timeout:
+                self._tokens += 1
+                return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+
+def _parse_rate_limits(raw):
+    limits = dict(SOURCE_RATE_LIMITS)
+    for part in raw.split(','):
+        name, _, value = part.partition('=')
+        try:
+            limits[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return limits
+
+
+SOURCE_LIMITERS = {
+    source: RateLimiter(rate, rate * 2)
+    for source, rate in _parse_rate_limits(os.environ.get('SOURCE_RATE_LIMITS', '')).items()
+    if rate > 0
+}
+
+
+class SingleFlight:
+    """相同键的并发调用只执行一次，其余调用等待并拿到同一结果的副本；执行出错时
+    每个等待者各自抛出一个同类型的新异常（以原异常为 __cause__），互不共享回溯。
+
+    KeyboardInterrupt 等非 Exception 异常只属于执行者的线程，等待者会重新发起调用。
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {
+                    'event': threading.Event(), 'waiters': 0, 'result': None, 'error': None, 'aborted': False
+                }
+            else:
+                call['waiters'] += 1
+
+        if not leader:
+            call['event'].wait()
+            if call['aborted']:
+                return self.do(key, fn, *args)
+            if call['error'] is not None:
+                raise self._fresh_error(call['error']) from call['error']
+            return copy.deepcopy(call['result'])
+
+        result = None
+        try:
+            result = fn(*args)
+            return result
+        except Exception as e:
+            call['error'] = e
+            raise
+        except BaseException:
+            call['aborted'] = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            # 调用方可能修改返回值，等待者拿到的是返回前的快照
+            if call['waiters'] and call['error'] is None and not call['aborted']:
+                call['result'] = copy.deepcopy(result)
+            call['event'].set()
+
+    @staticmethod
+    def _fresh_error(error):
+        """与 error 同类型、同参数与属性的新异常对象，调用方按类型捕获的逻辑不受影响"""
+        cls = type(error)
+        try:
+            fresh = cls.__new__(cls, *error.args)
+            fresh.__dict__.update(error.__dict__)
+        except Exception:
+            fresh = RuntimeError(str(error))
+        return fresh
+
+
+INFLIGHT = SingleFlight()
+
+
+def source_for_url(url):
+    host = urlparse(url).hostname or ''
+    for domain, source in SOURCE_HOSTS:
+        if host == domain or host.endswith('.' + domain):
+            return source
+    return ''
+
+
+def rate_limit(source, timeout):
+    limiter = SOURCE_LIMITERS.get(source)
+    if limiter and not limiter.acquire(timeout):
+        raise UpstreamRateLimited(f'{source} 请求过于频繁')
+
+
+class UpstreamHTTPError(UpstreamLookupError):
+    def __init__(self, status, url):
+        super().__init__(f'HTTP {status}: {url}')
+        self.status = status
+
+
+class UpstreamClient:
+    """外部数据源共用的 HTTP 客户端。
+
+    按主机保持长连接池（空闲超过 idle_timeout 秒的连接丢弃），并用信号量限制
+    每个主机的并发请求数；请求 gzip/deflate 压缩并边读边解压；跟随重定向；
+    use_cookies=True 的请求共用一个 Cookie jar（豆瓣会用 Cookie 判断是否为正常访问）。
+    """
+
+    MAX_REDIRECTS = 5
+    MAX_BODY = 8 * 1024 * 1024
+
+    def __init__(self, per_host, idle_timeout=60):
+        self.per_host = max(1, per_host)
+        self.idle_timeout = idle_timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self._idle = {}
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, origin):
+        with self._lock:
+            sem = self._semaphores.get(origin)
+            if sem is None:
+                sem = self._semaphores[origin] = threading.BoundedSemaphore(self.per_host)
+            return sem
+
+    def _checkout(self, origin, timeout):
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(origin) or []
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self.idle_timeout:
+                    conn.timeout = timeout
+                    if conn.sock is not None:
+                        conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+        return self._connect(origin, timeout), False
+
+    def _connect(self, origin, timeout):
+        scheme, host = origin
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, timeout=timeout)
+        return http.client.HTTPConnection(host, timeout=timeout)
+
+    def _checkin(self, origin, conn):
+        with self._lock:
+            self._idle.setdefault(origin, []).append((conn, time.monotonic()))
+
+    def get(self, url, headers=None, timeout=8, use_cookies=False, sink=None):
+        """GET 请求，返回解压后的响应体（bytes）；状态码 >= 400 时抛出 UpstreamHTTPError。
+
+        给出 sink 时，成功响应的正文边解压边交给 sink(chunk)，只返回开头一段用于检查；
+        sink 返回 True 表示已经拿到需要的内容，此时停止读取并关闭该连接。
+        """
+        for _ in range(self.MAX_REDIRECTS + 1):
+            status, location, body = self._get_once(url, headers or {}, timeout, use_cookies, sink)
+            if status in (301, 302, 303, 307, 308) and location:
+                url = urllib.parse.urljoin(url, location)
                 continue
+            if status >= 400:
+                raise UpstreamHTTPError(status, url)
+            return body
+        raise UpstreamLookupError(f'重定向次数过多: {url}')
+
+    def _get_once(self, url, headers, timeout, use_cookies, sink=None):
+        parts = urllib.parse.urlsplit(url)
+        origin = (parts.scheme, parts.netloc)
+        target = parts.path or '/'
+        if parts.query:
+            target += f'?{parts.query}'
+
+        request_headers = dict(headers)
+        request_headers['Accept-Encoding'] = 'gzip, deflate'
+        cookie_request = None
+        if use_cookies:
+            cookie_request = urllib.request.Request(url)
+            self.cookies.add_cookie_header(cookie_request)
+            jar_cookie = cookie_request.get_header('Cookie')
+            if jar_cookie:
+                preset = request_headers.get('Cookie')
+                request_headers['Cookie'] = f'{preset}; {jar_cookie}' if preset else jar_cookie
+
+        sem = self._semaphore(origin)
+        if not sem.acquire(timeout=timeout):
+            raise UpstreamSkipped(f'{parts.netloc} 并发请求已满')
+        try:
+            conn, reused = self._checkout(origin, timeout)
+            try:
+                conn.request('GET', target, headers=request_headers)
+                response = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                # 复用的连接已被对端关闭，换新连接重试一次
+                conn = self._connect(origin, timeout)
+                conn.request('GET', target, headers=request_headers)
+                response = conn.getresponse()
 
-        # 第二优先：移动端搜索页解析
-        for raw_q in query_terms:
-            if len(unique_ids) >= 5:
+            try:
+                body, complete = self._read_body(response, sink if 200 <= response.status < 300 else None)
+            except Exception:
+                conn.close()
+                raise
+            if cookie_request is not None:
+                self.cookies.extract_cookies(response, cookie_request)
+            if response.will_close or not complete:
+                # 提前结束读取时连接上还有未读的数据，不能复用
+                conn.close()
+            else:
+                self._checkin(origin, conn)
+            return response.status, response.getheader('Location'), body
+        finally:
+            sem.release()
+
+    HEAD_SIZE = 4096
+
+    def _read_body(self, response, sink=None):
+        """返回 (正文, 是否读完)；有 sink 时正文只保留开头 HEAD_SIZE 字节"""
+        encoding = (response.getheader('Content-Encoding') or '').strip().lower()
+        decoder = None
+        if encoding == 'gzip':
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            decoder = zlib.decompressobj()
+
+        chunks = []
+        size = 0
+        # 有 sink 时收到多少处理多少，不等凑满整块，才能尽早判断是否可以结束
+        read = response.read1 if sink is not None else response.read
+        while True:
+            chunk = read(65536)
+            if not chunk:
                 break
-            query = urllib.parse.quote(raw_q)
-            for m_type in ['1001', 'book']:
+            if decoder is not None:
                 try:
-                    search_url = f"https://m.douban.com/search/?query={query}&type={m_type}"
-                    search_html = fetch_text(search_url, timeout=8)
-                    for sid in collect_subject_ids(search_html):
-                        if sid not in unique_ids:
-                            unique_ids.append(sid)
-                    if len(unique_ids) >= 5:
-                        break
-                except Exception:
-                    continue
+                    chunk = decoder.decompress(chunk)
+                except zlib.error:
+                    # 部分服务端的 deflate 不带 zlib 头
+                    if encoding != 'deflate' or size:
+                        raise
+                    decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+                    chunk = decoder.decompress(chunk)
+            size += len(chunk)
+            if size > self.MAX_BODY:
+                raise UpstreamLookupError('响应体过大')
+            if sink is None:
+                chunks.append(chunk)
+                continue
+            if size - len(chunk) < self.HEAD_SIZE:
+                chunks.append(chunk[:self.HEAD_SIZE - (size - len(chunk))])
+            if sink(chunk):
+                return b''.join(chunks), False
+        if decoder is not None:
+            tail = decoder.flush()
+            if sink is None:
+                chunks.append(tail)
+            elif tail:
+                sink(tail)
+        return b''.join(chunks), True
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn, _ in conns:
+                conn.close()
+
+
+UPSTREAM_HTTP = UpstreamClient(UPSTREAM_HOST_CONCURRENCY)
+
+
+class SourceHealth:
+    """单个外部来源的健康状态与熔断器。
+
+    closed：正常请求；连续失败 CIRCUIT_FAILURE_THRESHOLD 次，或最近 20 次中失败过半时进入 open，
+    冷却期内直接拒绝；冷却结束后进入 half_open，只放行一个探测请求，成功则恢复，
+    失败则重新打开并加倍冷却时间（最长 CIRCUIT_MAX_COOLDOWN 秒）。
+    超时按最近成功请求耗时的 p95 自适应：p95 × 2 + 1 秒，介于 2 秒与调用方给定的超时之间。
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = 'closed'
+        self.failures = 0
+        self.cooldown = CIRCUIT_COOLDOWN
+        self.opened_at = 0
+        self.probing = False
+        self.latencies = deque(maxlen=50)
+        self.outcomes = deque(maxlen=20)
+        self._lock = threading.Lock()
+
+    def available(self):
+        """不占用探测名额的检查，用于决定是否值得发起查询"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at >= self.cooldown
+            return not self.probing
+
+    def check(self):
+        """发出请求前调用；熔断中抛出 SourceCircuitOpen"""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self.probing = False
+            if self.state == 'open' or (self.state == 'half_open' and self.probing):
+                raise SourceCircuitOpen(f'{self.name} 暂时不可用')
+            if self.state == 'half_open':
+                self.probing = True
+
+    def timeout(self, default):
+        with self._lock:
+            if len(self.latencies) < 10:
+                return default
+            ordered = sorted(self.latencies)
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(2.0, min(default, p95 * 2 + 1))
+
+    def record_success(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.failures = 0
+            if self.state != 'closed':
+                print(f'✅ 外部来源 {self.name} 已恢复')
+            self.state = 'closed'
+            self.probing = False
+            self.cooldown = CIRCUIT_COOLDOWN
+
+    def record_failure(self):
+        with self._lock:
+            self.outcomes.append(False)
+            self.failures += 1
+            if self.state == 'half_open':
+                self.cooldown = min(CIRCUIT_MAX_COOLDOWN, self.cooldown * 2)
+                self._open()
+                return
+            error_rate = self.outcomes.count(False) / len(self.outcomes)
+            if self.state == 'closed' and (
+                self.failures >= CIRCUIT_FAILURE_THRESHOLD
+                or (len(self.outcomes) >= 10 and error_rate >= 0.5)
+            ):
+                self._open()
 
-        # 第三优先：PC 搜索页解析
-        if not unique_ids:
-            for raw_q in query_terms:
-                query = urllib.parse.quote(raw_q)
-                try:
-                    pc_search_url = f"https://www.douban.com/search?cat=1001&q={query}"
-                    pc_html = fetch_text(pc_search_url, timeout=8)
-                    unique_ids = collect_subject_ids(pc_html)
-                    if unique_ids:
-                        break
-                except Exception:
+    def release_probe(self):
+        """探测请求没有得到来源状态的结论（如本地限速），释放探测名额"""
+        with self._lock:
+            self.probing = False
+
+    def _open(self):
+        self.state = 'open'
+        self.probing = False
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        print(f'⚠️ 外部来源 {self.name} 连续失败，{int(self.cooldown)} 秒内暂停请求')
+
+
+UPSTREAM_HEALTH = {source: SourceHealth(source) for _, source in SOURCE_HOSTS}
+
+
+def source_available(source):
+    health = UPSTREAM_HEALTH.get(source)
+    return health is None or health.available()
+
+
+def is_source_failure(error):
+    """只有来源本身的问题计入熔断：网络错误、超时、5xx、429、403；404 等属于正常结果"""
+    if isinstance(error, UpstreamSkipped):
+        return False
+    if isinstance(error, UpstreamHTTPError):
+        return error.status >= 500 or error.status in (403, 429)
+    return True
+
+
+def upstream_get(source, url, headers, timeout, use_cookies=False, sink=None):
+    """经过熔断器与自适应超时的上游 GET 请求；sink 见 UpstreamClient.get"""
+    health = UPSTREAM_HEALTH.get(source)
+    if health is None:
+        return UPSTREAM_HTTP.get(url, headers=headers, timeout=timeout, use_cookies=use_cookies, sink=sink)
+    health.check()
+    started = time.monotonic()
+    try:
+        body = UPSTREAM_HTTP.get(url, headers=headers, timeout=health.timeout(timeout), use_cookies=use_cookies, sink=sink)
+        if source == 'douban' and is_douban_blocked(body):
+            raise UpstreamHTTPError(403, url)
+    except Exception as e:
+        if is_source_failure(e):
+            health.record_failure()
+        else:
+            health.release_probe()
+        raise
+    health.record_success(time.monotonic() - started)
+    return body
+
+
+def is_douban_blocked(body):
+    """豆瓣风控时返回 200 的验证/禁止访问页面"""
+    head = body[:4096]
+    return b'sec.douban.com' in head or '<title>禁止访问</title>'.encode('utf-8') in head
+
+
+def _cpu_worker_init(parent_pid):
+    # Ctrl+C 由主进程处理，子进程随进程池关闭退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def watch_parent():
+        # 主进程被 SIGTERM 等直接结束时进程池来不及关闭，子进程自行退出
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, name='cpu-pool-parent', daemon=True).start()
+
+
+class CpuPool:
+    """可选的子进程池，执行页面解析、文本清洗与候选打分这类纯 CPU 任务，不与请求线程争抢 GIL。
+
+    任务必须是模块级函数，参数与返回值只用字符串、字节和小型列表/字典：原始响应体传入，
+    只传回解析出的字段或候选列表。未启用、平台不支持 fork 或进程池损坏时在调用线程内执行。
+    """
+
+    def __init__(self, workers, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self._executor is not None
+
+    def start(self):
+        """须在启动其它线程之前调用：子进程由 fork 创建，此时不会有其它线程持有锁"""
+        if self.workers <= 0 or self._executor is not None:
+            return
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            print('⚠️ 当前平台不支持 fork，CPU_POOL_WORKERS 将被忽略')
+            return
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_cpu_worker_init,
+            initargs=(os.getpid(),)
+        )
+        # fork 方式下第一次提交任务时即创建全部子进程
+        executor.submit(int).result()
+        self._executor = executor
+
+    def run(self, fn, *args):
+        executor = self._executor
+        if executor is None:
+            return fn(*args)
+        try:
+            future = executor.submit(fn, *args)
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.BrokenExecutor:
+            # 子进程异常退出后整个进程池不可用，之后都在线程内执行
+            self._disable(executor)
+            return fn(*args)
+        except RuntimeError:
+            if self._executor is not None:
+                raise
+            # 进程池已关闭
+            return fn(*args)
+
+    def _disable(self, executor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        print('⚠️ 解析进程池已损坏，改为在请求线程内执行')
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+CPU_POOL = CpuPool(CPU_POOL_WORKERS, CPU_POOL_TIMEOUT)
+
+
+class PrefixIndex:
+    """书名/作者的前缀索引：有序数组 + bisect。
+
+    每个条目以书名、作者的归一化文本以及其中每个词开头的后缀为键
+    （"The Great Gatsby" 也能用 "gatsby" 联想到），查询时二分定位到前缀的起点顺序扫描。
+    """
+
+    MAX_SCAN = 500
+
+    def __init__(self):
+        self._keys = []       # 有序的 (归一化键, 条目 id)
+        self._entries = {}    # 条目 id -> (键列表, 条目信息)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index_keys(*texts):
+        keys = set()
+        for text in texts:
+            words = [w for w in re.split(r'[^\w\u4e00-\u9fff]+', normalize_text(text)) if w]
+            for i in range(min(len(words), 6)):
+                key = ''.join(words[i:])
+                if key:
+                    keys.add(key)
+        return sorted(keys)
+
+    def add(self, entry_id, title, author, info):
+        self.add_many([(entry_id, title, author, info)])
+
+    def add_many(self, items):
+        """批量加入 (条目 id, 书名, 作者, 条目信息)；数量多时追加后整体排序一次"""
+        items = [(entry_id, self._index_keys(title, author), info) for entry_id, title, author, info in items]
+        with self._lock:
+            added = []
+            for entry_id, keys, info in items:
+                old = self._entries.get(entry_id)
+                self._entries[entry_id] = (keys, info)
+                if old is not None:
+                    if old[0] == keys:
+                        continue
+                    self._remove_keys(entry_id, old[0])
+                added.extend((key, entry_id) for key in keys)
+            if len(added) > 64:
+                self._keys.extend(added)
+                self._keys.sort()
+            else:
+                for item in added:
+                    bisect.insort(self._keys, item)
+
+    def remove(self, entry_id):
+        with self._lock:
+            old = self._entries.pop(entry_id, None)
+            if old is not None:
+                self._remove_keys(entry_id, old[0])
+
+    def _remove_keys(self, entry_id, keys):
+        for key in keys:
+            pos = bisect.bisect_left(self._keys, (key, entry_id))
+            if pos < len(self._keys) and self._keys[pos] == (key, entry_id):
+                del self._keys[pos]
+
+    def complete(self, query, limit=10):
+        """返回键以 query 开头的条目信息（每个条目最多一次）"""
+        prefix = normalize_match_token(query)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            pos = bisect.bisect_left(self._keys, (prefix,))
+            end = min(len(self._keys), pos + self.MAX_SCAN)
+            while pos < end and len(results) < limit:
+                key, entry_id = self._keys[pos]
+                pos += 1
+                if not key.startswith(prefix):
+                    break
+                if entry_id in seen:
                     continue
+                seen.add(entry_id)
+                results.append(self._entries[entry_id][1])
+        return results
 
-        unique_ids = unique_ids[:5]
+    def __len__(self):
+        return len(self._entries)
 
-        best = None
-        best_score = -1
 
-        for sid in unique_ids:
-            detail_url = f"https://book.douban.com/subject/{sid}/"
-            html = fetch_text(detail_url, timeout=8)
+def _resolved_titles(value):
+    """从查询缓存的结果（候选列表、最佳条目、豆瓣元数据等）中取出 (书名, 作者, 年份, 来源)"""
+    for item in value if isinstance(value, list) else [value]:
+        if not isinstance(item, dict):
+            continue
+        info = item.get('volumeInfo') if isinstance(item.get('volumeInfo'), dict) else item
+        title = str(info.get('title') or '').strip()
+        if not title:
+            continue
+        authors = info.get('authors') or info.get('author_name')
+        author = ', '.join(authors[:2]) if isinstance(authors, list) else str(info.get('author') or '')
+        year = info.get('year') or info.get('first_publish_year')
+        if year is None and str(info.get('publishedDate', ''))[:4].isdigit():
+            year = int(str(info['publishedDate'])[:4])
+        yield title, author, year, item.get('source') or ('Google Books' if info is not item else '')
 
-            title_match = re.search(r'<span\s+property="v:itemreviewed">([^<]+)</span>', html)
-            if not title_match:
-                title_match = re.search(r'<h1[^>]*>\s*<span[^>]*>([^<]+)</span>', html)
-            if not title_match:
-                title_match = re.search(r'<meta\s+property="og:title"\s+content="([^"]+)"', html)
-            db_title = html_lib.unescape(title_match.group(1).strip()) if title_match else ''
-            if db_title.endswith('(豆瓣)'):
-                db_title = db_title[:-4].strip()
 
-            info_match = re.search(r'<div\s+id="info"[^>]*>([\s\S]*?)</div>', html)
-            info_text = clean_html_text(info_match.group(1)) if info_match else ''
-            author_match = re.search(r'作者[:：]\s*([^\n/]+)', info_text)
-            db_author = author_match.group(1).strip() if author_match else ''
+class ResolvedTitles(PrefixIndex):
+    """外部来源解析过的书名（即查询缓存中的命中结果），供书名联想在本地直接匹配。
 
-            score = score_match(title, author, db_title, db_author)
+    最多保留 max_entries 个书名，超出时淘汰最久没有再次出现的。
+    """
 
-            rating_match = re.search(r'<strong\s+class="ll rating_num\s*"[^>]*>\s*([0-9.]+)\s*</strong>', html)
-            db_rating = to_float(rating_match.group(1)) if rating_match else None
-            if db_rating:
-                score += 6
+    def __init__(self, max_entries):
+        super().__init__()
+        self.max_entries = max_entries
+        self._order = OrderedDict()
 
-            intros = re.findall(r'<div\s+class="intro">([\s\S]*?)</div>', html)
-            intro_texts = [clean_html_text(x) for x in intros if clean_html_text(x)]
-            intro = max(intro_texts, key=len) if intro_texts else ''
-            if intro:
-                score += 8
+    @staticmethod
+    def _items(value):
+        for title, author, year, source in _resolved_titles(value):
+            key = normalize_key(title, author)
+            if key:
+                yield key, title, author, {'title': title, 'author': author, 'year': year, 'source': source}
+
+    def add_many(self, items):
+        super().add_many(items)
+        with self._lock:
+            for entry_id, _, _, _ in items:
+                self._order[entry_id] = None
+                self._order.move_to_end(entry_id)
+            while len(self._order) > self.max_entries:
+                entry_id, _ = self._order.popitem(last=False)
+                old = self._entries.pop(entry_id, None)
+                if old is not None:
+                    self._remove_keys(entry_id, old[0])
+
+    def add_resolved(self, value):
+        self.add_many(list(self._items(value)))
+
+    def load(self, cache):
+        """从查询缓存中最近的命中结果重建，只读取填满索引所需的条数"""
+        values = list(cache.hits(self.max_entries))
+        # hits() 从新到旧返回，按从旧到新加入，淘汰顺序才与写入顺序一致
+        items = [item for value in reversed(values) for item in self._items(value)]
+        self.add_many(items[-self.max_entries:])
+        return len(self)
+
+
+RESOLVED_TITLES = ResolvedTitles(RESOLVED_TITLES_SIZE)
+
+
+class LookupCache:
+    """外部书目查询的统一缓存。
+
+    以 (来源, 归一化查询) 为键，内存中按 LRU 保留最近的 max_entries 条，
+    同时写入 DATA_DIR 下的 sqlite 文件，重启后仍然有效。每个来源有各自的
+    TTL；查不到结果（None/空）与查询出错也会缓存，只是有效期短得多。
+    值以 JSON 文本保存，每次命中都返回新的副本，调用方可以放心修改。
+    """
+
+    def __init__(self, path, max_entries, ttls, miss_ttl, error_ttl, max_disk_rows):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttls = ttls
+        self.miss_ttl = miss_ttl
+        self.error_ttl = error_ttl
+        self.max_disk_rows = max_disk_rows
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_failed = False
+        self._puts = 0
+        self.on_hit = None
+
+    def _connection(self):
+        """调用方需持有 self._lock"""
+        if self._db is not None or self._db_failed or not self.path:
+            return self._db
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS lookup_cache (
+                    source TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (source, key)
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS lookup_cache_expires_idx ON lookup_cache (expires_at)")
+            db.execute("DELETE FROM lookup_cache WHERE expires_at < ?", (time.time(),))
+            db.commit()
+            self._db = db
+        except Exception as e:
+            # 磁盘不可写时退化为纯内存缓存
+            print(f'⚠️ 查询缓存文件不可用，仅使用内存缓存: {e}')
+            self._db_failed = True
+        return self._db
+
+    def _get(self, source, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((source, key))
+            if entry is not None:
+                if entry[2] > now:
+                    self._memory.move_to_end((source, key))
+                    return entry
+                del self._memory[(source, key)]
+            db = self._connection()
+            if db is None:
+                return None
+            row = db.execute(
+                "SELECT kind, value, expires_at FROM lookup_cache WHERE source = ? AND key = ? AND expires_at > ?",
+                (source, key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._remember((source, key), row)
+            return row
+
+    def _remember(self, full_key, entry):
+        self._memory[full_key] = entry
+        self._memory.move_to_end(full_key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _put(self, source, key, kind, value, ttl):
+        entry = (kind, value, time.time() + ttl)
+        with self._lock:
+            self._remember((source, key), entry)
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO lookup_cache (source, key, kind, value, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (source, key) + entry
+                )
+                self._puts += 1
+                if self._puts % 200 == 0:
+                    self._prune(db)
+                db.commit()
+            except Exception as e:
+                print(f'⚠️ 写入查询缓存失败: {e}')
+
+    def _prune(self, db):
+        db.execute("DELETE FROM lookup_cache WHERE expires_at < ?", (time.time(),))
+        count = db.execute("SELECT COUNT(*) FROM lookup_cache").fetchone()[0]
+        if count > self.max_disk_rows:
+            db.execute(
+                """
+                DELETE FROM lookup_cache WHERE rowid IN (
+                    SELECT rowid FROM lookup_cache ORDER BY expires_at LIMIT ?
+                )
+                """,
+                (count - self.max_disk_rows,)
+            )
 
-            candidate = {
-                'title': db_title,
-                'author': db_author,
-                'synopsis': intro[:420],
-                'rating': round(db_rating, 1) if db_rating else None,
-                'ratingSource': '豆瓣' if db_rating else '',
-                'source': '豆瓣',
-                'resource': {
-                    'name': '豆瓣页面',
-                    'url': detail_url,
-                    'type': '详情'
-                }
-            }
+    def get_or_fetch(self, source, key, fetch, *args):
+        """命中缓存直接返回；否则调用 fetch(*args) 并按结果类型缓存。
+
+        缓存的错误会以 UpstreamLookupError 重新抛出，调用方原有的异常处理保持有效。
+        """
+        entry = self._get(source, key)
+        if entry is not None:
+            kind, value, _ = entry
+            if kind == 'error':
+                raise UpstreamLookupError(value)
+            return json.loads(value)
+
+        # 同一键的并发未命中只请求一次上游
+        return INFLIGHT.do(('cache', source, key), self._fetch_and_store, source, key, fetch, args)
+
+    def _fetch_and_store(self, source, key, fetch, args):
+        try:
+            result = fetch(*args)
+        except UpstreamSkipped:
+            raise
+        except Exception as e:
+            self._put(source, key, 'error', str(e) or e.__class__.__name__, self.error_ttl)
+            raise
+        if result:
+            self._put(source, key, 'hit', json.dumps(result, ensure_ascii=False), self.ttls.get(source, self.miss_ttl))
+            if self.on_hit is not None:
+                self.on_hit(result)
+        else:
+            self._put(source, key, 'miss', json.dumps(result, ensure_ascii=False), self.miss_ttl)
+        return result
+
+    def hits(self, limit):
+        """从新到旧遍历仍有效的命中结果，最多 limit 条（启动时用来重建本地书名索引）。
+
+        磁盘上按过期时间倒序近似写入时间，走 expires_at 索引，不扫描整张表。
+        """
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                rows = [entry[1] for entry in reversed(self._memory.values()) if entry[0] == 'hit'][:limit]
+            else:
+                rows = [row[0] for row in db.execute(
+                    "SELECT value FROM lookup_cache WHERE kind = 'hit' AND expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                    (time.time(), limit)
+                )]
+        for value in rows:
+            try:
+                yield json.loads(value)
+            except ValueError:
+                continue
 
-            if score > best_score:
-                best_score = score
-                best = candidate
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM lookup_cache")
+                db.commit()
+
+
+LOOKUP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=max(1, LOOKUP_CONCURRENCY), thread_name_prefix='lookup'
+)
+DOUBAN_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=max(1, DOUBAN_CONCURRENCY), thread_name_prefix='douban'
+)
+
+LOOKUP_CACHE = LookupCache(
+    LOOKUP_CACHE_FILE,
+    max_entries=LOOKUP_CACHE_SIZE,
+    ttls=LOOKUP_CACHE_TTLS,
+    miss_ttl=LOOKUP_CACHE_MISS_TTL,
+    error_ttl=LOOKUP_CACHE_ERROR_TTL,
+    max_disk_rows=LOOKUP_CACHE_DISK_ROWS
+)
+LOOKUP_CACHE.on_hit = RESOLVED_TITLES.add_resolved
+
+
+def lookup_cache_key(*parts):
+    return '|'.join(normalize_text(part) for part in parts)
 
-        # 低匹配结果直接忽略，避免误填
-        if best_score < 24:
-            return None
 
-        DOUBAN_CACHE[cache_key] = best
-        return best
+def fetch_douban_best_metadata(title, author=''):
+    try:
+        return LOOKUP_CACHE.get_or_fetch(
+            'douban', lookup_cache_key(title, author), _fetch_douban_best_metadata, title, author
+        )
     except Exception:
         return None
 
 
+def _douban_headers():
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0 Safari/537.36',
+        'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        'Referer': 'https://book.douban.com/'
+    }
+    if DOUBAN_COOKIE:
+        headers['Cookie'] = DOUBAN_COOKIE
+    return headers
+
+
+def _douban_fetch_text(url, deadline, timeout=8):
+    return INFLIGHT.do(('douban', url), _douban_fetch_text_once, url, deadline, timeout)
+
+
+def _douban_request(url, deadline, timeout, sink=None):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0.2:
+        raise TimeoutError('豆瓣查询已超时')
+    rate_limit('douban', remaining)
+    remaining = max(0.5, deadline - time.monotonic())
+    return upstream_get('douban', url, _douban_headers(), min(timeout, remaining), use_cookies=True, sink=sink)
+
+
+def _douban_fetch_text_once(url, deadline, timeout):
+    return _douban_request(url, deadline, timeout).decode('utf-8', 'ignore')
+
+
+def _douban_fetch_detail(url, deadline, timeout=8):
+    return INFLIGHT.do(('douban.detail', url), _douban_fetch_detail_once, url, deadline, timeout)
+
+
+def _douban_fetch_detail_once(url, deadline, timeout):
+    """边下载边解析详情页，取到“内容简介”后即断开，不再下载页面剩余部分"""
+    if CPU_POOL.enabled:
+        # 下载端只找“内容简介”一节的结束位置，标签解析交给子进程
+        buffer = DoubanDetailBuffer()
+        _douban_request(url, deadline, timeout, sink=buffer.feed_bytes)
+        return CPU_POOL.run(extract_douban_detail, buffer.text)
+    extractor = DoubanDetailExtractor()
+    _douban_request(url, deadline, timeout, sink=extractor.feed_bytes)
+    return extractor.result()
+
+
+def extract_douban_detail(page_html):
+    extractor = DoubanDetailExtractor()
+    extractor.feed_text(page_html)
+    return extractor.result()
+
+
+class DoubanDetailBuffer:
+    """进程池模式下的下载端：与 DoubanDetailExtractor 在同一位置（“内容简介”之后的 <h2>）停止下载，
+    但只做字符串查找，不解析标签。"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        self.done = False
+        self._parts = []         # 已下载的全部文本，结束时一次拼接
+        self._tail = ''          # 尚未扫描完的末尾文本
+        self._in_intro_section = False
+
+    @property
+    def text(self):
+        return ''.join(self._parts)
+
+    def feed_bytes(self, chunk):
+        if self.done:
+            return True
+        piece = self._decoder.decode(chunk)
+        self._parts.append(piece)
+        tail = self._tail + piece
+        pos = 0
+        while True:
+            start = tail.find('<h2', pos)
+            if start < 0:
+                self._tail = tail[max(pos, len(tail) - 2):]
+                return False
+            if self._in_intro_section:
+                self.done = True
+                return True
+            end = tail.find('</h2', start)
+            if end < 0:
+                self._tail = tail[start:]
+                return False
+            self._in_intro_section = '内容简介' in tail[start:end]
+            pos = end
+
+
+class DoubanDetailExtractor(HTMLParser):
+    """豆瓣详情页的流式解析：书名、#info 中的作者、评分与“内容简介”。
+
+    页面中这些内容都在“内容简介”之前或之中，读到下一个 <h2>（作者简介、目录等）时即完成，
+    feed_bytes() 返回 True 通知调用方停止下载。简介只取“内容简介”一节，不会误用作者简介。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        self.item_title = ''
+        self.h1_title = ''
+        self.og_title = ''
+        self.info = ''
+        self.rating = ''
+        self.intros = []
+        self.done = False
+        self._capture = None     # 正在收集文本的字段
+        self._parts = []
+        self._div_depth = 0
+        self._h1_open = False
+        self._h1_span_seen = False
+        self._h2_parts = None
+        self._in_intro_section = False
+        self._pending = ''       # 尚未遇到 <h1> 时缓存的末尾文本
+
+    class _Done(Exception):
+        pass
+
+    OG_TITLE_RE = re.compile(r'<meta\s+property="og:title"\s+content="([^"]+)"')
+
+    def feed_bytes(self, chunk):
+        if self.done:
+            return True
+        return self.feed_text(self._decoder.decode(chunk))
+
+    def feed_text(self, text):
+        if self.done:
+            return True
+        if self._pending is not None:
+            # <h1> 之前的 <head> 与导航栏里没有需要的内容，只用正则找 og:title（书名的最后备选），不逐个解析标签
+            text = self._pending + text
+            if not self.og_title:
+                og_match = self.OG_TITLE_RE.search(text)
+                if og_match:
+                    self.og_title = html_lib.unescape(og_match.group(1)).strip()
+            pos = text.find('<h1')
+            if pos < 0:
+                self._pending = text[-512:]
+                return False
+            self._pending = None
+            text = text[pos:]
+        try:
+            self.feed(text)
+        except self._Done:
+            # 不再解析这一块剩下的内容
+            pass
+        return self.done
+
+    def _start(self, field):
+        self._capture = field
+        self._parts = []
+        self._div_depth = 1
+
+    def _finish(self):
+        text = ''.join(self._parts)
+        field, self._capture = self._capture, None
+        if field == 'item_title':
+            self.item_title = text.strip()
+        elif field == 'h1_title':
+            self.h1_title = text.strip()
+        elif field == 'rating':
+            self.rating = text.strip()
+        elif field == 'info':
+            self.info = collapse_text(text)
+        elif field == 'intro':
+            intro = collapse_text(text)
+            if intro:
+                self.intros.append(intro)
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        attrs = dict(attrs)
+        if self._capture in ('info', 'intro'):
+            if tag == 'div':
+                self._div_depth += 1
+            elif tag == 'br':
+                self._parts.append('\n')
+            return
+        if self._capture is not None:
+            return
+        if tag == 'h1':
+            self._h1_open = True
+        elif tag == 'span' and attrs.get('property') == 'v:itemreviewed':
+            self._start('item_title')
+        elif tag == 'span' and self._h1_open and not self._h1_span_seen:
+            self._h1_span_seen = True
+            self._start('h1_title')
+        elif tag == 'strong' and 'rating_num' in (attrs.get('class') or '').split():
+            self._start('rating')
+        elif tag == 'div' and attrs.get('id') == 'info' and not self.info:
+            self._start('info')
+        elif tag == 'div' and attrs.get('class') == 'intro' and self._in_intro_section:
+            self._start('intro')
+        elif tag == 'h2':
+            if self._in_intro_section:
+                # 已经读完“内容简介”一节
+                self.done = True
+                raise self._Done()
+            self._h2_parts = []
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if self._capture in ('info', 'intro'):
+            if tag == 'p':
+                self._parts.append('\n')
+            elif tag == 'div':
+                self._div_depth -= 1
+                if self._div_depth == 0:
+                    self._finish()
+            return
+        if self._capture in ('item_title', 'h1_title') and tag == 'span':
+            self._finish()
+        elif self._capture == 'rating' and tag == 'strong':
+            self._finish()
+        elif tag == 'h1':
+            self._h1_open = False
+        elif tag == 'h2' and self._h2_parts is not None:
+            self._in_intro_section = '内容简介' in ''.join(self._h2_parts)
+            self._h2_parts = None
+
+    def handle_data(self, data):
+        if self._capture is not None:
+            self._parts.append(data)
+        elif self._h2_parts is not None:
+            self._h2_parts.append(data)
+
+    def result(self):
+        """解析出的字段：{title, author, rating, intro}"""
+        if not self.done and self._pending is None:
+            self.close()
+        title = self.item_title or self.h1_title or self.og_title
+        if title.endswith('(豆瓣)'):
+            title = title[:-4].strip()
+        author_match = re.search(r'作者[:：]\s*([^\n/]+)', self.info)
+        return {
+            'title': title,
+            'author': author_match.group(1).strip() if author_match else '',
+            'rating': to_float(self.rating),
+            # “内容简介”通常有折叠与展开两个版本，取较长的一个
+            'intro': max(self.intros, key=len) if self.intros else ''
+        }
+
+
+def _collect_douban_subject_ids(page_html):
+    ids = []
+    patterns = [
+        r'book\.douban\.com/subject/(\d+)',
+        r'/book/subject/(\d+)',
+        r'"subject/(\d+)"',
+        r'\\u002Fsubject\\u002F(\d+)'
+    ]
+    for pattern in patterns:
+        for sid in re.findall(pattern, page_html or ''):
+            if sid not in ids:
+                ids.append(sid)
+    return ids
+
+
+def _douban_suggest_ids(raw_q, deadline):
+    suggest_url = f"https://book.douban.com/j/subject_suggest?q={urllib.parse.quote(raw_q)}"
+    suggest_data = json.loads(_douban_fetch_text(suggest_url, deadline))
+    ids = []
+    for item in (suggest_data or [])[:12]:
+        sid = str(item.get('id', '')).strip()
+        if sid.isdigit() and sid not in ids:
+            ids.append(sid)
+    return ids
+
+
+def _douban_search_page_ids(url, deadline):
+    return CPU_POOL.run(_collect_douban_subject_ids, _douban_fetch_text(url, deadline))
+
+
+def _parse_douban_detail(page, detail_url, title, author):
+    """根据详情页字段（DoubanDetailExtractor.result()）返回 (匹配分, 候选)"""
+    db_title = page['title']
+    db_author = page['author']
+
+    score = score_match(title, author, db_title, db_author)
+
+    db_rating = page['rating']
+    if db_rating:
+        score += 6
+
+    intro = page['intro']
+    if intro:
+        score += 8
+
+    candidate = {
+        'title': db_title,
+        'author': db_author,
+        'synopsis': intro[:420],
+        'rating': round(db_rating, 1) if db_rating else None,
+        'ratingSource': '豆瓣' if db_rating else '',
+        'source': '豆瓣',
+        'resource': {
+            'name': '豆瓣页面',
+            'url': detail_url,
+            'type': '详情'
+        }
+    }
+    return score, candidate
+
+
+def _wait_ordered(futures, deadline):
+    """等待 futures 直到全部完成或到达截止时间，按提交顺序返回 (成功结果列表, 出错数)。
+
+    截止时仍未完成的请求直接放弃（线程会在各自的超时后自行结束）。
+    """
+    remaining = max(0, deadline - time.monotonic())
+    concurrent.futures.wait(futures, timeout=remaining)
+    results = []
+    errors = 0
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            errors += 1
+            continue
+        try:
+            results.append(future.result())
+        except Exception:
+            errors += 1
+    return results, errors
+
+
+def _fetch_douban_best_metadata(title, author=''):
+    if not source_available('douban'):
+        raise SourceCircuitOpen('douban 暂时不可用')
+    deadline = time.monotonic() + DOUBAN_DEADLINE
+
+    query_terms = []
+    for raw_q in [f"{title} {author}".strip(), str(title or '').strip()]:
+        if raw_q and raw_q not in query_terms:
+            query_terms.append(raw_q)
+
+    # 建议接口与移动端搜索页相互独立，同时发出；按原有优先级合并：建议接口在前
+    suggest_futures = [
+        DOUBAN_EXECUTOR.submit(_douban_suggest_ids, raw_q, deadline)
+        for raw_q in query_terms
+    ]
+    mobile_futures = [
+        DOUBAN_EXECUTOR.submit(
+            _douban_search_page_ids,
+            f"https://m.douban.com/search/?query={urllib.parse.quote(raw_q)}&type={m_type}",
+            deadline
+        )
+        for raw_q in query_terms
+        for m_type in ['1001', 'book']
+    ]
+    # 搜索阶段最多占用一半的剩余时间，保证详情页还有时间抓取
+    search_deadline = time.monotonic() + (deadline - time.monotonic()) / 2
+    id_lists, errors = _wait_ordered(suggest_futures + mobile_futures, search_deadline)
+
+    unique_ids = []
+    for ids in id_lists:
+        for sid in ids:
+            if sid not in unique_ids:
+                unique_ids.append(sid)
+
+    # 兜底：PC 搜索页解析
+    if not unique_ids:
+        pc_futures = [
+            DOUBAN_EXECUTOR.submit(
+                _douban_search_page_ids,
+                f"https://www.douban.com/search?cat=1001&q={urllib.parse.quote(raw_q)}",
+                deadline
+            )
+            for raw_q in query_terms
+        ]
+        search_deadline = time.monotonic() + (deadline - time.monotonic()) / 2
+        pc_lists, pc_errors = _wait_ordered(pc_futures, search_deadline)
+        errors += pc_errors
+        unique_ids = next((ids for ids in pc_lists if ids), [])
+
+    if not unique_ids:
+        if errors:
+            raise UpstreamLookupError('豆瓣搜索失败或超时')
+        return None
+
+    unique_ids = unique_ids[:5]
+    detail_futures = [
+        DOUBAN_EXECUTOR.submit(_douban_fetch_detail, f"https://book.douban.com/subject/{sid}/", deadline)
+        for sid in unique_ids
+    ]
+    remaining = max(0, deadline - time.monotonic())
+    concurrent.futures.wait(detail_futures, timeout=remaining)
+
+    best = None
+    best_score = -1
+    parsed = 0
+    for sid, future in zip(unique_ids, detail_futures):
+        if not future.done():
+            future.cancel()
+            continue
+        try:
+            page = future.result()
+        except Exception:
+            continue
+        parsed += 1
+        score, candidate = _parse_douban_detail(page, f"https://book.douban.com/subject/{sid}/", title, author)
+        if score > best_score:
+            best_score = score
+            best = candidate
+
+    if not parsed:
+        raise UpstreamLookupError('豆瓣详情页获取失败或超时')
+
+    # 低匹配结果直接忽略，避免误填
+    if best_score < 24:
+        return None
+
+    return best
+
+
 def fetch_douban_candidates(title, author=''):
     best = fetch_douban_best_metadata(title, author)
     if not best:
@@ -475,6 +1800,12 @@ def build_gutendex_resources(book):
 
 
 def fetch_openlibrary_candidates(title, author=''):
+    return LOOKUP_CACHE.get_or_fetch(
+        'openlibrary', lookup_cache_key(title, author), _fetch_openlibrary_candidates, title, author
+    )
+
+
+def _fetch_openlibrary_candidates(title, author=''):
     fields = ','.join([
         'key', 'title', 'author_name', 'first_publish_year', 'cover_i',
         'ratings_average', 'ratings_count', 'subject', 'ia', 'ebook_access'
@@ -483,15 +1814,20 @@ def fetch_openlibrary_candidates(title, author=''):
     if author:
         url += f"&author={urllib.parse.quote(author)}"
 
-    data = fetch_json(url, timeout=7)
+    return CPU_POOL.run(parse_openlibrary_candidates, fetch_body(url, timeout=7), title, author)
+
+
+def parse_openlibrary_candidates(body, title, author=''):
+    data = json.loads(body.decode('utf-8'))
     results = []
+    features = QueryFeatures(title, author)
     for doc in data.get('docs', []):
         book_title = doc.get('title', '')
         book_author = ', '.join(doc.get('author_name', [])[:2]) if doc.get('author_name') else ''
 
         rating = to_float(doc.get('ratings_average'))
         rating_count = int(doc.get('ratings_count', 0) or 0)
-        score = score_match(title, author, book_title, book_author)
+        score = features.score(book_title, book_author)
         if rating:
             score += 8
         if rating_count:
@@ -523,15 +1859,26 @@ def fetch_openlibrary_candidates(title, author=''):
 
 
 def fetch_googlebooks_candidates(title, author=''):
+    return LOOKUP_CACHE.get_or_fetch(
+        'googlebooks', lookup_cache_key(title, author), _fetch_googlebooks_candidates, title, author
+    )
+
+
+def _fetch_googlebooks_candidates(title, author=''):
     query_parts = [f"intitle:{title}"]
     if author:
         query_parts.append(f"inauthor:{author}")
     query = urllib.parse.quote(' '.join(query_parts))
     url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults=12&printType=books"
 
-    data = fetch_json(url, timeout=7)
+    return CPU_POOL.run(parse_googlebooks_candidates, fetch_body(url, timeout=7), title, author)
+
+
+def parse_googlebooks_candidates(body, title, author=''):
+    data = json.loads(body.decode('utf-8'))
     items = data.get('items', [])
     results = []
+    features = QueryFeatures(title, author)
 
     for item in items:
         volume = item.get('volumeInfo', {})
@@ -540,7 +1887,7 @@ def fetch_googlebooks_candidates(title, author=''):
         rating = to_float(volume.get('averageRating'))
         ratings_count = int(volume.get('ratingsCount', 0) or 0)
 
-        score = score_match(title, author, book_title, book_author)
+        score = features.score(book_title, book_author)
         if rating:
             score += 7
         if ratings_count:
@@ -582,15 +1929,26 @@ def fetch_googlebooks_candidates(title, author=''):
 
 
 def fetch_gutendex_candidates(title, author=''):
+    return LOOKUP_CACHE.get_or_fetch(
+        'gutendex', lookup_cache_key(title, author), _fetch_gutendex_candidates, title, author
+    )
+
+
+def _fetch_gutendex_candidates(title, author=''):
     query = urllib.parse.quote(f"{title} {author}".strip())
     url = f"https://gutendex.com/books?search={query}"
 
-    data = fetch_json(url, timeout=7)
+    return CPU_POOL.run(parse_gutendex_candidates, fetch_body(url, timeout=7), title, author)
+
+
+def parse_gutendex_candidates(body, title, author=''):
+    data = json.loads(body.decode('utf-8'))
     results = []
+    features = QueryFeatures(title, author)
     for book in (data.get('results', []) or [])[:12]:
         book_title = book.get('title', '')
         book_author = ', '.join([a.get('name', '') for a in (book.get('authors') or []) if a.get('name')][:2])
-        score = score_match(title, author, book_title, book_author)
+        score = features.score(book_title, book_author)
         if book.get('download_count'):
             score += min(8, int(book.get('download_count', 0)) // 200)
 
@@ -617,6 +1975,12 @@ def fetch_gutendex_candidates(title, author=''):
 
 
 def fetch_openlibrary_best_doc(title, author=''):
+    return LOOKUP_CACHE.get_or_fetch(
+        'openlibrary.best', lookup_cache_key(title, author), _fetch_openlibrary_best_doc, title, author
+    )
+
+
+def _fetch_openlibrary_best_doc(title, author=''):
     fields = ','.join([
         'key', 'title', 'author_name', 'first_publish_year', 'cover_i',
         'ratings_average', 'ratings_count', 'subject', 'ia', 'ebook_access'
@@ -625,13 +1989,19 @@ def fetch_openlibrary_best_doc(title, author=''):
     if author:
         url += f"&author={urllib.parse.quote(author)}"
 
-    data = fetch_json(url, timeout=6)
+    return CPU_POOL.run(pick_openlibrary_best_doc, fetch_body(url, timeout=6), title, author)
+
+
+def pick_openlibrary_best_doc(body, title, author=''):
+    data = json.loads(body.decode('utf-8'))
     best_doc = None
     best_score = -1
-    for doc in data.get('docs', [])[:10]:
-        cand_title = doc.get('title', '')
-        cand_author = ', '.join(doc.get('author_name', [])[:2]) if doc.get('author_name') else ''
-        score = score_match(title, author, cand_title, cand_author)
+    docs = data.get('docs', [])[:10]
+    scores = QueryFeatures(title, author).score_batch(
+        (doc.get('title', ''), ', '.join(doc.get('author_name', [])[:2]) if doc.get('author_name') else '')
+        for doc in docs
+    )
+    for doc, score in zip(docs, scores):
         if doc.get('ratings_average'):
             score += 4
         if doc.get('cover_i'):
@@ -643,20 +2013,31 @@ def fetch_openlibrary_best_doc(title, author=''):
 
 
 def fetch_googlebooks_best_item(title, author=''):
+    return LOOKUP_CACHE.get_or_fetch(
+        'googlebooks.best', lookup_cache_key(title, author), _fetch_googlebooks_best_item, title, author
+    )
+
+
+def _fetch_googlebooks_best_item(title, author=''):
     query_parts = [f"intitle:{title}"]
     if author:
         query_parts.append(f"inauthor:{author}")
     query = urllib.parse.quote(' '.join(query_parts))
     url = f"https://www.googleapis.com/books/v1/volumes?q={query}&maxResults=10&printType=books"
-    data = fetch_json(url, timeout=6)
+    return CPU_POOL.run(pick_googlebooks_best_item, fetch_body(url, timeout=6), title, author)
 
+
+def pick_googlebooks_best_item(body, title, author=''):
+    data = json.loads(body.decode('utf-8'))
     best_item = None
     best_score = -1
-    for item in (data.get('items', []) or [])[:10]:
-        volume = item.get('volumeInfo', {})
-        cand_title = volume.get('title', '')
-        cand_author = ', '.join(volume.get('authors', [])[:2]) if volume.get('authors') else ''
-        score = score_match(title, author, cand_title, cand_author)
+    items = (data.get('items', []) or [])[:10]
+    volumes = [item.get('volumeInfo', {}) for item in items]
+    scores = QueryFeatures(title, author).score_batch(
+        (volume.get('title', ''), ', '.join(volume.get('authors', [])[:2]) if volume.get('authors') else '')
+        for volume in volumes
+    )
+    for item, volume, score in zip(items, volumes, scores):
         if volume.get('description'):
             score += 5
         if volume.get('imageLinks', {}).get('thumbnail'):
@@ -669,120 +2050,250 @@ def fetch_googlebooks_best_item(title, author=''):
     return best_item
 
 
-def enrich_candidate_metadata(item, query_title='', query_author=''):
-    enriched = dict(item)
+def _needs_enrichment(item):
+    return (
+        not item.get('synopsis')
+        or not item.get('cover')
+        or (not item.get('rating'))
+        or item.get('category') in ('', '文学小说')
+    )
 
-    # 先尝试 Google Books 详情补充
-    try:
-        gb_item = fetch_googlebooks_best_item(
-            enriched.get('title') or query_title,
-            enriched.get('author') or query_author
-        )
-        if gb_item:
-            volume = gb_item.get('volumeInfo', {})
-
-            if not enriched.get('synopsis'):
-                enriched['synopsis'] = str(volume.get('description', '')).strip()[:320]
-
-            if (not enriched.get('category')) or enriched.get('category') == '文学小说':
-                categories = volume.get('categories', [])[:4]
-                mapped = map_category(categories)
-                if mapped:
-                    enriched['category'] = mapped
-
-            if not enriched.get('cover'):
-                image_links = volume.get('imageLinks', {}) or {}
-                cover = image_links.get('thumbnail', '') or image_links.get('smallThumbnail', '')
-                if cover.startswith('http://'):
-                    cover = cover.replace('http://', 'https://', 1)
-                enriched['cover'] = cover
-
-            if (not enriched.get('rating')) and volume.get('averageRating') is not None:
-                rating = to_float(volume.get('averageRating'))
-                if rating:
-                    enriched['rating'] = round(rating, 1)
-                    enriched['ratingSource'] = 'Google Books'
-
-            enriched['resources'] = merge_resources((enriched.get('resources') or []) + build_google_resources(gb_item))
-    except Exception:
-        pass
 
-    # 再尝试 Open Library work 详情补充
-    try:
-        ol_doc = fetch_openlibrary_best_doc(
-            enriched.get('title') or query_title,
-            enriched.get('author') or query_author
-        )
-        if ol_doc:
-            if not enriched.get('synopsis') and ol_doc.get('key'):
-                enriched['synopsis'] = fetch_work_description(ol_doc.get('key'))
+class EnrichmentSession:
+    """一次搜索请求内的补充查询：共享时限，相同的上游查询只发一次"""
 
-            if (not enriched.get('category')) or enriched.get('category') == '文学小说':
-                enriched['category'] = map_category(ol_doc.get('subject', [])[:6])
+    def __init__(self, budget):
+        self.deadline = time.monotonic() + budget
+        self._futures = {}
+        self._lock = threading.Lock()
 
-            if not enriched.get('cover') and ol_doc.get('cover_i'):
-                enriched['cover'] = f"https://covers.openlibrary.org/b/id/{ol_doc['cover_i']}-M.jpg"
+    def remaining(self):
+        return max(0, self.deadline - time.monotonic())
 
-            if (not enriched.get('rating')) and ol_doc.get('ratings_average') is not None:
-                rating = to_float(ol_doc.get('ratings_average'))
-                if rating:
-                    enriched['rating'] = round(rating, 1)
-                    enriched['ratingSource'] = 'Open Library'
+    def submit(self, source, key, fn, *args):
+        with self._lock:
+            future = self._futures.get((source, key))
+            if future is None:
+                future = LOOKUP_EXECUTOR.submit(self._run, fn, *args)
+                self._futures[(source, key)] = future
+            return future
 
-            enriched['resources'] = merge_resources((enriched.get('resources') or []) + build_openlibrary_resources(ol_doc))
-    except Exception:
-        pass
+    def _run(self, fn, *args):
+        # 排队到时限之后才轮到的查询不再发出
+        if self.remaining() <= 0:
+            raise TimeoutError('补充查询已超时')
+        return fn(*args)
 
-    # 中文书补充：豆瓣简介与评分（最佳匹配）
-    try:
-        if contains_cjk(enriched.get('title') or query_title):
-            if (not enriched.get('rating')) or (not has_real_synopsis(enriched.get('synopsis', ''))):
-                douban = fetch_douban_best_metadata(
-                    enriched.get('title') or query_title,
-                    enriched.get('author') or query_author
-                )
-                if douban:
-                    if (not has_real_synopsis(enriched.get('synopsis', ''))) and has_real_synopsis(douban.get('synopsis', '')):
-                        enriched['synopsis'] = douban.get('synopsis', '')
-                    if (not enriched.get('rating')) and douban.get('rating'):
-                        enriched['rating'] = douban.get('rating')
-                        enriched['ratingSource'] = douban.get('ratingSource', '豆瓣')
-                    enriched['resources'] = merge_resources((enriched.get('resources') or []) + [douban.get('resource', {})])
-                    if enriched.get('source'):
-                        if '豆瓣' not in enriched['source']:
-                            enriched['source'] = f"{enriched['source']} / 豆瓣"
-                    else:
-                        enriched['source'] = '豆瓣'
-    except Exception:
-        pass
+    def abandon(self):
+        """时限已到：取消还在排队的查询，已在执行的查询结果不再使用"""
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
 
-    # 最后兜底：保证前端能拿到可展示的简介文本
-    if not (enriched.get('synopsis') or '').strip():
-        parts = []
-        if enriched.get('author'):
-            parts.append(f"作者：{enriched.get('author')}")
-        if enriched.get('year'):
-            parts.append(f"出版年份：{enriched.get('year')}")
-        if enriched.get('category'):
-            parts.append(f"分类：{enriched.get('category')}")
-        if enriched.get('source'):
-            parts.append(f"数据来源：{enriched.get('source')}")
 
-        suffix = '；'.join(parts)
-        if suffix:
-            enriched['synopsis'] = f"暂无可公开抓取的详细简介。{suffix}。可点击下方资源链接查看详情页或在线预览。"
-        else:
-            enriched['synopsis'] = '暂无可公开抓取的详细简介，可点击下方资源链接查看详情页或在线预览。'
+def _fetch_openlibrary_enrichment(title, author, want_description):
+    ol_doc = fetch_openlibrary_best_doc(title, author)
+    description = ''
+    if ol_doc and want_description and ol_doc.get('key'):
+        description = fetch_work_description(ol_doc.get('key'))
+    return ol_doc, description
 
-    return enriched
 
+def _apply_googlebooks_enrichment(enriched, gb_item):
+    if not gb_item:
+        return
+    volume = gb_item.get('volumeInfo', {})
 
-def merge_candidates(candidates):
-    merged = {}
-    for item in candidates:
-        key = normalize_key(item.get('title', ''), item.get('author', ''))
-        if not key:
-            continue
+    if not enriched.get('synopsis'):
+        enriched['synopsis'] = str(volume.get('description', '')).strip()[:320]
+
+    if (not enriched.get('category')) or enriched.get('category') == '文学小说':
+        categories = volume.get('categories', [])[:4]
+        mapped = map_category(categories)
+        if mapped:
+            enriched['category'] = mapped
+
+    if not enriched.get('cover'):
+        image_links = volume.get('imageLinks', {}) or {}
+        cover = image_links.get('thumbnail', '') or image_links.get('smallThumbnail', '')
+        if cover.startswith('http://'):
+            cover = cover.replace('http://', 'https://', 1)
+        enriched['cover'] = cover
+
+    if (not enriched.get('rating')) and volume.get('averageRating') is not None:
+        rating = to_float(volume.get('averageRating'))
+        if rating:
+            enriched['rating'] = round(rating, 1)
+            enriched['ratingSource'] = 'Google Books'
+
+    enriched['resources'] = merge_resources((enriched.get('resources') or []) + build_google_resources(gb_item))
+
+
+def _apply_openlibrary_enrichment(enriched, result):
+    ol_doc, description = result
+    if not ol_doc:
+        return
+    if not enriched.get('synopsis') and ol_doc.get('key'):
+        enriched['synopsis'] = description
+
+    if (not enriched.get('category')) or enriched.get('category') == '文学小说':
+        enriched['category'] = map_category(ol_doc.get('subject', [])[:6])
+
+    if not enriched.get('cover') and ol_doc.get('cover_i'):
+        enriched['cover'] = f"https://covers.openlibrary.org/b/id/{ol_doc['cover_i']}-M.jpg"
+
+    if (not enriched.get('rating')) and ol_doc.get('ratings_average') is not None:
+        rating = to_float(ol_doc.get('ratings_average'))
+        if rating:
+            enriched['rating'] = round(rating, 1)
+            enriched['ratingSource'] = 'Open Library'
+
+    enriched['resources'] = merge_resources((enriched.get('resources') or []) + build_openlibrary_resources(ol_doc))
+
+
+def _apply_douban_enrichment(enriched, douban):
+    if not douban:
+        return
+    if enriched.get('rating') and has_real_synopsis(enriched.get('synopsis', '')):
+        return
+    if (not has_real_synopsis(enriched.get('synopsis', ''))) and has_real_synopsis(douban.get('synopsis', '')):
+        enriched['synopsis'] = douban.get('synopsis', '')
+    if (not enriched.get('rating')) and douban.get('rating'):
+        enriched['rating'] = douban.get('rating')
+        enriched['ratingSource'] = douban.get('ratingSource', '豆瓣')
+    enriched['resources'] = merge_resources((enriched.get('resources') or []) + [douban.get('resource', {})])
+    if enriched.get('source'):
+        if '豆瓣' not in enriched['source']:
+            enriched['source'] = f"{enriched['source']} / 豆瓣"
+    else:
+        enriched['source'] = '豆瓣'
+
+
+def _finalize_enrichment(enriched):
+    # 最后兜底：保证前端能拿到可展示的简介文本
+    if not (enriched.get('synopsis') or '').strip():
+        parts = []
+        if enriched.get('author'):
+            parts.append(f"作者：{enriched.get('author')}")
+        if enriched.get('year'):
+            parts.append(f"出版年份：{enriched.get('year')}")
+        if enriched.get('category'):
+            parts.append(f"分类：{enriched.get('category')}")
+        if enriched.get('source'):
+            parts.append(f"数据来源：{enriched.get('source')}")
+
+        suffix = '；'.join(parts)
+        if suffix:
+            enriched['synopsis'] = f"暂无可公开抓取的详细简介。{suffix}。可点击下方资源链接查看详情页或在线预览。"
+        else:
+            enriched['synopsis'] = '暂无可公开抓取的详细简介，可点击下方资源链接查看详情页或在线预览。'
+    return enriched
+
+
+class _EnrichmentPlan:
+    """单个候选的补充步骤：各来源并发查询，结果仍按 Google Books → Open Library → 豆瓣 的顺序合并"""
+
+    def __init__(self, item, query_title, query_author, session):
+        self.enriched = dict(item)
+        title = self.enriched.get('title') or query_title
+        author = self.enriched.get('author') or query_author
+        key = lookup_cache_key(title, author)
+        want_description = not self.enriched.get('synopsis')
+        # 熔断中的来源直接跳过
+        self.steps = []
+        if source_available('googlebooks'):
+            self.steps.append((session.submit('googlebooks.best', key, fetch_googlebooks_best_item, title, author),
+                               _apply_googlebooks_enrichment))
+        if source_available('openlibrary'):
+            self.steps.append((session.submit(('openlibrary.best', want_description), key,
+                                              _fetch_openlibrary_enrichment, title, author, want_description),
+                               _apply_openlibrary_enrichment))
+        # 中文书补充：豆瓣简介与评分（最佳匹配）
+        if contains_cjk(title) and source_available('douban') and (
+            (not self.enriched.get('rating')) or (not has_real_synopsis(self.enriched.get('synopsis', '')))
+        ):
+            self.steps.append((session.submit('douban', key, fetch_douban_best_metadata, title, author),
+                               _apply_douban_enrichment))
+        self.position = 0
+
+    def pending_future(self):
+        return self.steps[self.position][0] if self.position < len(self.steps) else None
+
+    def advance(self, final=False):
+        """按顺序合并已完成的步骤；返回 True 表示该候选已处理完毕。
+
+        核心字段齐全后仍合并后续来源（各来源只补空字段，但资源链接都会合并）。
+        final=True 时（时限已到）跳过尚未返回的来源。
+        """
+        while self.position < len(self.steps):
+            future, apply = self.steps[self.position]
+            if not future.done():
+                if not final:
+                    return False
+            else:
+                try:
+                    apply(self.enriched, future.result())
+                except Exception:
+                    pass
+            self.position += 1
+        return True
+
+
+def enrich_candidates(items, query_title='', query_author='', session=None, limit=None, describe_rest=False):
+    """并发补充一组候选的元数据，共享同一个时限；需要补充的候选全部完成后立即返回。
+
+    只补充前 limit 个候选；describe_rest=True 时其余缺简介的候选用 Open Library 作品简介补上。
+    """
+    session = session or EnrichmentSession(ENRICH_BUDGET)
+    results = list(items)
+    plans = {}
+    descriptions = {}
+    for index, item in enumerate(results):
+        if _needs_enrichment(item) and (limit is None or index < limit):
+            plans[index] = _EnrichmentPlan(item, query_title, query_author, session)
+        elif describe_rest and not item.get('synopsis') and item.get('_work_key'):
+            descriptions[index] = session.submit('openlibrary.work', item['_work_key'],
+                                                 fetch_work_description, item['_work_key'])
+
+    while plans:
+        for index in list(plans):
+            if plans[index].advance():
+                results[index] = _finalize_enrichment(plans.pop(index).enriched)
+        if not plans:
+            break
+        remaining = session.remaining()
+        if remaining <= 0:
+            break
+        concurrent.futures.wait(
+            {plan.pending_future() for plan in plans.values()},
+            timeout=remaining,
+            return_when=concurrent.futures.FIRST_COMPLETED
+        )
+
+    if descriptions:
+        concurrent.futures.wait(descriptions.values(), timeout=session.remaining())
+    if plans or not all(future.done() for future in descriptions.values()):
+        session.abandon()
+
+    for index, plan in plans.items():
+        plan.advance(final=True)
+        results[index] = _finalize_enrichment(plan.enriched)
+    for index, future in descriptions.items():
+        if future.done() and not future.cancelled() and future.exception() is None:
+            results[index] = dict(results[index], synopsis=future.result())
+    return results
+
+
+def enrich_candidate_metadata(item, query_title='', query_author=''):
+    return enrich_candidates([item], query_title, query_author)[0]
+
+
+def merge_candidates(candidates):
+    merged = {}
+    for item in candidates:
+        key = normalize_key(item.get('title', ''), item.get('author', ''))
+        if not key:
+            continue
 
         if key not in merged:
             merged[key] = item
@@ -825,22 +2336,25 @@ def merge_candidates(candidates):
 
 
 def search_book_info(title, author=""):
-    """豆瓣优先搜索；不可用时回退到其它公开源。"""
+    """豆瓣优先搜索；不可用时回退到其它公开源。相同查询并发时共享一次执行。"""
+    # 键只做去空白与大小写折叠：normalize_key 会去掉标点，“C++”与“C#”会被当成同一查询
+    return INFLIGHT.do(
+        ('search', str(title or '').strip().casefold(), str(author or '').strip().casefold()),
+        _search_book_info, title, author
+    )
+
+
+def _search_book_info(title, author=""):
     try:
-        douban_candidates = fetch_douban_candidates(title, author)
-        if not douban_candidates and author:
-            douban_candidates = fetch_douban_candidates(title, '')
+        douban_candidates = []
+        # 豆瓣熔断时直接走其它来源
+        if source_available('douban'):
+            douban_candidates = fetch_douban_candidates(title, author)
+            if not douban_candidates and author and source_available('douban'):
+                douban_candidates = fetch_douban_candidates(title, '')
         if douban_candidates:
             merged = merge_candidates(douban_candidates)
-            for index, item in enumerate(merged[:8]):
-                need_enrich = (
-                    not item.get('synopsis')
-                    or not item.get('cover')
-                    or (not item.get('rating'))
-                    or item.get('category') in ('', '文学小说')
-                )
-                if need_enrich and index < 4:
-                    merged[index] = enrich_candidate_metadata(item, title, author)
+            merged[:8] = enrich_candidates(merged[:8], title, author, limit=4)
 
             results = []
             for item in merged[:8]:
@@ -864,35 +2378,33 @@ def search_book_info(title, author=""):
             return results
 
         # 豆瓣不可用或无结果时，回退聚合来源，保障可用性
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            futures = [
-                executor.submit(fetch_openlibrary_candidates, title, author),
-                executor.submit(fetch_googlebooks_candidates, title, author),
-                executor.submit(fetch_gutendex_candidates, title, author),
+        session = EnrichmentSession(ENRICH_BUDGET)
+        futures = [
+            session.submit(source, None, fetcher, title, author)
+            for source, fetcher in [
+                ('openlibrary', fetch_openlibrary_candidates),
+                ('googlebooks', fetch_googlebooks_candidates),
+                ('gutendex', fetch_gutendex_candidates),
             ]
-
-            all_candidates = []
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    all_candidates.extend(future.result() or [])
-                except Exception:
-                    continue
+            if source_available(source)
+        ]
+        # 候选获取最多占用六成时限，其余留给补充查询
+        concurrent.futures.wait(futures, timeout=session.remaining() * 0.6)
+
+        all_candidates = []
+        for future in futures:
+            if not future.done():
+                continue
+            try:
+                all_candidates.extend(future.result() or [])
+            except Exception:
+                continue
 
         if not all_candidates:
             return []
 
         merged = merge_candidates(all_candidates)
-        for index, item in enumerate(merged[:8]):
-            need_enrich = (
-                not item.get('synopsis')
-                or not item.get('cover')
-                or (not item.get('rating'))
-                or item.get('category') in ('', '文学小说')
-            )
-            if need_enrich and index < 6:
-                merged[index] = enrich_candidate_metadata(item, title, author)
-            elif (not item.get('synopsis')) and item.get('_work_key'):
-                merged[index]['synopsis'] = fetch_work_description(item.get('_work_key'))
+        merged[:8] = enrich_candidates(merged[:8], title, author, session, limit=6, describe_rest=True)
 
         merged.sort(
             key=lambda i: (
@@ -927,108 +2439,181 @@ def search_book_info(title, author=""):
 
 
 def fetch_json(url, timeout=6):
-    req = urllib.request.Request(url, headers={'User-Agent': SEARCH_USER_AGENT})
-    with urllib.request.urlopen(req, timeout=timeout) as response:
-        return json.loads(response.read().decode('utf-8'))
+    return INFLIGHT.do(('url', url), _fetch_json, url, timeout)
+
+
+def _fetch_json(url, timeout):
+    return json.loads(_fetch_body(url, timeout).decode('utf-8'))
+
+
+def fetch_body(url, timeout=6):
+    """JSON 接口的原始响应体，供把解码与解析交给 CPU_POOL 的调用方使用"""
+    return INFLIGHT.do(('body', url), _fetch_body, url, timeout)
+
+
+def _fetch_body(url, timeout):
+    rate_limit(source_for_url(url), timeout)
+    return upstream_get(source_for_url(url), url, {'User-Agent': SEARCH_USER_AGENT, 'Accept': 'application/json'}, timeout)
 
 
 def fetch_work_description(work_key):
     if not work_key:
         return ''
     try:
-        work_url = f"https://openlibrary.org{work_key}.json"
-        work_data = fetch_json(work_url, timeout=5)
-        desc = work_data.get('description', '')
-        if isinstance(desc, dict):
-            desc = desc.get('value', '')
-        text = str(desc).strip()
-        return text[:260] if text else ''
+        return LOOKUP_CACHE.get_or_fetch('openlibrary.work', work_key, _fetch_work_description, work_key)
     except Exception:
         return ''
 
 
+def _fetch_work_description(work_key):
+    work_url = f"https://openlibrary.org{work_key}.json"
+    work_data = fetch_json(work_url, timeout=5)
+    desc = work_data.get('description', '')
+    if isinstance(desc, dict):
+        desc = desc.get('value', '')
+    text = str(desc).strip()
+    return text[:260] if text else ''
+
+
+# 分类关键词，按顺序优先：命中多个分类时取靠前的
+CATEGORY_MAPPING = [
+    ('science fiction fantasy dystopia', '科幻奇幻'),
+    ('mystery detective crime thriller', '推理悬疑'),
+    ('history biography memoir', '历史传记'),
+    ('philosophy ethics', '哲学思想'),
+    ('sociology politics culture society', '社会科学'),
+    ('science physics biology chemistry', '自然科学'),
+    ('psychology mental', '心理学'),
+    ('business economics management finance', '经济管理'),
+    ('computer technology programming ai', '科技'),
+    ('art design music', '艺术设计'),
+    ('health cooking lifestyle', '生活'),
+]
+
+
+def _category_matcher():
+    """关键词 -> 最靠前的分类序号，以及匹配全部关键词的正则"""
+    priority = {}
+    for index, (keys, _) in enumerate(CATEGORY_MAPPING):
+        for keyword in keys.split():
+            priority.setdefault(keyword, index)
+    # 零宽前瞻让每个位置都尝试匹配（关键词之间可以重叠），同一位置按优先级顺序尝试
+    pattern = '(?=(' + '|'.join(re.escape(k) for k in sorted(priority, key=priority.get)) + '))'
+    return priority, re.compile(pattern)
+
+
+CATEGORY_PRIORITY, CATEGORY_RE = _category_matcher()
+
+
 def map_category(subjects):
     if not subjects:
         return '文学小说'
     joined = ' '.join(subjects).lower()
-    mapping = [
-        ('science fiction fantasy dystopia', '科幻奇幻'),
-        ('mystery detective crime thriller', '推理悬疑'),
-        ('history biography memoir', '历史传记'),
-        ('philosophy ethics', '哲学思想'),
-        ('sociology politics culture society', '社会科学'),
-        ('science physics biology chemistry', '自然科学'),
-        ('psychology mental', '心理学'),
-        ('business economics management finance', '经济管理'),
-        ('computer technology programming ai', '科技'),
-        ('art design music', '艺术设计'),
-        ('health cooking lifestyle', '生活'),
-    ]
-    for keys, category in mapping:
-        for keyword in keys.split():
-            if keyword in joined:
-                return category
-    return '文学小说'
+    best = None
+    for match in CATEGORY_RE.finditer(joined):
+        priority = CATEGORY_PRIORITY[match.group(1)]
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+    return CATEGORY_MAPPING[best][1] if best is not None else '文学小说'
 
 
-def autocomplete_book(query):
+def autocomplete_book(query, group_id=''):
     if not query:
         return []
+    return INFLIGHT.do(('suggest', group_id, normalize_key(query, '')), _autocomplete_book, query, group_id)
+
+
+def local_suggestions(query, group_id='', limit=10):
+    """本地联想：先是群组书单里的书，再是外部来源解析过的书名"""
+    items = []
+    if group_id:
+        index = _index_of(read_data())
+        titles = index.titles.get(group_id) if index is not None else None
+        if titles is not None:
+            items.extend(titles.complete(query, limit))
+    items.extend(RESOLVED_TITLES.complete(query, limit))
+    return items
+
+
+def _autocomplete_book(query, group_id=''):
     suggestions = []
     seen = set()
 
-    try:
-        fields = 'title,author_name,first_publish_year'
-        ol_url = f"https://openlibrary.org/search.json?q={urllib.parse.quote(query)}&limit=8&fields={fields}"
-        ol_data = fetch_json(ol_url, timeout=5)
-        for doc in ol_data.get('docs', [])[:8]:
-            title = str(doc.get('title', '')).strip()
-            if not title:
-                continue
-            author = ', '.join(doc.get('author_name', [])[:2]) if doc.get('author_name') else ''
-            key = normalize_key(title, author)
+    def merge(items):
+        for item in items:
+            key = normalize_key(item['title'], item['author'])
             if key in seen:
                 continue
             seen.add(key)
-            suggestions.append({
-                'title': title,
-                'author': author,
-                'year': doc.get('first_publish_year'),
-                'source': 'Open Library'
-            })
-    except Exception:
-        pass
-
-    try:
-        gb_query = urllib.parse.quote(query)
-        gb_url = f"https://www.googleapis.com/books/v1/volumes?q={gb_query}&maxResults=8&printType=books"
-        gb_data = fetch_json(gb_url, timeout=5)
-        for item in (gb_data.get('items', []) or [])[:8]:
-            volume = item.get('volumeInfo', {})
-            title = str(volume.get('title', '')).strip()
-            if not title:
-                continue
-            author = ', '.join(volume.get('authors', [])[:2]) if volume.get('authors') else ''
-            year = None
-            published_date = str(volume.get('publishedDate', ''))
-            if published_date[:4].isdigit():
-                year = int(published_date[:4])
-            key = normalize_key(title, author)
-            if key in seen:
-                continue
-            seen.add(key)
-            suggestions.append({
-                'title': title,
-                'author': author,
-                'year': year,
-                'source': 'Google Books'
-            })
-    except Exception:
-        pass
+            suggestions.append({field: item.get(field) for field in ('title', 'author', 'year', 'source')})
+
+    merge(local_suggestions(query, group_id))
+    if len(suggestions) >= SUGGEST_LOCAL_MIN:
+        return suggestions[:10]
+
+    # 本地结果不够时并发查询两个外部来源，超过 SUGGEST_DEADLINE 未返回的来源本次跳过，
+    # 其请求继续在后台完成并写入缓存，之后的联想可以直接用上
+    key_query = lookup_cache_key(query)
+    futures = [
+        LOOKUP_EXECUTOR.submit(LOOKUP_CACHE.get_or_fetch, source, key_query, fetcher, query)
+        for source, fetcher in [
+            ('suggest.openlibrary', _fetch_openlibrary_suggestions),
+            ('suggest.googlebooks', _fetch_googlebooks_suggestions),
+        ]
+    ]
+    concurrent.futures.wait(futures, timeout=SUGGEST_DEADLINE)
+    for future in futures:
+        if future.done() and not future.exception():
+            merge(future.result())
 
     return suggestions[:10]
 
 
+def _fetch_openlibrary_suggestions(query):
+    fields = 'title,author_name,first_publish_year'
+    ol_url = f"https://openlibrary.org/search.json?q={urllib.parse.quote(query)}&limit=8&fields={fields}"
+    ol_data = fetch_json(ol_url, timeout=5)
+    suggestions = []
+    for doc in ol_data.get('docs', [])[:8]:
+        title = str(doc.get('title', '')).strip()
+        if not title:
+            continue
+        author = ', '.join(doc.get('author_name', [])[:2]) if doc.get('author_name') else ''
+        suggestions.append({
+            'title': title,
+            'author': author,
+            'year': doc.get('first_publish_year'),
+            'source': 'Open Library'
+        })
+    return suggestions
+
+
+def _fetch_googlebooks_suggestions(query):
+    gb_query = urllib.parse.quote(query)
+    gb_url = f"https://www.googleapis.com/books/v1/volumes?q={gb_query}&maxResults=8&printType=books"
+    gb_data = fetch_json(gb_url, timeout=5)
+    suggestions = []
+    for item in (gb_data.get('items', []) or [])[:8]:
+        volume = item.get('volumeInfo', {})
+        title = str(volume.get('title', '')).strip()
+        if not title:
+            continue
+        author = ', '.join(volume.get('authors', [])[:2]) if volume.get('authors') else ''
+        year = None
+        published_date = str(volume.get('publishedDate', ''))
+        if published_date[:4].isdigit():
+            year = int(published_date[:4])
+        suggestions.append({
+            'title': title,
+            'author': author,
+            'year': year,
+            'source': 'Google Books'
+        })
+    return suggestions
+
+
 def _ensure_postgres_ready():
     if not USE_POSTGRES:
         return
@@ -1036,9 +2621,288 @@ def _ensure_postgres_ready():
         raise RuntimeError('检测到 DATABASE_URL，但未安装 psycopg2。请执行: pip install -r requirements.txt')
 
 
-def _postgres_connect():
+class PostgresPool:
+    """有上限的线程安全 Postgres 连接池。
+
+    连接用完归还而不是关闭；取出空闲较久的连接前先做一次 SELECT 1 健康检查，
+    超过 idle_timeout 未使用的连接由后台线程关闭。池满时等待至多 acquire_timeout 秒。
+    """
+
+    def __init__(self, dsn, max_size, idle_timeout=300, healthcheck_after=30, acquire_timeout=10):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.healthcheck_after = healthcheck_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = []  # [(conn, 归还时间)]，后进先出
+        self._size = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._reaper = None
+
+    def _healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError('数据库连接池已关闭')
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    conn, idle_since = None, None
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError(f'数据库连接池已耗尽（上限 {self.max_size}），请稍后重试')
+                    self._cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    return psycopg2.connect(self.dsn)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            if self._healthy(conn, idle_since):
+                return conn
+            self._discard(conn)
+
+    def _release(self, conn, broken=False):
+        if not broken and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                broken = True
+        if broken or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        self._start_reaper()
+        conn = self._acquire()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self._release(conn, broken=True)
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                self._release(conn, broken=True)
+                raise
+            self._release(conn)
+            raise
+        else:
+            self._release(conn)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self._cond:
+            expired = [item for item in self._idle if now - item[1] >= self.idle_timeout]
+            self._idle = [item for item in self._idle if now - item[1] < self.idle_timeout]
+        for conn, _ in expired:
+            self._discard(conn)
+        return len(expired)
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+
+            def reaper():
+                while not self._closed:
+                    time.sleep(min(30, max(1, self.idle_timeout / 2)))
+                    self.evict_idle()
+
+            self._reaper = threading.Thread(target=reaper, name='pg-pool-reaper', daemon=True)
+            self._reaper.start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {'size': self._size, 'idle': len(self._idle), 'maxSize': self.max_size}
+
+
+PG_POOL = None
+PG_POOL_LOCK = threading.Lock()
+
+
+def get_postgres_pool():
+    global PG_POOL
     _ensure_postgres_ready()
-    return psycopg2.connect(DATABASE_URL)
+    if PG_POOL is None:
+        with PG_POOL_LOCK:
+            if PG_POOL is None:
+                PG_POOL = PostgresPool(
+                    DATABASE_URL,
+                    PG_POOL_SIZE,
+                    idle_timeout=PG_POOL_IDLE_TIMEOUT,
+                    acquire_timeout=PG_POOL_TIMEOUT
+                )
+    return PG_POOL
+
+
+def close_postgres_pool():
+    global PG_POOL
+    with PG_POOL_LOCK:
+        if PG_POOL is not None:
+            PG_POOL.close()
+            PG_POOL = None
+
+
+def _postgres_connect():
+    """从连接池借出一个连接（上下文管理器，退出时归还）"""
+    return get_postgres_pool().connection()
+
+
+POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS store_meta (
+        id SMALLINT PRIMARY KEY CHECK (id = 1),
+        version BIGINT NOT NULL DEFAULT 0,
+        app_state_migrated BOOLEAN NOT NULL DEFAULT FALSE,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+    """,
+    "INSERT INTO store_meta (id) VALUES (1) ON CONFLICT (id) DO NOTHING",
+    """
+    CREATE TABLE IF NOT EXISTS groups (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        created_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS group_members (
+        group_id TEXT NOT NULL REFERENCES groups (id) ON DELETE CASCADE,
+        user_id TEXT NOT NULL,
+        seq BIGSERIAL,
+        PRIMARY KEY (group_id, user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS group_members_user_id_idx ON group_members (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS books (
+        id TEXT PRIMARY KEY,
+        group_id TEXT NOT NULL,
+        title TEXT NOT NULL DEFAULT '',
+        author TEXT NOT NULL DEFAULT '',
+        synopsis TEXT NOT NULL DEFAULT '',
+        rating DOUBLE PRECISION,
+        rating_source TEXT NOT NULL DEFAULT '',
+        category TEXT NOT NULL DEFAULT '',
+        cover TEXT NOT NULL DEFAULT '',
+        resources JSONB NOT NULL DEFAULT '[]'::jsonb,
+        added_by TEXT NOT NULL DEFAULT '',
+        added_at TIMESTAMPTZ,
+        status TEXT NOT NULL DEFAULT 'candidate',
+        seq BIGSERIAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS books_group_id_idx ON books (group_id)",
+    """
+    CREATE TABLE IF NOT EXISTS user_statuses (
+        book_id TEXT NOT NULL REFERENCES books (id) ON DELETE CASCADE,
+        user_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        seq BIGSERIAL,
+        PRIMARY KEY (book_id, user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS user_statuses_user_id_idx ON user_statuses (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS votes (
+        book_id TEXT NOT NULL REFERENCES books (id) ON DELETE CASCADE,
+        user_id TEXT NOT NULL,
+        seq BIGSERIAL,
+        PRIMARY KEY (book_id, user_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS votes_user_id_idx ON votes (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS reviews (
+        id TEXT PRIMARY KEY,
+        book_id TEXT NOT NULL REFERENCES books (id) ON DELETE CASCADE,
+        user_id TEXT NOT NULL,
+        content TEXT NOT NULL DEFAULT '',
+        rating DOUBLE PRECISION,
+        created_at TIMESTAMPTZ,
+        seq BIGSERIAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS reviews_book_id_idx ON reviews (book_id)",
+    "CREATE INDEX IF NOT EXISTS reviews_user_id_idx ON reviews (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS comments (
+        id TEXT PRIMARY KEY,
+        review_id TEXT NOT NULL REFERENCES reviews (id) ON DELETE CASCADE,
+        user_id TEXT NOT NULL,
+        content TEXT NOT NULL DEFAULT '',
+        created_at TIMESTAMPTZ,
+        seq BIGSERIAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS comments_review_id_idx ON comments (review_id)",
+    "CREATE INDEX IF NOT EXISTS comments_user_id_idx ON comments (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS group_versions (
+        group_id TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+# 书籍字段名 -> books 表列名（book.update 只会修改这些字段）
+BOOK_COLUMNS = {
+    'title': 'title',
+    'author': 'author',
+    'synopsis': 'synopsis',
+    'rating': 'rating',
+    'ratingSource': 'rating_source',
+    'category': 'category',
+    'cover': 'cover',
+    'status': 'status',
+}
 
 
 def _init_postgres_schema():
@@ -1046,74 +2910,406 @@ def _init_postgres_schema():
         return
     with _postgres_connect() as conn:
         with conn.cursor() as cur:
+            for statement in POSTGRES_SCHEMA:
+                cur.execute(statement)
+        conn.commit()
+    migrate_app_state()
+
+
+def _parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def _format_timestamp(value):
+    return value.isoformat() if value else None
+
+
+def _pg_column_value(field, value):
+    if field == 'rating':
+        return to_float(value)
+    return '' if value is None else str(value)
+
+
+def _pg_ensure_group(cur, group_id, created_at=None):
+    if not group_id or str(group_id).startswith('solo:'):
+        return False
+    cur.execute(
+        "INSERT INTO groups (id, name, created_at) VALUES (%s, %s, %s) ON CONFLICT (id) DO NOTHING",
+        (group_id, group_id, _parse_timestamp(created_at) or datetime.now(timezone.utc))
+    )
+    return True
+
+
+def _pg_insert_review(cur, book_id, review):
+    cur.execute(
+        """
+        INSERT INTO reviews (id, book_id, user_id, content, rating, created_at)
+        SELECT %s, %s, %s, %s, %s, %s
+        WHERE EXISTS (SELECT 1 FROM books WHERE id = %s)
+        ON CONFLICT (id) DO NOTHING
+        """,
+        (review['id'], book_id, str(review.get('userId', '')), str(review.get('content') or ''),
+         to_float(review.get('rating')), _parse_timestamp(review.get('createdAt')), book_id)
+    )
+    for comment in review.get('comments') or []:
+        _pg_insert_comment(cur, review['id'], comment)
+
+
+def _pg_insert_comment(cur, review_id, comment):
+    cur.execute(
+        """
+        INSERT INTO comments (id, review_id, user_id, content, created_at)
+        SELECT %s, %s, %s, %s, %s
+        WHERE EXISTS (SELECT 1 FROM reviews WHERE id = %s)
+        ON CONFLICT (id) DO NOTHING
+        """,
+        (comment['id'], review_id, str(comment.get('userId', '')), str(comment.get('content') or ''),
+         _parse_timestamp(comment.get('createdAt')), review_id)
+    )
+
+
+def _pg_insert_book(cur, book):
+    cur.execute(
+        """
+        INSERT INTO books (id, group_id, title, author, synopsis, rating, rating_source,
+                           category, cover, resources, added_by, added_at, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s)
+        ON CONFLICT (id) DO NOTHING
+        """,
+        (book['id'], book.get('groupId') or 'default',
+         _pg_column_value('title', book.get('title')),
+         _pg_column_value('author', book.get('author')),
+         _pg_column_value('synopsis', book.get('synopsis')),
+         to_float(book.get('rating')),
+         _pg_column_value('ratingSource', book.get('ratingSource')),
+         _pg_column_value('category', book.get('category')),
+         _pg_column_value('cover', book.get('cover')),
+         json.dumps(book.get('resources') or [], ensure_ascii=False),
+         str(book.get('addedBy') or ''),
+         _parse_timestamp(book.get('addedAt')),
+         str(book.get('status') or 'candidate'))
+    )
+    for user_id, status in (book.get('userStatuses') or {}).items():
+        cur.execute(
+            "INSERT INTO user_statuses (book_id, user_id, status) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+            (book['id'], user_id, str(status))
+        )
+    for user_id, voted in (book.get('votes') or {}).items():
+        if voted:
             cur.execute(
-                """
-                CREATE TABLE IF NOT EXISTS app_state (
-                    id SMALLINT PRIMARY KEY CHECK (id = 1),
-                    data JSONB NOT NULL,
-                    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                )
-                """
+                "INSERT INTO votes (book_id, user_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                (book['id'], user_id)
             )
-        conn.commit()
+    for review in book.get('reviews') or []:
+        _pg_insert_review(cur, book['id'], review)
 
 
-def _read_data_from_postgres():
-    initial = ensure_data_schema({"books": [], "groups": {}})
-    with _postgres_connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT data FROM app_state WHERE id = 1")
-            row = cur.fetchone()
-            if row and row[0]:
-                payload = row[0]
-                if isinstance(payload, str):
-                    payload = json.loads(payload)
-                return ensure_data_schema(payload)
+def _pg_apply_mutation(cur, op):
+    """把一条变更记录翻译成针对具体行的 SQL，语义与 apply_mutation 保持一致"""
+    kind = op.get('op')
 
+    if kind in ('group.create', 'group.rename'):
+        if _pg_ensure_group(cur, op['groupId'], op.get('createdAt')) and op.get('name'):
+            cur.execute("UPDATE groups SET name = %s WHERE id = %s", (op['name'], op['groupId']))
+    elif kind == 'member.add':
+        if _pg_ensure_group(cur, op['groupId'], op.get('createdAt')) and op.get('userId'):
+            cur.execute(
+                "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                (op['groupId'], op['userId'])
+            )
+    elif kind == 'book.add':
+        _pg_insert_book(cur, op['book'])
+    elif kind == 'book.delete':
+        cur.execute("DELETE FROM books WHERE id = %s", (op['bookId'],))
+    elif kind == 'book.update':
+        fields = [(BOOK_COLUMNS[k], _pg_column_value(k, v)) for k, v in op['fields'].items() if k in BOOK_COLUMNS]
+        if fields:
+            assignments = ', '.join(f"{column} = %s" for column, _ in fields)
+            cur.execute(
+                f"UPDATE books SET {assignments} WHERE id = %s",
+                [value for _, value in fields] + [op['bookId']]
+            )
+    elif kind == 'status.set':
+        cur.execute(
+            """
+            INSERT INTO user_statuses (book_id, user_id, status)
+            SELECT %s, %s, %s WHERE EXISTS (SELECT 1 FROM books WHERE id = %s)
+            ON CONFLICT (book_id, user_id) DO UPDATE SET status = EXCLUDED.status
+            """,
+            (op['bookId'], op['userId'], op['status'], op['bookId'])
+        )
+    elif kind == 'vote.set':
+        if op['value']:
             cur.execute(
                 """
-                INSERT INTO app_state (id, data, updated_at)
-                VALUES (1, %s::jsonb, NOW())
-                ON CONFLICT (id)
-                DO UPDATE SET data = EXCLUDED.data, updated_at = NOW()
+                INSERT INTO votes (book_id, user_id)
+                SELECT %s, %s WHERE EXISTS (SELECT 1 FROM books WHERE id = %s)
+                ON CONFLICT DO NOTHING
                 """,
-                (json.dumps(initial, ensure_ascii=False),)
+                (op['bookId'], op['userId'], op['bookId'])
             )
+        else:
+            cur.execute("DELETE FROM votes WHERE book_id = %s AND user_id = %s", (op['bookId'], op['userId']))
+    elif kind == 'review.add':
+        _pg_insert_review(cur, op['bookId'], op['review'])
+    elif kind == 'review.delete':
+        cur.execute("DELETE FROM reviews WHERE id = %s AND book_id = %s", (op['reviewId'], op['bookId']))
+    elif kind == 'comment.add':
+        _pg_insert_comment(cur, op['reviewId'], op['comment'])
+    elif kind == 'comment.delete':
+        cur.execute("DELETE FROM comments WHERE id = %s AND review_id = %s", (op['commentId'], op['reviewId']))
+    else:
+        raise ValueError(f'未知的变更类型: {kind}')
+
+
+def _pg_bump_version(cur):
+    cur.execute("UPDATE store_meta SET version = version + 1, updated_at = NOW() WHERE id = 1 RETURNING version")
+    return cur.fetchone()[0]
+
+
+def _pg_read_groups(cur, group_ids=None):
+    """读取群组与成员；group_ids 不为 None 时只读这些群组"""
+    if group_ids is None:
+        where = member_where = ''
+        params = ()
+    else:
+        where, member_where = 'WHERE id = ANY(%s)', 'WHERE group_id = ANY(%s)'
+        params = (list(group_ids),)
+    groups = {}
+    cur.execute(f"SELECT id, name, created_at FROM groups {where} ORDER BY id", params)
+    for gid, name, created_at in cur.fetchall():
+        groups[gid] = {'id': gid, 'name': name, 'members': [], 'createdAt': _format_timestamp(created_at)}
+    cur.execute(f"SELECT group_id, user_id FROM group_members {member_where} ORDER BY seq", params)
+    for gid, user_id in cur.fetchall():
+        groups[gid]['members'].append(user_id)
+    return groups
+
+
+def _pg_read_books(cur, group_ids=None):
+    """读取书籍及其阅读状态、投票、书评与评论；group_ids 不为 None 时只读这些群组的书籍"""
+    if group_ids is None:
+        where = owned = reviewed = ''
+        params = ()
+    else:
+        where = 'WHERE group_id = ANY(%s)'
+        owned = 'WHERE book_id IN (SELECT id FROM books WHERE group_id = ANY(%s))'
+        reviewed = f'WHERE review_id IN (SELECT id FROM reviews {owned})'
+        params = (list(group_ids),)
+
+    books = []
+    by_id = {}
+    cur.execute(
+        f"""
+        SELECT id, title, author, synopsis, rating, rating_source, category, cover,
+               resources, added_by, added_at, group_id, status
+        FROM books {where} ORDER BY seq
+        """,
+        params
+    )
+    for row in cur.fetchall():
+        book = {
+            'id': row[0],
+            'title': row[1],
+            'author': row[2],
+            'synopsis': row[3],
+            'rating': row[4],
+            'ratingSource': row[5],
+            'category': row[6],
+            'cover': row[7],
+            'resources': row[8] if not isinstance(row[8], str) else json.loads(row[8]),
+            'addedBy': row[9],
+            'addedAt': _format_timestamp(row[10]),
+            'groupId': row[11],
+            'status': row[12],
+            'userStatuses': {},
+            'votes': {},
+            'reviews': []
+        }
+        books.append(book)
+        by_id[book['id']] = book
+
+    cur.execute(f"SELECT book_id, user_id, status FROM user_statuses {owned} ORDER BY seq", params)
+    for book_id, user_id, status in cur.fetchall():
+        by_id[book_id]['userStatuses'][user_id] = status
+    cur.execute(f"SELECT book_id, user_id FROM votes {owned} ORDER BY seq", params)
+    for book_id, user_id in cur.fetchall():
+        by_id[book_id]['votes'][user_id] = True
+
+    reviews = {}
+    cur.execute(f"SELECT id, book_id, user_id, content, rating, created_at FROM reviews {owned} ORDER BY seq", params)
+    for review_id, book_id, user_id, content, rating, created_at in cur.fetchall():
+        review = {
+            'id': review_id,
+            'userId': user_id,
+            'content': content,
+            'rating': rating,
+            'createdAt': _format_timestamp(created_at),
+            'comments': []
+        }
+        reviews[review_id] = review
+        by_id[book_id]['reviews'].append(review)
+    cur.execute(f"SELECT id, review_id, user_id, content, created_at FROM comments {reviewed} ORDER BY seq", params)
+    for comment_id, review_id, user_id, content, created_at in cur.fetchall():
+        reviews[review_id]['comments'].append({
+            'id': comment_id,
+            'userId': user_id,
+            'content': content,
+            'createdAt': _format_timestamp(created_at)
+        })
+    return books
+
+
+def _read_data_from_postgres():
+    """从关系表组装出与 books.json 相同结构的数据"""
+    with _postgres_connect() as conn:
+        with conn.cursor() as cur:
+            # 多条 SELECT 需要同一个快照
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute("SELECT version FROM store_meta WHERE id = 1")
+            version = cur.fetchone()[0]
+            groups = _pg_read_groups(cur)
+            books = _pg_read_books(cur)
+            cur.execute("SELECT group_id, version FROM group_versions")
+            group_versions = dict(cur.fetchall())
         conn.commit()
-    return initial
+    return ensure_data_schema({'books': books, 'groups': groups}), version, group_versions
+
 
+def _read_changed_groups_from_postgres(known_versions):
+    """只读取版本号与 known_versions 不同的群组。
 
-def _write_data_to_postgres(data):
-    payload = ensure_data_schema(data)
+    返回 (全局版本号, 各群组版本号, {群组 id: (群组或 None, 书籍列表)})。
+    """
     with _postgres_connect() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO app_state (id, data, updated_at)
-                VALUES (1, %s::jsonb, NOW())
-                ON CONFLICT (id)
-                DO UPDATE SET data = EXCLUDED.data, updated_at = NOW()
-                """,
-                (json.dumps(payload, ensure_ascii=False),)
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute("SELECT version FROM store_meta WHERE id = 1")
+            version = cur.fetchone()[0]
+            cur.execute("SELECT group_id, version FROM group_versions")
+            group_versions = dict(cur.fetchall())
+            changed = [gid for gid, v in group_versions.items() if known_versions.get(gid, 0) != v]
+            groups, books = {}, []
+            if changed:
+                groups = _pg_read_groups(cur, changed)
+                books = _pg_read_books(cur, changed)
+        conn.commit()
+    data = ensure_data_schema({'books': books, 'groups': groups})
+    loaded = {gid: (data['groups'].get(gid), []) for gid in changed}
+    for book in data['books']:
+        if book['groupId'] in loaded:
+            loaded[book['groupId']][1].append(book)
+    return version, group_versions, loaded
+
+
+class PostgresTransaction:
+    """一个群组的数据库事务：开始时锁住 group_versions 中该群组的行（SELECT ... FOR UPDATE），
+    提交时把变更记录写成行级 SQL 并递增群组版本号。"""
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        self._stack = contextlib.ExitStack()
+        self.conn = self._stack.enter_context(_postgres_connect())
+        try:
+            self.cur = self.conn.cursor()
+            self.cur.execute(
+                "INSERT INTO group_versions (group_id) VALUES (%s) ON CONFLICT (group_id) DO NOTHING",
+                (group_id,)
+            )
+            self.cur.execute("SELECT version FROM group_versions WHERE group_id = %s FOR UPDATE", (group_id,))
+            self.version = self.cur.fetchone()[0]
+        except BaseException:
+            self._stack.__exit__(*sys.exc_info())
+            raise
+
+    def commit(self, ops):
+        """返回 (群组新版本号, 全局版本号)"""
+        try:
+            for op in ops:
+                _pg_apply_mutation(self.cur, op)
+            self.cur.execute(
+                "UPDATE group_versions SET version = version + 1 WHERE group_id = %s RETURNING version",
+                (self.group_id,)
             )
+            group_version = self.cur.fetchone()[0]
+            self.conn.commit()
+        except BaseException:
+            self._stack.__exit__(*sys.exc_info())
+            raise
+        # 全局版本号在数据提交后单独递增：其它进程看到新版本时一定能读到这次的数据，
+        # 且各群组的写事务不会在同一行上排队。递增失败只影响缓存刷新，返回 None 让调用方重新加载
+        try:
+            stamp = _pg_bump_version(self.cur)
+            self.conn.commit()
+        except Exception:
+            stamp = None
+            self._stack.__exit__(*sys.exc_info())
+        else:
+            self._stack.close()
+        return group_version, stamp
+
+    def rollback(self):
+        try:
+            self.conn.rollback()
+        finally:
+            self._stack.close()
+
+
+def _postgres_state_stamp():
+    with _postgres_connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM store_meta WHERE id = 1")
+            row = cur.fetchone()
         conn.commit()
+    return row[0] if row else None
 
 
-def read_data():
-    """读取数据文件"""
-    with DATA_LOCK:
-        if USE_POSTGRES:
-            return _read_data_from_postgres()
+def migrate_app_state():
+    """一次性迁移：把旧版 app_state 中的整份 JSONB 导入关系表。
 
-        os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-        if not os.path.exists(DATA_FILE):
-            initial = {"books": [], "groups": {}}
-            with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(initial, f, ensure_ascii=False, indent=2)
-            return initial
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return ensure_data_schema(data)
+    只在 store_meta.app_state_migrated 为假时执行，迁移后保留 app_state 原表以便回滚。
+    """
+    with _postgres_connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT app_state_migrated FROM store_meta WHERE id = 1 FOR UPDATE")
+            if cur.fetchone()[0]:
+                conn.commit()
+                return 0
+            cur.execute("SELECT to_regclass('app_state') IS NOT NULL")
+            payload = None
+            if cur.fetchone()[0]:
+                cur.execute("SELECT data FROM app_state WHERE id = 1")
+                row = cur.fetchone()
+                if row and row[0]:
+                    payload = row[0]
+                    if isinstance(payload, str):
+                        payload = json.loads(payload)
+
+            imported = 0
+            if payload:
+                data = ensure_data_schema(payload)
+                for gid, group in data['groups'].items():
+                    if _pg_ensure_group(cur, gid, group.get('createdAt')):
+                        cur.execute("UPDATE groups SET name = %s WHERE id = %s", (group.get('name') or gid, gid))
+                        for user_id in group.get('members', []):
+                            cur.execute(
+                                "INSERT INTO group_members (group_id, user_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                                (gid, user_id)
+                            )
+                for book in data['books']:
+                    _pg_insert_book(cur, book)
+                    imported += 1
+                _pg_bump_version(cur)
+
+            cur.execute("UPDATE store_meta SET app_state_migrated = TRUE WHERE id = 1")
+        conn.commit()
+    if imported:
+        print(f'📦 已从 app_state 迁移 {imported} 本书到关系表')
+    return imported
 
 
 def ensure_data_schema(data):
@@ -1163,60 +3359,1906 @@ def ensure_data_schema(data):
     return data
 
 
-def write_data(data):
-    """写入数据文件"""
-    with DATA_LOCK:
-        if USE_POSTGRES:
-            _write_data_to_postgres(data)
+def _file_state_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _write_json_atomic(path, data):
+    """先写临时文件再原子替换，进程中途崩溃不会留下半截文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonFileBackend:
+    """books.json 整文件存储：每次提交重写完整快照"""
+
+    refresh_interval = 0
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """返回 (数据, 加载时的版本戳, 各群组版本号)"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if not os.path.exists(self.path):
+            initial = {"books": [], "groups": {}}
+            _write_json_atomic(self.path, initial)
+            return initial, self.stamp(), {}
+        # 先取版本戳：读取期间文件若被改动，下次检查会再加载一次
+        stamp = self.stamp()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            return ensure_data_schema(data), stamp, {}
+
+    def begin(self, group_id):
+        """单进程文件存储只靠进程内的群组锁，不需要存储层事务"""
+        return None
+
+    def stamp(self):
+        return _file_state_stamp(self.path)
+
+    def persist(self, data, ops):
+        """data 为已提交的数据（不含 ops），写入的是应用 ops 之后的完整快照"""
+        snapshot = working_copy(data)
+        for op in ops:
+            apply_mutation(snapshot, op)
+        _write_json_atomic(self.path, snapshot)
+
+
+class JournalBackend(JsonFileBackend):
+    """日志式存储：books.json 作为快照，每次变更只向日志追加一行紧凑记录。
+
+    后台定期把日志压缩进快照（写临时文件后原子替换）；启动时读取快照并重放日志尾部。
+    压缩时先把当前日志改名为 .compacting 再写快照，中途崩溃时两份日志都会被重放，
+    变更记录本身可重复应用，因此不会出错。
+    """
+
+    def __init__(self, path, journal_path):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.compacting_path = f"{journal_path}.compacting"
+        self._journal = None
+        self._last_compact = time.monotonic()
+
+    def load(self):
+        self._close_journal()
+        data, stamp, group_versions = super().load()
+        for path in (self.compacting_path, self.journal_path):
+            self._replay(data, path)
+        return data, stamp, group_versions
+
+    def _replay(self, data, path):
+        if not os.path.exists(path):
             return
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                try:
+                    op = json.loads(raw.decode('utf-8'))
+                except ValueError:
+                    break
+                apply_mutation(data, op)
+                good_offset += len(raw)
+        if good_offset < os.path.getsize(path):
+            # 崩溃时写了一半的尾部记录：截掉，避免后续追加接在坏数据后面
+            print(f'⚠️ 日志 {path} 尾部记录不完整，已丢弃 {os.path.getsize(path) - good_offset} 字节')
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def persist(self, data, ops):
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        lines = ''.join(json.dumps(op, ensure_ascii=False, separators=(',', ':')) + '\n' for op in ops)
+        self._journal.write(lines)
+        self._journal.flush()
+        if JOURNAL_FSYNC:
+            os.fsync(self._journal.fileno())
+
+    def journal_size(self):
+        size = 0
+        for path in (self.compacting_path, self.journal_path):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def needs_compaction(self):
+        size = self.journal_size()
+        if not size:
+            return False
+        return size >= JOURNAL_COMPACT_BYTES or time.monotonic() - self._last_compact >= JOURNAL_COMPACT_INTERVAL
+
+    def rotate(self):
+        """在数据锁内调用：把当前日志切到 .compacting，之后的变更写入新日志"""
+        self._close_journal()
+        if os.path.exists(self.journal_path):
+            if os.path.exists(self.compacting_path):
+                # 上一次压缩没完成：把新日志接到旧的 .compacting 后面
+                with open(self.compacting_path, 'ab') as dst, open(self.journal_path, 'rb') as src:
+                    dst.write(src.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.compacting_path)
+        return os.path.exists(self.compacting_path)
+
+    def write_snapshot(self, view):
+        _write_json_atomic(self.path, view)
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+        self._last_compact = time.monotonic()
+
+
+class PostgresBackend:
+    """Postgres 关系表存储：每条变更记录翻译成针对具体行的 INSERT/UPDATE/DELETE"""
+
+    refresh_interval = STORE_REFRESH_INTERVAL
+
+    def load(self):
+        return _read_data_from_postgres()
+
+    def load_groups(self, known_versions):
+        return _read_changed_groups_from_postgres(known_versions)
+
+    def stamp(self):
+        return _postgres_state_stamp()
+
+    def begin(self, group_id):
+        return PostgresTransaction(group_id)
+
+
+def create_storage_backend():
+    if USE_POSTGRES:
+        return PostgresBackend()
+    if DATA_STORAGE == 'journal':
+        return JournalBackend(DATA_FILE, JOURNAL_FILE)
+    return JsonFileBackend(DATA_FILE)
+
+
+def working_copy(data):
+    """数据的浅拷贝：书籍与群组对象都是写时复制，只需复制外层的列表与字典，
+    就能在拷贝上应用变更记录而不影响原数据（拷贝不带索引）"""
+    copied = dict(data)
+    copied['books'] = list(data['books'])
+    copied['groups'] = dict(data['groups'])
+    return copied
 
-        os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
 
+_DELETED = object()
 
-def ensure_group(data, group_id):
+
+class OverlayMap:
+    """只读映射上的私有覆盖层：写入只进 local，删除记为 _DELETED，底层映射保持不变"""
+
+    def __init__(self, base):
+        self.base = base
+        self.local = {}
+
+    def get(self, key, default=None):
+        if key in self.local:
+            value = self.local[key]
+            return default if value is _DELETED else value
+        return self.base.get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _DELETED)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _DELETED) is not _DELETED
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self.local[key] = _DELETED
+        return value
+
+
+class TransactionIndex:
+    """事务工作副本的索引：本事务改动过的条目记在覆盖层，其余直接查已提交的 DataIndex。
+
+    只提供事务内用到的查询（按 id 找书籍/书评、查重、群组书籍、定位）和 apply_mutation 的增量维护。
+    """
+
+    def __init__(self, base, books):
+        self.base = base
+        self.books = books
+        self.books_by_id = OverlayMap(base.books_by_id)
+        self.reviews_by_id = OverlayMap(base.reviews_by_id)
+        self.dedupe_keys = OverlayMap(base.dedupe_keys)
+        self.user_groups = OverlayMap(base.user_groups)
+        self._dropped = []       # 本事务删除的已提交书籍在已提交列表中的位置（有序）
+        self._added = []         # 本事务新增的书籍 id（按追加顺序）
+
+    def _add_details(self, book):
+        book_id = book.get('id')
+        key = DataIndex.dedupe_key(book)
+        self.dedupe_keys[key] = self.dedupe_keys.get(key, frozenset()) | {book_id}
+        for review in book.get('reviews') or []:
+            self.reviews_by_id[review.get('id')] = (book_id, review)
+
+    def _drop_details(self, book):
+        key = DataIndex.dedupe_key(book)
+        self.dedupe_keys[key] = self.dedupe_keys.get(key, frozenset()) - {book.get('id')}
+        for review in book.get('reviews') or []:
+            self.reviews_by_id.pop(review.get('id'))
+
+    def add_book(self, book, pos):
+        self.books_by_id[book.get('id')] = book
+        self._added.append(book.get('id'))
+        self._add_details(book)
+
+    def replace_book(self, old, new):
+        self._drop_details(old)
+        self.books_by_id[new.get('id')] = new
+        self._add_details(new)
+
+    def remove_book(self, book, books):
+        book_id = book.get('id')
+        self._drop_details(book)
+        if book_id in self._added:
+            self._added.remove(book_id)
+        else:
+            pos = self.base.position(book_id)
+            if pos is not None:
+                bisect.insort(self._dropped, pos)
+        self.books_by_id.pop(book_id)
+        self.books = books
+
+    def add_member(self, group_id, user_id):
+        self.user_groups[user_id] = self.user_groups.get(user_id, frozenset()) | {group_id}
+
+    def position(self, book_id):
+        if book_id not in self.books_by_id:
+            return None
+        if book_id in self._added:
+            pos = len(self.books) - len(self._added) + self._added.index(book_id)
+        else:
+            pos = self.base.position(book_id)
+            if pos is not None:
+                pos -= bisect.bisect_left(self._dropped, pos)
+        if pos is None or pos >= len(self.books) or self.books[pos].get('id') != book_id:
+            # 事务期间其它群组删除过书籍，已提交列表的位置整体前移：退回逐个查找
+            pos = next((i for i, b in enumerate(self.books) if b.get('id') == book_id), None)
+        return pos
+
+    def books_in_group(self, group_id):
+        books = [self.books_by_id.get(b.get('id')) for b in self.base.books_in_group(group_id)]
+        books = [b for b in books if b is not None]
+        books.extend(self.books_by_id[i] for i in self._added if self.books_by_id[i].get('groupId') == group_id)
+        return books
+
+    def has_duplicate(self, group_id, key):
+        return bool(self.dedupe_keys.get((group_id, key)))
+
+
+class TransactionData(dict):
+    """事务的工作副本：外层列表与字典是私有拷贝，索引是已提交索引上的覆盖层"""
+
+    def __init__(self, data):
+        super().__init__(working_copy(data))
+        index = _index_of(data)
+        self.index = TransactionIndex(index, self['books']) if index is not None else None
+
+
+class Transaction:
+    """一次读-改-写事务：在群组锁内读取最新数据，变更记录先应用在事务私有的工作副本上，
+    提交成功后才发布到共享数据，其它线程看不到未提交的修改"""
+
+    def __init__(self, store, group_id):
+        self.store = store
+        self.group_id = group_id
+        self.ops = []
+        self._working = None
+
+    @property
+    def data(self):
+        """已提交的数据加上本事务已应用的变更"""
+        if self._working is not None:
+            return self._working
+        return self.store._data
+
+    def apply(self, op):
+        """在工作副本上应用一条变更记录并返回受影响的对象；持久化与发布在事务提交时进行"""
+        if self._working is None:
+            with DATA_LOCK:
+                self._working = TransactionData(self.store._data)
+        result = apply_mutation(self._working, op)
+        self.ops.append(op)
+        return result
+
+
+def build_events(ops):
+    """把变更记录转换成推送给前端的精简事件"""
+    events = []
+    for op in ops:
+        kind = op.get('op')
+        book_id = op.get('bookId')
+        if kind == 'book.add':
+            book = op.get('book') or {}
+            events.append({'type': 'book.added', 'bookId': book.get('id'), 'title': book.get('title', ''), 'userId': book.get('addedBy', '')})
+        elif kind == 'book.delete':
+            events.append({'type': 'book.removed', 'bookId': book_id})
+        elif kind == 'book.update':
+            events.append({'type': 'book.updated', 'bookId': book_id, 'fields': sorted((op.get('fields') or {}).keys())})
+        elif kind == 'status.set':
+            events.append({'type': 'status.changed', 'bookId': book_id, 'userId': op.get('userId'), 'status': op.get('status')})
+        elif kind == 'vote.set':
+            events.append({'type': 'vote.toggled', 'bookId': book_id, 'userId': op.get('userId'), 'value': bool(op.get('value'))})
+        elif kind == 'review.add':
+            review = op.get('review') or {}
+            events.append({'type': 'review.added', 'bookId': book_id, 'reviewId': review.get('id'), 'userId': review.get('userId')})
+        elif kind == 'review.delete':
+            events.append({'type': 'review.removed', 'bookId': book_id, 'reviewId': op.get('reviewId')})
+        elif kind == 'comment.add':
+            comment = op.get('comment') or {}
+            events.append({'type': 'comment.added', 'bookId': book_id, 'reviewId': op.get('reviewId'), 'commentId': comment.get('id'), 'userId': comment.get('userId')})
+        elif kind == 'comment.delete':
+            events.append({'type': 'comment.removed', 'bookId': book_id, 'reviewId': op.get('reviewId'), 'commentId': op.get('commentId')})
+        elif kind == 'member.add':
+            events.append({'type': 'member.joined', 'userId': op.get('userId')})
+        elif kind in ('group.create', 'group.rename'):
+            events.append({'type': 'group.renamed', 'name': op.get('name', '')})
+    return events
+
+
+class EventSubscriber:
+    def __init__(self, group_id, sock, on_close):
+        self.group_id = group_id
+        self.sock = sock
+        self.on_close = on_close
+        self.buffer = bytearray()
+        self.overflow = False
+
+
+class EventHub:
+    """群组动态的 SSE 推送。
+
+    订阅连接交给一个推送线程统一管理：所有套接字非阻塞，写不完的数据留在各自的缓冲区，
+    等可写时再发；缓冲区超过 SSE_MAX_BUFFER 说明客户端跟不上，直接断开，由浏览器带
+    Last-Event-ID 重连补发。每个群组保留最近 SSE_BACKLOG 条事件用于补发，太旧时发送
+    resync 事件让前端全量刷新。空闲时每 SSE_HEARTBEAT 秒发送一次注释行保活。
+    """
+
+    def __init__(self):
+        self._instance = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._pending = []
+        self._dirty = set()
+        self._subscribers = set()
+        self._thread = None
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    def _group(self, group_id):
+        """调用方需持有 self._lock"""
+        group = self._groups.get(group_id)
+        if group is None:
+            group = self._groups[group_id] = {'seq': 0, 'recent': deque(maxlen=SSE_BACKLOG), 'subscribers': set()}
+        return group
+
+    @staticmethod
+    def _frame(event_id, payload):
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        return f'id: {event_id}\ndata: {data}\n\n'.encode('utf-8')
+
+    def publish(self, group_id, ops, version=None):
+        events = build_events(ops)
+        if not events:
+            return
+        with self._lock:
+            group = self._group(group_id)
+            frames = []
+            for event in events:
+                group['seq'] += 1
+                if version:
+                    event['version'] = version
+                frame = self._frame(f"{self._instance}-{group['seq']}", event)
+                group['recent'].append((group['seq'], frame))
+                frames.append(frame)
+            if not group['subscribers']:
+                return
+            chunk = b''.join(frames)
+            for subscriber in group['subscribers']:
+                self._enqueue(subscriber, chunk)
+        self._wake()
+
+    def _enqueue(self, subscriber, chunk):
+        """调用方需持有 self._lock"""
+        if len(subscriber.buffer) + len(chunk) > SSE_MAX_BUFFER:
+            subscriber.overflow = True
+        else:
+            subscriber.buffer += chunk
+        self._dirty.add(subscriber)
+
+    def subscribe(self, group_id, sock, last_event_id, on_close):
+        """接管已发送完响应头的连接；超过订阅上限时返回 None"""
+        subscriber = EventSubscriber(group_id, sock, on_close)
+        with self._lock:
+            if len(self._subscribers) >= SSE_MAX_SUBSCRIBERS:
+                return None
+            group = self._group(group_id)
+            chunk = b'retry: 3000\n\n'
+            instance, _, seq = str(last_event_id or '').partition('-')
+            if last_event_id:
+                recent = group['recent']
+                oldest = recent[0][0] if recent else group['seq'] + 1
+                if instance == self._instance and seq.isdigit() and int(seq) >= oldest - 1:
+                    chunk += b''.join(frame for event_seq, frame in recent if event_seq > int(seq))
+                else:
+                    # 断开期间的事件已经不在缓冲中（或服务重启过），让前端全量刷新
+                    chunk += self._frame(f"{self._instance}-{group['seq']}", {'type': 'resync'})
+            subscriber.buffer += chunk
+            group['subscribers'].add(subscriber)
+            self._subscribers.add(subscriber)
+            self._pending.append(subscriber)
+            self._dirty.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sse-pump', daemon=True)
+                self._thread.start()
+        self._wake()
+        return subscriber
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def _close(self, selector, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            self._dirty.discard(subscriber)
+            group = self._groups.get(subscriber.group_id)
+            if group:
+                group['subscribers'].discard(subscriber)
+        try:
+            selector.unregister(subscriber.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            subscriber.on_close()
+        except Exception:
+            pass
+
+    def _flush(self, selector, subscriber):
+        with self._lock:
+            if subscriber.overflow:
+                data = None
+            else:
+                data = bytes(subscriber.buffer)
+        if data is None:
+            self._close(selector, subscriber)
+            return
+        sent = 0
+        if data:
+            try:
+                sent = subscriber.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self._close(selector, subscriber)
+                return
+        with self._lock:
+            del subscriber.buffer[:sent]
+            waiting = bool(subscriber.buffer)
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if waiting else 0)
+        try:
+            selector.modify(subscriber.sock, events, subscriber)
+        except (KeyError, ValueError):
+            pass
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._wake_r, selectors.EVENT_READ, None)
+        last_beat = time.monotonic()
+        while True:
+            for key, mask in selector.select(timeout=1.0):
+                subscriber = key.data
+                if subscriber is None:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                if mask & selectors.EVENT_READ:
+                    # 客户端不会再发送数据，可读意味着连接已关闭
+                    try:
+                        closed = not subscriber.sock.recv(1024)
+                    except (BlockingIOError, InterruptedError):
+                        closed = False
+                    except OSError:
+                        closed = True
+                    if closed:
+                        self._close(selector, subscriber)
+                        continue
+                if mask & selectors.EVENT_WRITE:
+                    with self._lock:
+                        self._dirty.add(subscriber)
+
+            with self._lock:
+                pending, self._pending = self._pending, []
+            for subscriber in pending:
+                subscriber.sock.setblocking(False)
+                selector.register(subscriber.sock, selectors.EVENT_READ, subscriber)
+
+            if time.monotonic() - last_beat >= SSE_HEARTBEAT:
+                last_beat = time.monotonic()
+                with self._lock:
+                    for subscriber in self._subscribers:
+                        if not subscriber.buffer:
+                            self._enqueue(subscriber, b': ping\n\n')
+
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            for subscriber in dirty:
+                if subscriber in self._subscribers:
+                    self._flush(selector, subscriber)
+
+
+THREADED_SSE_SLOTS = threading.BoundedSemaphore(max(1, SSE_THREADED_MAX_SUBSCRIBERS))
+EVENT_HUB = EventHub()
+
+
+class ChangeLog:
+    """单个群组的有界变更日志：按版本记录每次提交涉及的书籍 id，供增量同步使用。
+
+    floor 之后的所有变更都在日志中；更早的版本只能拿完整数据。
+    """
+
+    def __init__(self, floor, size):
+        self.floor = floor
+        self.size = size
+        self.entries = deque()
+
+    def append(self, version, book_ids):
+        for book_id in book_ids:
+            self.entries.append((version, book_id))
+        while len(self.entries) > self.size:
+            dropped_version, _ = self.entries.popleft()
+            self.floor = max(self.floor, dropped_version)
+
+    def since(self, version):
+        if version < self.floor:
+            return None
+        book_ids = []
+        for entry_version, book_id in self.entries:
+            if entry_version > version and book_id not in book_ids:
+                book_ids.append(book_id)
+        return book_ids
+
+
+class DataStore:
+    """进程内常驻数据：启动时加载一次，读请求直接走内存，写请求通过事务提交变更记录。
+
+    内存数据视为只读，修改一律在 transaction() 内通过 tx.apply() 进行。
+    事务按群组加锁，不同群组的写请求互不阻塞；事务内的变更先写在私有工作副本上，
+    存储层提交成功后才在 DATA_LOCK 内应用到内存数据，落盘的也只有已提交的变更。文件被外部修改（mtime 变化）时
+    会在没有进行中的事务时重新加载；Postgres 的版本号在 DATA_LOCK 之外按间隔查询，
+    有变化时只重新读取版本号变了的群组（见 _poll）。
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._data = None
+        self._stamp = None
+        self._stale = False
+        self._checked_at = 0.0
+        self._group_versions = {}
+        self._own_versions = set()
+        # 数据版本标签的组成：实例标识 + 加载代次 + 版本号，重启或重新加载后旧标签全部失效
+        self._instance = uuid.uuid4().hex[:8]
+        self._epoch = 0
+        self._version = 0
+        self._change_logs = {}
+        self._active = 0
+        self._idle = threading.Condition(DATA_LOCK)
+        self._group_locks = {}
+        self._group_locks_guard = threading.Lock()
+        self._local = threading.local()
+        self._poll_lock = threading.Lock()
+        self._compacting = False
+
+    def _incremental(self):
+        return hasattr(self.backend, 'load_groups')
+
+    def _is_stale(self):
+        if self._stale:
+            return True
+        if self._incremental() or self._compacting:
+            # 版本号由 _poll 在锁外检查；日志压缩期间的文件变化来自本进程
+            return False
+        if self.backend.refresh_interval:
+            # 数据库查询比 stat 贵，按间隔检查即可
+            now = time.monotonic()
+            if now - self._checked_at < self.backend.refresh_interval:
+                return False
+            self._checked_at = now
+        return self.backend.stamp() != self._stamp
+
+    def _current(self):
+        """调用方需持有 DATA_LOCK"""
+        if getattr(self._local, 'in_transaction', False):
+            # 事务内不能等待自己结束，直接使用当前数据
+            return self._data
+        while self._data is None or self._is_stale():
+            # 重新加载会替换整个数据对象，必须等进行中的事务结束
+            if self._active:
+                self._idle.wait()
+                continue
+            data, self._stamp, self._group_versions = self.backend.load()
+            self._data = Dataset(data)
+            self._epoch += 1
+            self._change_logs = {}
+            self._own_versions.clear()
+            self._stale = False
+            self._checked_at = time.monotonic()
+        return self._data
+
+    def _poll(self):
+        """按间隔在 DATA_LOCK 之外查询存储层版本号，有变化时只重新读取变了的群组。
+
+        同一时间只有一个线程查询，其它线程直接使用当前数据，不排队等数据库。
+        """
+        interval = self.backend.refresh_interval
+        if not interval or not self._incremental() or getattr(self._local, 'in_transaction', False):
+            return
+        if self._data is None or time.monotonic() - self._checked_at < interval:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            stamp = self.backend.stamp()
+            known = self._stamp
+            if stamp is None or (known is not None and stamp <= known):
+                return
+            self._refresh_groups()
+        except Exception as e:
+            print(f'⚠️ 检查数据版本失败: {e}')
+        finally:
+            self._poll_lock.release()
+
+    def _refresh_groups(self):
+        """在 DATA_LOCK 之外读取版本号变化的群组，再在锁内把它们同步进内存数据。
+
+        读取期间本进程可能已提交更新的版本，只应用比内存中更新的群组；
+        期间发生过完整重新加载时放弃这次结果。
+        """
+        with DATA_LOCK:
+            known = dict(self._group_versions)
+            data = self._data
+        stamp, group_versions, loaded = self.backend.load_groups(known)
+        with DATA_LOCK:
+            if self._data is None or self._data is not data:
+                return
+            changed = False
+            for gid, (group, books) in loaded.items():
+                version = group_versions.get(gid, 0)
+                if version <= self._group_versions.get(gid, 0):
+                    continue
+                for op in group_refresh_ops(self._data, gid, group, books):
+                    apply_mutation(self._data, op)
+                self._group_versions[gid] = version
+                changed = True
+            if changed:
+                # 变更日志不含其它实例的改动，让客户端的增量同步令牌失效
+                self._epoch += 1
+                self._change_logs = {}
+            if self._stamp is None or stamp > self._stamp:
+                self._stamp = stamp
+                self._own_versions = {v for v in self._own_versions if v > stamp}
+                self._advance_stamp()
+
+    def get(self):
+        self._poll()
+        with DATA_LOCK:
+            return self._current()
+
+    def group_version(self, group_id):
+        self._poll()
+        with DATA_LOCK:
+            self._current()
+            return self._group_versions.get(group_id or '', 0)
+
+    def _version_of(self, group_id):
+        return self._group_versions.get(group_id, 0) if group_id else self._version
+
+    def etag(self, group_id=''):
+        """群组数据的版本标签（group_id 为空时对应全部数据），任何提交都会让相关标签变化"""
+        self._poll()
+        with DATA_LOCK:
+            self._current()
+            return f'W/"{self._instance}-{self._epoch}-{self._version_of(group_id)}"'
+
+    def version_token(self, group_id):
+        with DATA_LOCK:
+            return f'{self._instance}-{self._epoch}-{self._version_of(group_id)}'
+
+    def changes_since(self, group_id, since):
+        """增量同步：返回 (当前版本令牌, since 之后变化过的书籍 id 列表)。
+
+        since 来自本实例本次加载之前的令牌，或已超出变更日志范围时，id 列表为 None，
+        调用方应返回完整数据。
+        """
+        self._poll()
+        with DATA_LOCK:
+            self._current()
+            version = self._version_of(group_id)
+            token = f'{self._instance}-{self._epoch}-{version}'
+            instance, _, rest = str(since or '').partition('-')
+            epoch, _, since_version = rest.partition('-')
+            if instance != self._instance or epoch != str(self._epoch) or not since_version.isdigit():
+                return token, None
+            since_version = int(since_version)
+            if since_version > version:
+                return token, None
+            log = self._change_logs.get(group_id)
+            if log is None:
+                # 本次加载以来该群组没有提交过
+                return token, [] if since_version == version else None
+            return token, log.since(since_version)
+
+    def _log_changes(self, group_id, ops):
+        """调用方需持有 DATA_LOCK，且已更新版本号"""
+        book_ids = []
+        for op in ops:
+            book_id = op.get('bookId') or (op.get('book') or {}).get('id')
+            if book_id and book_id not in book_ids:
+                book_ids.append(book_id)
+        for key, version in ((group_id, self._group_versions.get(group_id, 0)), ('', self._version)):
+            log = self._change_logs.get(key)
+            if log is None:
+                log = self._change_logs[key] = ChangeLog(version - 1, CHANGE_LOG_SIZE)
+            log.append(version, book_ids)
+
+    def _group_lock(self, group_id):
+        with self._group_locks_guard:
+            lock = self._group_locks.get(group_id)
+            if lock is None:
+                lock = self._group_locks[group_id] = threading.Lock()
+            return lock
+
+    def _enter(self):
+        with DATA_LOCK:
+            self._current()
+            self._active += 1
+
+    def _leave(self, stale=False):
+        with DATA_LOCK:
+            self._active -= 1
+            if stale:
+                self._stale = True
+            self._idle.notify_all()
+
+    def _record_stamp(self, stamp):
+        """提交后更新版本戳：只有连续的本进程版本才推进，出现空缺说明别的进程也写过"""
+        if stamp is None:
+            self._stamp = self.backend.stamp()
+            return
+        if self._stamp is None or not isinstance(stamp, int):
+            self._stamp = stamp
+            return
+        self._own_versions.add(stamp)
+        self._advance_stamp()
+
+    def _advance_stamp(self):
+        while self._stamp + 1 in self._own_versions:
+            self._stamp += 1
+            self._own_versions.discard(self._stamp)
+
+    @contextlib.contextmanager
+    def transaction(self, group_id):
+        """群组级读-改-写事务。
+
+        用法::
+
+            with STORE.transaction(group_id) as tx:
+                book = find_book(tx.data, book_id)
+                tx.apply({'op': 'vote.set', ...})
+
+        Postgres 后端会在数据库事务中锁住该群组的版本行，并与内存中的版本比对，
+        其它进程先改过这个群组时重新加载后再执行。
+        """
+        group_id = group_id or ''
+        with self._group_lock(group_id):
+            handle = None
+            for _ in range(3):
+                self._enter()
+                try:
+                    handle = self.backend.begin(group_id)
+                except Exception:
+                    self._leave()
+                    raise
+                if handle is None or handle.version == self._group_versions.get(group_id, 0):
+                    break
+                handle.rollback()
+                handle = None
+                if self._incremental():
+                    self._leave()
+                    self._refresh_groups()
+                else:
+                    self._leave(stale=True)
+            else:
+                raise RuntimeError('数据被其它实例并发修改，请稍后重试')
+
+            tx = Transaction(self, group_id)
+            committed = False
+            self._local.in_transaction = True
+            try:
+                yield tx
+                if tx.ops:
+                    if handle is not None:
+                        # commit() 出错时自行回滚并归还连接，之后不能再调用 rollback()
+                        pending, handle = handle, None
+                        group_version, stamp = pending.commit(tx.ops)
+                        with DATA_LOCK:
+                            self._publish(tx.ops)
+                            self._group_versions[group_id] = group_version
+                            self._version += 1
+                            self._log_changes(group_id, tx.ops)
+                            if stamp is None:
+                                # 全局版本号没能递增：下次访问时重新检查
+                                self._checked_at = 0.0
+                            else:
+                                self._record_stamp(stamp)
+                    else:
+                        with DATA_LOCK:
+                            stamp = self.backend.persist(self._data, tx.ops)
+                            self._publish(tx.ops)
+                            self._group_versions[group_id] = self._group_versions.get(group_id, 0) + 1
+                            self._version += 1
+                            self._log_changes(group_id, tx.ops)
+                            self._record_stamp(stamp)
+                committed = True
+            finally:
+                self._local.in_transaction = False
+                if handle is not None and not committed:
+                    handle.rollback()
+                # 提交失败时内存数据未被修改；仍从存储重新加载一次，
+                # 以防存储层处于不确定状态（例如日志只写了一半）
+                self._leave(stale=bool(tx.ops) and not committed)
+            if tx.ops:
+                EVENT_HUB.publish(group_id, tx.ops, self.version_token(group_id))
+
+    def _publish(self, ops):
+        """调用方需持有 DATA_LOCK：把已提交的变更记录应用到内存数据"""
+        for op in ops:
+            apply_mutation(self._data, op)
+
+    def compact(self):
+        if not isinstance(self.backend, JournalBackend):
+            return
+        with DATA_LOCK:
+            if self._data is None or not self.backend.rotate():
+                return
+            # 书籍与群组对象写时复制，浅拷贝即可得到一致的时间点视图
+            view = working_copy(self._data)
+            # 快照在锁外写入：期间 books.json 的版本戳会变，不能被当成外部修改而重新加载
+            self._compacting = True
+        try:
+            self.backend.write_snapshot(view)
+        finally:
+            with DATA_LOCK:
+                self._stamp = self.backend.stamp()
+                self._compacting = False
+
+    def check_views(self, repair=True):
+        """一致性检查：从头重建群组概览/个人主页的物化视图并与增量维护的结果比较，
+        不一致时（repair=True）换成重建的结果。返回是否一致。"""
+        with DATA_LOCK:
+            data = self._current()
+            index = _index_of(data)
+            if index is None:
+                return True
+            rebuilt = GroupViews(data['books'])
+            if rebuilt.state() == index.views.state():
+                return True
+            if repair:
+                index.views = rebuilt
+        print('⚠️ 物化视图与数据不一致' + ('，已重建' if repair else ''))
+        return False
+
+    def start_background_tasks(self):
+        if VIEW_CHECK_INTERVAL > 0:
+            def checker():
+                while True:
+                    time.sleep(VIEW_CHECK_INTERVAL)
+                    try:
+                        self.check_views()
+                    except Exception as e:
+                        print(f'⚠️ 物化视图检查失败: {e}')
+
+            threading.Thread(target=checker, name='view-checker', daemon=True).start()
+
+        if not isinstance(self.backend, JournalBackend):
+            return
+
+        def compactor():
+            while True:
+                time.sleep(1)
+                try:
+                    if self.backend.needs_compaction():
+                        self.compact()
+                except Exception as e:
+                    print(f'⚠️ 日志压缩失败: {e}')
+
+        threading.Thread(target=compactor, name='journal-compactor', daemon=True).start()
+
+
+STORE = DataStore(create_storage_backend())
+
+
+def read_data():
+    """读取数据（共享的内存快照，调用方不可修改）"""
+    return STORE.get()
+
+
+def data_transaction(group_id):
+    """开启群组级读-改-写事务，见 DataStore.transaction"""
+    return STORE.transaction(group_id)
+
+
+class RequestError(Exception):
+    """在事务内发现请求无法执行（对象不存在、无权限等）时抛出，
+    事务随之回滚、释放群组锁，之后再由处理器写出错误响应"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def ensure_group(data, group_id, created_at=None):
     if not group_id:
         return
     if str(group_id).startswith('solo:'):
         return
-    if group_id not in data['groups']:
-        data['groups'][group_id] = {
+    group = data['groups'].get(group_id)
+    if group is None:
+        groups = dict(data['groups'])
+        groups[group_id] = {
             'id': group_id,
             'name': group_id,
             'members': [],
-            'createdAt': datetime.now(timezone.utc).isoformat()
+            'createdAt': created_at or datetime.now(timezone.utc).isoformat()
         }
-    elif not str(data['groups'][group_id].get('name', '')).strip():
-        data['groups'][group_id]['name'] = group_id
+        data['groups'] = groups
+    elif not str(group.get('name', '')).strip():
+        data['groups'][group_id] = dict(group, name=group_id)
 
 
-def ensure_member(data, group_id, user_id):
+def ensure_member(data, group_id, user_id, created_at=None):
     if not group_id or not user_id:
         return
     if str(group_id).startswith('solo:'):
         return
-    ensure_group(data, group_id)
-    members = data['groups'][group_id].get('members', [])
+    ensure_group(data, group_id, created_at)
+    group = data['groups'][group_id]
+    members = group.get('members', [])
     if user_id not in members:
-        members.append(user_id)
-    data['groups'][group_id]['members'] = members
+        data['groups'][group_id] = dict(group, members=members + [user_id])
+        if _index_of(data) is not None:
+            data.index.add_member(group_id, user_id)
+
+
+def member_ops(data, group_id, user_id):
+    """若用户尚不是群组成员，返回加入群组的变更记录"""
+    if not group_id or not user_id or str(group_id).startswith('solo:'):
+        return []
+    group = (data.get('groups') or {}).get(group_id) or {}
+    if user_id in group.get('members', []):
+        return []
+    return [{
+        'op': 'member.add',
+        'groupId': group_id,
+        'userId': user_id,
+        'createdAt': datetime.now(timezone.utc).isoformat()
+    }]
+
+
+class SearchIndex:
+    """群组内书籍、书评与评论的倒排索引，随书籍变化增量维护（DataIndex 的一部分）。
+
+    文档 key 为 ('book', 书籍 id)、('review', 书评 id) 或 ('comment', 评论 id)；
+    书籍文档中书名、作者的词频按 SEARCH_FIELD_WEIGHTS 加权。倒排表原地修改，
+    读写都在 self._lock 内进行。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.postings = {}      # 群组 id -> {词: {文档 key: 加权词频}}
+        self.char_terms = {}    # 群组 id -> {汉字: 包含该字的词集合}，用于单字查询
+        self.docs = {}          # 文档 key -> (群组 id, 文档信息, 词频 Counter, 长度)
+        self.group_sizes = {}   # 群组 id -> [文档数, 总长度]
+        self.lengths = {}       # 文档 key -> 长度
+
+    @staticmethod
+    def _documents(book):
+        """一本书拆成的文档：{文档 key: (文档信息, 加权词频)}"""
+        if book is None:
+            return {}
+        book_id = book.get('id')
+        title = book.get('title') or ''
+        terms = Counter()
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            for token in search_tokens(book.get(field)):
+                terms[token] += weight
+        docs = {('book', book_id): ({'type': 'book', 'bookId': book_id, 'bookTitle': title,
+                                     'text': book.get('synopsis') or f"{title} {book.get('author') or ''}"}, terms)}
+        for review in book.get('reviews') or []:
+            docs[('review', review.get('id'))] = ({
+                'type': 'review', 'bookId': book_id, 'bookTitle': title, 'reviewId': review.get('id'),
+                'userId': review.get('userId'), 'text': review.get('content') or '', 'createdAt': review.get('createdAt')
+            }, Counter(search_tokens(review.get('content'))))
+            for comment in review.get('comments') or []:
+                docs[('comment', comment.get('id'))] = ({
+                    'type': 'comment', 'bookId': book_id, 'bookTitle': title, 'reviewId': review.get('id'),
+                    'commentId': comment.get('id'), 'userId': comment.get('userId'),
+                    'text': comment.get('content') or '', 'createdAt': comment.get('createdAt')
+                }, Counter(search_tokens(comment.get('content'))))
+        return docs
+
+    def _remove(self, key):
+        gid, _, terms, length = self.docs.pop(key)
+        del self.lengths[key]
+        postings = self.postings.get(gid, {})
+        for token in terms:
+            docs = postings.get(token)
+            if docs is not None:
+                docs.pop(key, None)
+                if not docs:
+                    del postings[token]
+                    self._unlink_chars(gid, token)
+        size = self.group_sizes[gid]
+        size[0] -= 1
+        size[1] -= length
+
+    def _add(self, gid, key, info, terms):
+        length = sum(terms.values())
+        self.docs[key] = (gid, info, terms, length)
+        self.lengths[key] = length
+        postings = self.postings.setdefault(gid, {})
+        for token, freq in terms.items():
+            if token not in postings:
+                postings[token] = {}
+                self._link_chars(gid, token)
+            postings[token][key] = freq
+        size = self.group_sizes.setdefault(gid, [0, 0])
+        size[0] += 1
+        size[1] += length
+
+    @staticmethod
+    def _cjk_chars(token):
+        return {ch for ch in token if '\u4e00' <= ch <= '\u9fff'}
+
+    def _link_chars(self, gid, token):
+        chars = self.char_terms.setdefault(gid, {})
+        for ch in self._cjk_chars(token):
+            chars.setdefault(ch, set()).add(token)
+
+    def _unlink_chars(self, gid, token):
+        chars = self.char_terms.get(gid, {})
+        for ch in self._cjk_chars(token):
+            terms = chars.get(ch)
+            if terms is not None:
+                terms.discard(token)
+                if not terms:
+                    del chars[ch]
+
+    def update_book(self, old, new):
+        """书籍新增（old 为 None）、修改或删除（new 为 None）后只重建内容有变化的文档"""
+        if (old is not None and new is not None and old.get('reviews') is new.get('reviews')
+                and all(old.get(field) == new.get(field) for field in SEARCH_FIELD_WEIGHTS)):
+            # 投票、阅读状态等不影响检索内容
+            return
+        gid = (new or old).get('groupId')
+        old_docs = self._documents(old)
+        new_docs = self._documents(new)
+        with self._lock:
+            for key, (info, terms) in old_docs.items():
+                if key in self.docs and new_docs.get(key) != (info, terms):
+                    self._remove(key)
+            for key, (info, terms) in new_docs.items():
+                if key not in self.docs:
+                    self._add(gid, key, info, terms)
+
+    def search(self, group_id, query, offset=0, limit=20):
+        """所有查询词都出现的文档按 BM25 打分，返回 (命中总数, 本页结果)"""
+        tokens = list(dict.fromkeys(search_tokens(query)))
+        if not tokens:
+            return 0, []
+        with self._lock:
+            postings = self.postings.get(group_id) or {}
+            doc_count, total_length = self.group_sizes.get(group_id, (0, 0))
+            lists = []
+            for token in tokens:
+                docs = postings.get(token)
+                if not docs and len(token) == 1 and '\u4e00' <= token <= '\u9fff':
+                    # 单个汉字：合并包含该字的所有词（字到词的映射在建索引时维护）
+                    docs = {}
+                    for term in self.char_terms.get(group_id, {}).get(token, ()):
+                        for key, freq in postings[term].items():
+                            docs[key] = docs.get(key, 0) + freq
+                if not docs:
+                    return 0, []
+                lists.append(docs)
+            lists.sort(key=len)
+            weighted = [(docs, 2.2 * math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))) for docs in lists]
+            (first, first_idf), rest = weighted[0], weighted[1:]
+            length_factor = 0.9 * doc_count / total_length if total_length else 0
+            lengths = self.lengths
+            scored = []
+            for key, freq in first.items():
+                norm = 0.3 + length_factor * lengths[key]
+                score = first_idf * freq / (freq + norm)
+                for docs, idf in rest:
+                    freq = docs.get(key)
+                    if freq is None:
+                        break
+                    score += idf * freq / (freq + norm)
+                else:
+                    scored.append((score, key))
+            top = heapq.nlargest(offset + limit, scored, key=lambda item: item[0])[offset:]
+            hits = [dict(self.docs[key][1], score=round(score, 3)) for score, key in top]
+        for hit in hits:
+            hit['snippet'] = search_snippet(hit.pop('text'), tokens)
+        return len(scored), hits
+
+
+def search_snippet(text, tokens, width=80):
+    """截取第一个查询词附近的一段文字作为摘要"""
+    text = re.sub(r'\s+', ' ', str(text or '')).strip()
+    lowered = text.lower()
+    pos = min((p for p in (lowered.find(t) for t in tokens) if p >= 0), default=0)
+    start = max(0, pos - width // 4)
+    snippet = text[start:start + width]
+    return ('…' if start > 0 else '') + snippet + ('…' if start + width < len(text) else '')
+
+
+class GroupViews:
+    """群组概览与个人主页的物化视图，随书籍变化增量维护（DataIndex 的一部分）：
+
+    - shelves: (群组 id, 用户 id) -> {书籍 id: (在读/已读状态或 None, 是否想读)}
+    - user_reviews: (群组 id, 用户 id) -> {书籍 id: True}，该用户写过书评的书
+    - reviewed_books: 群组 id -> {书籍 id: True}，有书评的书
+    - shared_reading: 群组 id -> {书籍 id: 在读用户元组}，只记录两人及以上在读的书
+
+    视图只记录书籍 id，书名等信息在读取时从 books_by_id 取，修改书籍信息不需要更新视图；
+    群组成员在读取时过滤，新成员加入也不需要更新。与 DataIndex 一样值都整体替换。
+    """
+
+    def __init__(self, books=()):
+        self.shelves = {}
+        self.user_reviews = {}
+        self.reviewed_books = {}
+        self.shared_reading = {}
+        for book in books:
+            self.update_book(None, book)
+
+    @staticmethod
+    def _contribution(book):
+        """一本书对各视图的贡献：(书架条目, 写过书评的用户, 在读用户)"""
+        if book is None:
+            return {}, frozenset(), ()
+        statuses = book.get('userStatuses') or {}
+        votes = book.get('votes') or {}
+        shelf = {}
+        for user_id, status in statuses.items():
+            if status in ('reading', 'finished'):
+                shelf[user_id] = (status, bool(votes.get(user_id)))
+        for user_id, voted in votes.items():
+            if voted and user_id not in shelf:
+                shelf[user_id] = (None, True)
+        reviewers = frozenset(r.get('userId') for r in book.get('reviews') or [])
+        readers = tuple(user_id for user_id, status in statuses.items() if status == 'reading')
+        return shelf, reviewers, readers if len(readers) >= 2 else ()
+
+    @staticmethod
+    def _set(table, key, book_id, value):
+        current = table.get(key) or {}
+        if value is None:
+            if book_id not in current:
+                return
+            updated = dict(current)
+            del updated[book_id]
+            if updated:
+                table[key] = updated
+            else:
+                table.pop(key, None)
+        else:
+            table[key] = {**current, book_id: value}
+
+    def update_book(self, old, new):
+        """书籍新增（old 为 None）、修改或删除（new 为 None）后更新受影响的条目"""
+        book = new or old
+        book_id = book.get('id')
+        gid = book.get('groupId')
+        old_shelf, old_reviewers, old_readers = self._contribution(old)
+        new_shelf, new_reviewers, new_readers = self._contribution(new)
+
+        for user_id in old_shelf.keys() | new_shelf.keys():
+            if old_shelf.get(user_id) != new_shelf.get(user_id):
+                self._set(self.shelves, (gid, user_id), book_id, new_shelf.get(user_id))
+        for user_id in old_reviewers ^ new_reviewers:
+            self._set(self.user_reviews, (gid, user_id), book_id, True if user_id in new_reviewers else None)
+        if bool(old_reviewers) != bool(new_reviewers):
+            self._set(self.reviewed_books, gid, book_id, True if new_reviewers else None)
+        if old_readers != new_readers:
+            self._set(self.shared_reading, gid, book_id, new_readers or None)
+
+    def state(self):
+        return self.shelves, self.user_reviews, self.reviewed_books, self.shared_reading
+
+
+class DataIndex:
+    """内存二级索引，随每条变更记录增量维护：
+
+    - books_by_id: 书籍 id -> 书籍
+    - book_pos: 书籍 id -> 加入时在 data['books'] 中的位置；删除只记墓碑（_removed），
+      实际位置由 position() 换算，墓碑积累到一定数量后才重建
+    - group_books: 群组 id -> 书籍 id 元组（按添加顺序）
+    - user_groups: 用户 id -> 所在群组 id 集合
+    - reviews_by_id: 书评 id -> (书籍 id, 书评)
+    - dedupe_keys: (群组 id, normalize_key) -> 书籍 id 集合
+    - views: 群组概览与个人主页的物化视图（GroupViews）
+    - search: 书籍、书评与评论的全文索引（SearchIndex）
+    - titles: 群组 id -> 该群组书籍的书名/作者前缀索引（PrefixIndex），用于书名联想
+    - page_keys: 群组 id -> 按 (addedAt, id) 排序的列表，用于游标分页；all_page_keys 对应全部书籍
+
+    读请求不加锁直接读取，所以作为值的元组/集合都整体替换而不原地修改。
+    """
+
+    def __init__(self, data):
+        self.books_by_id = {}
+        self.book_pos = {}
+        self._removed = []
+        self.group_books = {}
+        self.user_groups = {}
+        self.reviews_by_id = {}
+        self.dedupe_keys = {}
+        self.views = GroupViews()
+        self.search = SearchIndex()
+        self.titles = {}
+        self.page_keys = {}
+        for pos, book in enumerate(data['books']):
+            self._add_book(book, pos)
+            self.page_keys.setdefault(book.get('groupId'), []).append(self.page_key(book))
+        for keys in self.page_keys.values():
+            keys.sort()
+        self.all_page_keys = sorted(self.page_key(book) for book in data['books'])
+        by_group = {}
+        for book in data['books']:
+            by_group.setdefault(book.get('groupId'), []).append(self._title_item(book))
+        for gid, items in by_group.items():
+            self._titles(gid).add_many(items)
+        for gid, group in data['groups'].items():
+            for user_id in group.get('members', []):
+                self.add_member(gid, user_id)
+
+    @staticmethod
+    def dedupe_key(book):
+        return (str(book.get('groupId', '')).strip(), normalize_key(book.get('title', ''), book.get('author', '')))
+
+    def _add_book(self, book, pos):
+        book_id = book.get('id')
+        gid = book.get('groupId')
+        self.books_by_id[book_id] = book
+        # 删除的书籍都在新书之前，记录的位置要加上墓碑数
+        self.book_pos[book_id] = pos + len(self._removed)
+        self.group_books[gid] = self.group_books.get(gid, ()) + (book_id,)
+        key = self.dedupe_key(book)
+        self.dedupe_keys[key] = self.dedupe_keys.get(key, frozenset()) | {book_id}
+        for review in book.get('reviews') or []:
+            self.reviews_by_id[review.get('id')] = (book_id, review)
+        self.views.update_book(None, book)
+        self.search.update_book(None, book)
+
+    def _drop_book_details(self, book):
+        key = self.dedupe_key(book)
+        remaining = self.dedupe_keys.get(key, frozenset()) - {book.get('id')}
+        if remaining:
+            self.dedupe_keys[key] = remaining
+        else:
+            self.dedupe_keys.pop(key, None)
+        for review in book.get('reviews') or []:
+            self.reviews_by_id.pop(review.get('id'), None)
+
+    def add_book(self, book, pos):
+        self._add_book(book, pos)
+        self._add_title(book)
+        self._update_page_key(book, True)
+
+    @staticmethod
+    def page_key(book):
+        return book.get('addedAt') or '', book.get('id') or ''
+
+    @staticmethod
+    def _with_key(keys, key, present):
+        """插入或删除 key 后的新有序列表（读请求不加锁，列表不原地修改）"""
+        keys = list(keys)
+        pos = bisect.bisect_left(keys, key)
+        found = pos < len(keys) and keys[pos] == key
+        if present and not found:
+            keys.insert(pos, key)
+        elif not present and found:
+            del keys[pos]
+        return keys
+
+    def _update_page_key(self, book, present):
+        key = self.page_key(book)
+        gid = book.get('groupId')
+        self.page_keys[gid] = self._with_key(self.page_keys.get(gid, ()), key, present)
+        self.all_page_keys = self._with_key(self.all_page_keys, key, present)
+
+    @staticmethod
+    def _title_item(book):
+        return book.get('id'), book.get('title'), book.get('author'), {
+            'title': book.get('title') or '',
+            'author': book.get('author') or '',
+            'year': None,
+            'source': '书单',
+            'groupId': book.get('groupId')
+        }
+
+    def _titles(self, group_id):
+        titles = self.titles.get(group_id)
+        if titles is None:
+            titles = self.titles[group_id] = PrefixIndex()
+        return titles
+
+    def _add_title(self, book):
+        self._titles(book.get('groupId')).add(*self._title_item(book))
+
+    def replace_book(self, old, new):
+        book_id = new.get('id')
+        self._drop_book_details(old)
+        self.books_by_id[book_id] = new
+        key = self.dedupe_key(new)
+        self.dedupe_keys[key] = self.dedupe_keys.get(key, frozenset()) | {book_id}
+        for review in new.get('reviews') or []:
+            self.reviews_by_id[review.get('id')] = (book_id, review)
+        self.views.update_book(old, new)
+        self.search.update_book(old, new)
+        if (old.get('title'), old.get('author')) != (new.get('title'), new.get('author')):
+            self._add_title(new)
+        if self.page_key(old) != self.page_key(new):
+            self._update_page_key(old, False)
+            self._update_page_key(new, True)
+
+    def remove_book(self, book, books):
+        book_id = book.get('id')
+        gid = book.get('groupId')
+        self._drop_book_details(book)
+        self._update_page_key(book, False)
+        self.views.update_book(book, None)
+        self.search.update_book(book, None)
+        if gid in self.titles:
+            self.titles[gid].remove(book_id)
+        self.books_by_id.pop(book_id, None)
+        self.group_books[gid] = tuple(i for i in self.group_books.get(gid, ()) if i != book_id)
+        pos = self.book_pos.pop(book_id, None)
+        if pos is None:
+            return
+        removed = list(self._removed)
+        bisect.insort(removed, pos)
+        if len(removed) > max(64, math.isqrt(len(books))):
+            self.book_pos = {b.get('id'): i for i, b in enumerate(books)}
+            removed = []
+        self._removed = removed
+
+    def position(self, book_id):
+        """书籍在 data['books'] 中的实际位置：记录的位置减去它之前的墓碑数"""
+        pos = self.book_pos.get(book_id)
+        if pos is None:
+            return None
+        return pos - bisect.bisect_left(self._removed, pos)
+
+    def add_member(self, group_id, user_id):
+        self.user_groups[user_id] = self.user_groups.get(user_id, frozenset()) | {group_id}
+
+    def ordered(self, book_ids):
+        """按书籍在列表中的顺序排列 id，跳过已删除的书籍"""
+        by_id = self.books_by_id
+        return sorted((i for i in book_ids if i in by_id), key=lambda i: self.book_pos.get(i, 0))
+
+    def books_in_group(self, group_id):
+        by_id = self.books_by_id
+        return [by_id[i] for i in self.group_books.get(group_id, ()) if i in by_id]
+
+    def has_duplicate(self, group_id, key):
+        return bool(self.dedupe_keys.get((group_id, key)))
+
+
+class Dataset(dict):
+    """带内存索引的数据集；序列化结果与普通 dict 相同"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.index = DataIndex(self)
+
+
+def _index_of(data):
+    return getattr(data, 'index', None)
+
+
+def find_book(data, book_id):
+    index = _index_of(data)
+    if index is not None:
+        return index.books_by_id.get(book_id)
+    return next((b for b in data['books'] if b.get('id') == book_id), None)
+
+
+def find_review(data, review_id):
+    """返回 (书籍 id, 书评)，找不到时返回 (None, None)"""
+    index = _index_of(data)
+    if index is not None:
+        return index.reviews_by_id.get(review_id, (None, None))
+    for book in data['books']:
+        for review in book.get('reviews') or []:
+            if review.get('id') == review_id:
+                return book.get('id'), review
+    return None, None
+
+
+def has_duplicate_book(data, group_id, title, author):
+    key = normalize_key(title, author)
+    index = _index_of(data)
+    if index is not None:
+        return index.has_duplicate(group_id, key)
+    return any(DataIndex.dedupe_key(b) == (group_id, key) for b in data['books'])
+
+
+def book_group_id(book_id):
+    """书籍所属群组（书籍不会换群组，可在事务外查询用来确定锁）"""
+    book = find_book(read_data(), book_id)
+    return book.get('groupId', 'default') if book else ''
+
+
+def _replace_book(data, book_id, update):
+    index = _index_of(data)
+    if index is not None:
+        idx = index.position(book_id)
+    else:
+        idx = next((i for i, b in enumerate(data['books']) if b.get('id') == book_id), None)
+    if idx is None:
+        return None
+    old = data['books'][idx]
+    book = dict(old)
+    result = update(book)
+    data['books'][idx] = book
+    if index is not None:
+        index.replace_book(old, book)
+    return result
+
+
+def _replace_review(book, review_id, update):
+    reviews = list(book.get('reviews') or [])
+    idx = next((i for i, r in enumerate(reviews) if r.get('id') == review_id), None)
+    if idx is None:
+        return None
+    review = dict(reviews[idx])
+    result = update(review)
+    reviews[idx] = review
+    book['reviews'] = reviews
+    return result
+
+
+def apply_mutation(data, op):
+    """把一条变更记录应用到内存数据上，返回受影响的对象。
+
+    书籍、书评、群组对象按写时复制替换而不是原地修改，并发的读请求
+    拿到的要么是完整的旧对象要么是完整的新对象。变更记录只描述最终状态
+    （例如投票记为 value=True/False 而不是“切换”），重复应用结果不变，
+    日志重放因此是安全的。
+    """
+    kind = op.get('op')
+
+    if kind == 'group.create':
+        ensure_group(data, op['groupId'], op.get('createdAt'))
+        if op.get('name') and op['groupId'] in data['groups']:
+            data['groups'][op['groupId']] = dict(data['groups'][op['groupId']], name=op['name'])
+        return data['groups'].get(op['groupId'])
+
+    if kind == 'group.rename':
+        ensure_group(data, op['groupId'], op.get('createdAt'))
+        if op['groupId'] in data['groups']:
+            data['groups'][op['groupId']] = dict(data['groups'][op['groupId']], name=op['name'])
+        return data['groups'].get(op['groupId'])
+
+    if kind == 'member.add':
+        ensure_member(data, op['groupId'], op['userId'], op.get('createdAt'))
+        return data['groups'].get(op['groupId'])
+
+    if kind == 'book.add':
+        book = op['book']
+        if find_book(data, book['id']) is None:
+            data['books'].append(book)
+            if _index_of(data) is not None:
+                data.index.add_book(book, len(data['books']) - 1)
+        return book
+
+    if kind == 'book.delete':
+        removed = find_book(data, op['bookId'])
+        if removed is not None:
+            index = _index_of(data)
+            if index is not None:
+                pos = index.position(op['bookId'])
+                data['books'] = data['books'][:pos] + data['books'][pos + 1:]
+                index.remove_book(removed, data['books'])
+            else:
+                data['books'] = [b for b in data['books'] if b.get('id') != op['bookId']]
+        return removed
+
+    if kind == 'book.update':
+        def update(book):
+            book.update(op['fields'])
+            return book
+        return _replace_book(data, op['bookId'], update)
+
+    if kind == 'status.set':
+        def update(book):
+            statuses = dict(book.get('userStatuses') or {})
+            statuses[op['userId']] = op['status']
+            book['userStatuses'] = statuses
+            return book
+        return _replace_book(data, op['bookId'], update)
+
+    if kind == 'vote.set':
+        def update(book):
+            votes = dict(book.get('votes') or {})
+            if op['value']:
+                votes[op['userId']] = True
+            else:
+                votes.pop(op['userId'], None)
+            book['votes'] = votes
+            return book
+        return _replace_book(data, op['bookId'], update)
+
+    if kind == 'review.add':
+        def update(book):
+            reviews = list(book.get('reviews') or [])
+            if not any(r.get('id') == op['review']['id'] for r in reviews):
+                reviews.append(op['review'])
+            book['reviews'] = reviews
+            return op['review']
+        return _replace_book(data, op['bookId'], update)
+
+    if kind == 'review.delete':
+        def update(book):
+            book['reviews'] = [r for r in (book.get('reviews') or []) if r.get('id') != op['reviewId']]
+            return book
+        return _replace_book(data, op['bookId'], update)
+
+    if kind == 'comment.add':
+        def add_comment(review):
+            comments = list(review.get('comments') or [])
+            if not any(c.get('id') == op['comment']['id'] for c in comments):
+                comments.append(op['comment'])
+            review['comments'] = comments
+            return op['comment']
+        return _replace_book(data, op['bookId'], lambda book: _replace_review(book, op['reviewId'], add_comment))
+
+    if kind == 'comment.delete':
+        def drop_comment(review):
+            review['comments'] = [c for c in (review.get('comments') or []) if c.get('id') != op['commentId']]
+            return review
+        return _replace_book(data, op['bookId'], lambda book: _replace_review(book, op['reviewId'], drop_comment))
+
+    raise ValueError(f'未知的变更类型: {kind}')
+
+
+def generate_group_id(data):
+    while True:
+        gid = f"grp-{uuid.uuid4().hex[:6]}"
+        if gid not in (data.get('groups') or {}):
+            return gid
+
+
+def get_books_by_group(data, group_id):
+    if not group_id:
+        return data['books']
+    index = _index_of(data)
+    if index is not None:
+        return index.books_in_group(group_id)
+    return [b for b in data['books'] if b.get('groupId') == group_id]
+
+
+def group_refresh_ops(data, group_id, group, books):
+    """把内存中某个群组同步成从存储层重新读到的样子所需的变更记录。
+
+    群组只会新增、改名或加入成员，书籍不会换群组，所以比较新增、删除与内容变化即可。
+    """
+    ops = []
+    current = (data.get('groups') or {}).get(group_id)
+    if group is not None:
+        if current is None:
+            ops.append({'op': 'group.create', 'groupId': group_id, 'name': group.get('name'),
+                        'createdAt': group.get('createdAt')})
+        elif current.get('name') != group.get('name'):
+            ops.append({'op': 'group.rename', 'groupId': group_id, 'name': group.get('name')})
+        members = (current or {}).get('members', [])
+        ops.extend({'op': 'member.add', 'groupId': group_id, 'userId': user_id}
+                   for user_id in group.get('members', []) if user_id not in members)
+    loaded = {book['id']: book for book in books}
+    for book in get_books_by_group(data, group_id):
+        if book.get('groupId') == group_id and book.get('id') not in loaded:
+            ops.append({'op': 'book.delete', 'bookId': book.get('id')})
+    for book_id, book in loaded.items():
+        old = find_book(data, book_id)
+        if old is None:
+            ops.append({'op': 'book.add', 'book': book})
+        elif old != book:
+            ops.append({'op': 'book.update', 'bookId': book_id, 'fields': book})
+    return ops
+
+
+def book_view(book, user_id):
+    """列表中的书籍：status 换成当前用户自己的阅读状态"""
+    item = dict(book)
+    user_statuses = book.get('userStatuses') or {}
+    item['status'] = user_statuses.get(user_id, 'candidate') if user_id else book.get('status', 'candidate')
+    return item
+
+
+# 变更接口 slim=1 时返回的字段
+SLIM_BOOK_FIELDS = ('id', 'status', 'voteCount', 'voted', 'reviewCount', 'reviewRating')
+
+# 列表视图（view=summary）默认字段：不含 votes / userStatuses / reviews / resources 等大字段
+BOOK_SUMMARY_FIELDS = (
+    'id', 'title', 'author', 'synopsis', 'rating', 'ratingSource', 'category', 'cover',
+    'addedBy', 'addedAt', 'groupId', 'status',
+    'voteCount', 'voted', 'reviewCount', 'reviewRating', 'doubanUrl'
+)
+
+
+def book_summary(book, user_id):
+    """服务端计算的汇总字段：想读人数、当前用户是否想读、书评数与书评平均分"""
+    votes = book.get('votes') or {}
+    reviews = book.get('reviews') or []
+    ratings = [r['rating'] for r in reviews if isinstance(r.get('rating'), (int, float))]
+    douban = next((r for r in (book.get('resources') or []) if '豆瓣' in str(r.get('name') or '')), None)
+    return {
+        'voteCount': len(votes),
+        'voted': bool(user_id and votes.get(user_id)),
+        'voters': list(votes),
+        'reviewCount': len(reviews),
+        'reviewRating': round(sum(ratings) / len(ratings), 1) if ratings else None,
+        'doubanUrl': douban.get('url', '') if douban else ''
+    }
+
+
+def parse_fields(query_params):
+    """解析 view= 与 fields= 参数，返回要输出的字段元组；None 表示完整视图"""
+    raw = query_params.get('fields', [''])[0]
+    if raw.strip():
+        fields = [field.strip() for field in raw.split(',') if field.strip()]
+        return tuple(['id'] + [field for field in fields if field != 'id'])
+    if query_params.get('view', [''])[0] == 'summary':
+        return BOOK_SUMMARY_FIELDS
+    return None
+
+
+def project_book(book, user_id, fields=None):
+    """按 fields 输出书籍；fields 为 None 时与 book_view 相同"""
+    item = book_view(book, user_id)
+    if fields is None:
+        return item
+    item.update(book_summary(book, user_id))
+    return {key: item[key] for key in fields if key in item}
+
+
+def encode_books_cursor(book):
+    key = json.dumps([book.get('addedAt') or '', book.get('id') or ''], ensure_ascii=False)
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_books_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        added_at, book_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        return str(added_at), str(book_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('cursor 无效')
+
+
+def get_books_page(data, group_id, user_id, fields, limit, cursor=''):
+    """按 (addedAt, id) 排序的游标分页；书籍增删不会导致翻页时重复或遗漏。
+
+    有索引时在维护好的有序键列表上二分定位游标，每页只取 limit 本。
+    """
+    after = decode_books_cursor(cursor) if cursor else None
+    index = _index_of(data)
+    if index is not None:
+        keys = index.page_keys.get(group_id, ()) if group_id else index.all_page_keys
+        start = bisect.bisect_right(keys, after) if after else 0
+        page = [index.books_by_id.get(book_id) for _, book_id in keys[start:start + limit]]
+        page = [book for book in page if book is not None]
+        has_more = start + limit < len(keys)
+    else:
+        books = sorted(get_books_by_group(data, group_id), key=DataIndex.page_key)
+        start = bisect.bisect_right([DataIndex.page_key(b) for b in books], after) if after else 0
+        page = books[start:start + limit]
+        has_more = start + limit < len(books)
+    return {
+        'books': [project_book(book, user_id, fields) for book in page],
+        'nextCursor': encode_books_cursor(page[-1]) if page and has_more else None
+    }
+
+
+def get_books_delta(group_id, user_id, since, fields=None):
+    """增量同步：返回 since 之后新增或变化的书籍与已删除书籍的 id；无法增量时返回完整列表"""
+    version, book_ids = STORE.changes_since(group_id, since)
+    data = read_data()
+    if book_ids is None:
+        return {
+            'version': version,
+            'full': True,
+            'books': [project_book(book, user_id, fields) for book in get_books_by_group(data, group_id)],
+            'deleted': []
+        }
+    books = []
+    deleted = []
+    for book_id in book_ids:
+        book = find_book(data, book_id)
+        if book and (not group_id or book.get('groupId') == group_id):
+            books.append(project_book(book, user_id, fields))
+        else:
+            deleted.append(book_id)
+    return {'version': version, 'full': False, 'books': books, 'deleted': deleted}
+
+
+def _profile_book_entry(book):
+    return {
+        'id': book.get('id'),
+        'title': book.get('title'),
+        'author': book.get('author'),
+        'cover': book.get('cover'),
+        'rating': book.get('rating')
+    }
+
+
+def _overview_book_entry(book):
+    return {
+        'id': book.get('id'),
+        'title': book.get('title'),
+        'author': book.get('author')
+    }
+
+
+def search_group(group_id, query, offset=0, limit=20):
+    """群组内全文检索：书名、作者、简介、书评与评论"""
+    data = read_data()
+    index = _index_of(data)
+    if index is not None:
+        total, hits = index.search.search(group_id, query, offset, limit)
+    else:
+        search = SearchIndex()
+        for book in get_books_by_group(data, group_id):
+            search.update_book(None, book)
+        total, hits = search.search(group_id, query, offset, limit)
+    return {
+        'query': query,
+        'total': total,
+        'hits': hits,
+        'nextOffset': offset + limit if offset + limit < total else None
+    }
+
+
+def build_user_profile(data, user_id, group_id):
+    """个人主页：有索引时读物化视图，只访问该用户书架上的书"""
+    index = _index_of(data)
+    if index is None:
+        return scan_user_profile(data, user_id, group_id)
+    views = index.views
+    shelves = {'candidate': [], 'reading': [], 'finished': []}
+    shelf = views.shelves.get((group_id, user_id)) or {}
+    for book_id in index.ordered(shelf):
+        status, voted = shelf[book_id]
+        # 与 scan_user_profile 相同：在读/已读优先，其余按是否想读计入“想读”
+        shelves[status or 'candidate'].append(_profile_book_entry(index.books_by_id[book_id]))
+
+    reviews = []
+    for book_id in index.ordered(views.user_reviews.get((group_id, user_id)) or {}):
+        book = index.books_by_id[book_id]
+        for review in (book.get('reviews') or []):
+            if review.get('userId') == user_id:
+                reviews.append({
+                    'bookId': book.get('id'),
+                    'bookTitle': book.get('title'),
+                    'reviewId': review.get('id'),
+                    'rating': review.get('rating'),
+                    'content': review.get('content'),
+                    'createdAt': review.get('createdAt')
+                })
+
+    return {
+        'userId': user_id,
+        'groupId': group_id,
+        'shelves': shelves,
+        'reviews': reviews
+    }
 
 
-def generate_group_id(data):
-    while True:
-        gid = f"grp-{uuid.uuid4().hex[:6]}"
-        if gid not in (data.get('groups') or {}):
-            return gid
+def build_group_overview(data, group_id):
+    """群组概览：有索引时读物化视图，耗时与结果大小成正比"""
+    index = _index_of(data)
+    if index is None:
+        return scan_group_overview(data, group_id)
+    views = index.views
+    group = (data.get('groups') or {}).get(group_id) or {}
+    members = group.get('members', [])
+    member_pos = {member: pos for pos, member in enumerate(members)}
 
+    per_user = {}
+    for member in members:
+        lists = per_user[member] = {'candidate': [], 'reading': [], 'finished': []}
+        shelf = views.shelves.get((group_id, member)) or {}
+        for book_id in index.ordered(shelf):
+            status, voted = shelf[book_id]
+            entry = _overview_book_entry(index.books_by_id[book_id])
+            if status:
+                lists[status].append(entry)
+            if voted:
+                lists['candidate'].append(dict(entry))
 
-def get_books_by_group(data, group_id):
-    if not group_id:
-        return data['books']
-    return [b for b in data['books'] if b.get('groupId') == group_id]
+    everyone_reading = []
+    shared = views.shared_reading.get(group_id) or {}
+    for book_id in index.ordered(shared):
+        reading_users = sorted((u for u in shared[book_id] if u in member_pos), key=member_pos.get)
+        if len(reading_users) >= 2:
+            everyone_reading.append(dict(_overview_book_entry(index.books_by_id[book_id]), users=reading_users))
 
+    group_reviews = []
+    for book_id in index.ordered(views.reviewed_books.get(group_id) or {}):
+        book = index.books_by_id[book_id]
+        for review in (book.get('reviews') or []):
+            if review.get('userId') in member_pos:
+                group_reviews.append({
+                    'bookId': book.get('id'),
+                    'bookTitle': book.get('title'),
+                    'userId': review.get('userId'),
+                    'reviewId': review.get('id'),
+                    'content': review.get('content'),
+                    'rating': review.get('rating'),
+                    'createdAt': review.get('createdAt')
+                })
 
-def build_user_profile(data, user_id, group_id):
+    return {
+        'groupId': group_id,
+        'groupName': group.get('name') or group_id,
+        'members': members,
+        'perUserShelves': per_user,
+        'everyoneReading': everyone_reading,
+        'reviews': group_reviews
+    }
+
+
+def scan_user_profile(data, user_id, group_id):
+    """从头遍历群组全部书籍生成个人主页（无索引时使用，也用于校验物化视图）"""
     books = get_books_by_group(data, group_id)
     shelves = {'candidate': [], 'reading': [], 'finished': []}
     reviews = []
@@ -1263,10 +5305,11 @@ def build_user_profile(data, user_id, group_id):
     }
 
 
-def build_group_overview(data, group_id):
-    ensure_group(data, group_id)
+def scan_group_overview(data, group_id):
+    """从头遍历群组全部书籍与成员生成群组概览（无索引时使用，也用于校验物化视图）"""
+    group = (data.get('groups') or {}).get(group_id) or {}
     books = get_books_by_group(data, group_id)
-    members = data['groups'][group_id].get('members', [])
+    members = group.get('members', [])
 
     per_user = {}
     for member in members:
@@ -1323,7 +5366,7 @@ def build_group_overview(data, group_id):
 
     return {
         'groupId': group_id,
-        'groupName': data['groups'][group_id].get('name') or group_id,
+        'groupName': group.get('name') or group_id,
         'members': members,
         'perUserShelves': per_user,
         'everyoneReading': everyone_reading,
@@ -1333,7 +5376,12 @@ def build_group_overview(data, group_id):
 
 def get_user_groups(data, user_id):
     groups = []
-    for gid, g in (data.get('groups') or {}).items():
+    index = _index_of(data)
+    if index is not None:
+        candidates = [(gid, data['groups'].get(gid) or {}) for gid in index.user_groups.get(user_id, ())]
+    else:
+        candidates = list((data.get('groups') or {}).items())
+    for gid, g in candidates:
         if str(gid).startswith('solo:') or gid == 'default':
             continue
         members = g.get('members', [])
@@ -1433,6 +5481,339 @@ def enrich_single_book_payload(payload):
     return enriched
 
 
+def default_bulk_payload(title, author):
+    return {
+        'title': title,
+        'author': author,
+        'category': '文学小说',
+        'synopsis': '暂不自动抓取简介与评分，可点击下方豆瓣链接查看详情。',
+        'rating': None,
+        'ratingSource': '',
+        'cover': '',
+        'resources': [
+            {
+                'name': '豆瓣读书检索',
+                'url': f"https://m.douban.com/search/?query={urllib.parse.quote(f'{title} {author}'.strip())}&type=book",
+                'type': '检索'
+            }
+        ]
+    }
+
+
+class BulkImportManager:
+    """后台批量导入任务。
+
+    每个条目的信息补全在有界线程池中并发进行，完成的条目按批写入数据；
+    任务状态保存在 IMPORT_JOB_DIR 下，服务重启后未完成的任务会继续执行。
+    条目状态：pending → ready（已补全，书籍 id 已确定）→ created / skipped / failed；
+    书籍 id 在入库前落盘，重启后据此判断上一批是否已经写入，不会重复添加。
+    """
+
+    FINAL_STATES = ('created', 'skipped', 'invalid', 'failed')
+
+    def __init__(self, directory, workers, batch_size):
+        self.directory = directory
+        self.batch_size = max(1, batch_size)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix='bulk-import'
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def _save(self, job):
+        with self._lock:
+            job['updatedAt'] = datetime.now(timezone.utc).isoformat()
+            os.makedirs(self.directory, exist_ok=True)
+            _write_json_atomic(self._path(job['id']), job)
+
+    def create(self, data, group_id, added_by, auto_match, raw_entries):
+        entries = []
+        for raw in raw_entries:
+            if isinstance(raw, dict):
+                title = str(raw.get('title', '')).strip()
+                author = str(raw.get('author', '')).strip()
+            else:
+                title, author = parse_bulk_line(raw)
+
+            entry = {'raw': str(raw), 'title': title, 'author': author, 'state': 'pending'}
+            if not title:
+                entry.update(state='invalid', reason='书名为空')
+            elif has_duplicate_book(data, group_id, title, author):
+                entry.update(state='skipped', reason='已存在')
+            entries.append(entry)
+
+        now = datetime.now(timezone.utc).isoformat()
+        job = {
+            'id': uuid.uuid4().hex,
+            'groupId': group_id,
+            'addedBy': added_by,
+            'autoMatch': bool(auto_match),
+            'status': 'queued',
+            'createdAt': now,
+            'updatedAt': now,
+            'entries': entries
+        }
+        self._save(job)
+        with self._lock:
+            self._jobs[job['id']] = job
+        self._start(job)
+        return job
+
+    def get(self, job_id):
+        if not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def summary(self, job):
+        created, skipped, invalid, failed = [], [], [], []
+        for entry in list(job.get('entries') or []):
+            state = entry.get('state')
+            if state == 'created':
+                created.append({'id': entry.get('bookId'), 'title': entry.get('title'), 'author': entry.get('author')})
+            elif state == 'skipped':
+                skipped.append({'title': entry.get('title'), 'author': entry.get('author'), 'reason': entry.get('reason', '')})
+            elif state == 'invalid':
+                invalid.append({'raw': entry.get('raw'), 'reason': entry.get('reason', '')})
+            elif state == 'failed':
+                failed.append({'title': entry.get('title'), 'author': entry.get('author'), 'reason': entry.get('reason', '')})
+        total = len(job.get('entries') or [])
+        return {
+            'jobId': job['id'],
+            'status': job.get('status'),
+            'groupId': job.get('groupId'),
+            'total': total,
+            'processed': len(created) + len(skipped) + len(invalid) + len(failed),
+            'created': created,
+            'skipped': skipped,
+            'invalid': invalid,
+            'failed': failed,
+            'count': len(created),
+            'error': job.get('error'),
+            'createdAt': job.get('createdAt'),
+            'updatedAt': job.get('updatedAt'),
+            'success': job.get('status') != 'failed'
+        }
+
+    def resume(self):
+        """启动时继续执行未完成的任务，并清理过期的已完成任务"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        cutoff = time.time() - IMPORT_JOB_RETENTION
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if job.get('status') in ('done', 'failed'):
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                continue
+            with self._lock:
+                self._jobs[job['id']] = job
+            print(f"🔁 继续批量导入任务 {job['id']}")
+            self._start(job)
+
+    def _start(self, job):
+        threading.Thread(target=self._run, args=(job,), name=f"bulk-{job['id'][:8]}", daemon=True).start()
+
+    def _run(self, job):
+        try:
+            job['status'] = 'running'
+            self._save(job)
+
+            # 上次中断时已补全但未确认入库的条目
+            ready = [e for e in job['entries'] if e['state'] == 'ready']
+            if ready:
+                self._commit(job, ready)
+
+            pending = [e for e in job['entries'] if e['state'] == 'pending']
+            futures = {self._executor.submit(self._prepare, job, entry): entry for entry in pending}
+            batch = []
+            for future in concurrent.futures.as_completed(futures):
+                entry = futures[future]
+                try:
+                    future.result()
+                    batch.append(entry)
+                except Exception as e:
+                    entry.update(state='failed', reason=str(e))
+                if len(batch) >= self.batch_size:
+                    self._commit(job, batch)
+                    batch = []
+            if batch:
+                self._commit(job, batch)
+
+            job['status'] = 'done'
+        except Exception as e:
+            print(f"⚠️ 批量导入任务 {job['id']} 失败: {e}")
+            job['status'] = 'failed'
+            job['error'] = str(e)
+        self._save(job)
+
+    def _prepare(self, job, entry):
+        payload = default_bulk_payload(entry['title'], entry['author'])
+        if job.get('autoMatch'):
+            payload = enrich_single_book_payload(payload)
+        book = create_book_record(payload, job['addedBy'], job['groupId'])
+        # 与 _save 的序列化互斥
+        with self._lock:
+            entry['book'] = book
+            entry['state'] = 'ready'
+
+    def _commit(self, job, batch):
+        # 先落盘补全结果与书籍 id，再入库
+        self._save(job)
+        group_id = job['groupId']
+        outcomes = []
+        try:
+            with data_transaction(group_id) as tx:
+                for op in member_ops(tx.data, group_id, job['addedBy']):
+                    tx.apply(op)
+                for entry in batch:
+                    book = entry['book']
+                    if find_book(tx.data, book['id']):
+                        outcomes.append((entry, {'state': 'created', 'bookId': book['id']}))
+                    elif has_duplicate_book(tx.data, group_id, book.get('title', ''), book.get('author', '')):
+                        outcomes.append((entry, {'state': 'skipped', 'reason': '批量内重复/已存在'}))
+                    else:
+                        tx.apply({'op': 'book.add', 'book': book})
+                        outcomes.append((entry, {'state': 'created', 'bookId': book['id']}))
+        except Exception as e:
+            outcomes = [(entry, {'state': 'failed', 'reason': str(e)}) for entry in batch]
+
+        for entry, update in outcomes:
+            book = entry.pop('book', None) or {}
+            entry['title'] = book.get('title', entry['title'])
+            entry['author'] = book.get('author', entry['author'])
+            entry.update(update)
+        self._save(job)
+
+
+BULK_IMPORTS = BulkImportManager(IMPORT_JOB_DIR, IMPORT_WORKERS, IMPORT_BATCH_SIZE)
+
+
+def parse_byte_range(header, size):
+    """解析单段 Range 头，返回 (start, end)；无法满足返回 None；不支持的格式返回 False（按完整响应处理）"""
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return False
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return False
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+class StaticAssets:
+    """public/ 目录的内存缓存。
+
+    启动时读入全部文件，预先生成 gzip（装有 brotli 时再加 br）版本，并计算强 ETag
+    与 Last-Modified；开发模式（STATIC_DEV=1）下每次请求检查修改时间，文件变化后自动重新加载。
+    """
+
+    def __init__(self, root, dev=False):
+        self.root = os.path.abspath(root)
+        self.dev = dev
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                self._load(os.path.join(folder, name))
+
+    def _rel(self, full_path):
+        return '/' + os.path.relpath(full_path, self.root).replace(os.sep, '/')
+
+    def _load(self, full_path):
+        try:
+            stat = os.stat(full_path)
+            with open(full_path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            with self._lock:
+                self._assets.pop(self._rel(full_path), None)
+            return None
+
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        variants = {'identity': (body, f'"{digest}"')}
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) > 512:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                variants['gzip'] = (compressed, f'"{digest}-gz"')
+            if brotli is not None:
+                compressed = brotli.compress(body)
+                if len(compressed) < len(body):
+                    variants['br'] = (compressed, f'"{digest}-br"')
+
+        asset = {
+            'path': full_path,
+            'mtime': stat.st_mtime,
+            'content_type': content_type,
+            'last_modified': email.utils.formatdate(stat.st_mtime, usegmt=True),
+            'variants': variants,
+        }
+        with self._lock:
+            self._assets[self._rel(full_path)] = asset
+        return asset
+
+    def get(self, url_path):
+        path = urllib.parse.unquote(url_path or '/')
+        if path.endswith('/'):
+            path += 'index.html'
+        with self._lock:
+            asset = self._assets.get(path)
+        if not self.dev:
+            return asset
+
+        if asset is not None:
+            try:
+                if os.stat(asset['path']).st_mtime != asset['mtime']:
+                    asset = self._load(asset['path'])
+            except OSError:
+                asset = self._load(asset['path'])
+            return asset
+        # 开发模式下新加的文件，只允许 public/ 目录内的路径
+        full_path = os.path.abspath(os.path.join(self.root, path.lstrip('/')))
+        if full_path.startswith(self.root + os.sep) and os.path.isfile(full_path):
+            return self._load(full_path)
+        return None
+
+
+STATIC_ASSETS = StaticAssets(PUBLIC_DIR, dev=STATIC_DEV)
+
+
 class BookHandler(http.server.SimpleHTTPRequestHandler):
     """处理 API 和静态文件请求"""
 
@@ -1443,15 +5824,142 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
         """简化日志输出"""
         pass
 
-    def send_json(self, data, status=200):
+    def send_json(self, data, status=200, etag=None):
         """发送 JSON 响应"""
         body = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
         self.send_response(status)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
         self.send_header('Content-Length', len(body))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
         self.end_headers()
         self.wfile.write(body)
 
+    def send_static(self, path, head_only=False):
+        """从 STATIC_ASSETS 发送静态文件：按 Accept-Encoding 选择压缩版本，支持 304 与 Range"""
+        asset = STATIC_ASSETS.get(path)
+        if asset is None:
+            self.send_error(404, 'File not found')
+            return
+        variants = asset['variants']
+
+        # 任一编码版本的 ETag 命中都说明文件未变
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            not_modified = '*' in tags or any(etag in tags for _, etag in variants.values())
+        else:
+            not_modified = self.headers.get('If-Modified-Since') == asset['last_modified']
+
+        range_header = self.headers.get('Range', '')
+        if_range = self.headers.get('If-Range')
+        if if_range and if_range not in (variants['identity'][1], asset['last_modified']):
+            range_header = ''
+
+        encoding = 'identity'
+        if not range_header:
+            accepted = [part.split(';')[0].strip() for part in self.headers.get('Accept-Encoding', '').split(',')]
+            for candidate in ('br', 'gzip'):
+                if candidate in variants and candidate in accepted:
+                    encoding = candidate
+                    break
+        body, etag = variants[encoding]
+
+        status = 200
+        content_range = None
+        if not_modified:
+            status = 304
+        elif range_header:
+            byte_range = parse_byte_range(range_header, len(body))
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(body)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if byte_range is not False:
+                start, end = byte_range
+                status = 206
+                content_range = f'bytes {start}-{end}/{len(body)}'
+                body = body[start:end + 1]
+
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset['last_modified'])
+        self.send_header('Cache-Control', 'no-cache' if asset['content_type'].startswith('text/html') else 'public, max-age=3600')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 304:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', asset['content_type'])
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def open_event_stream(self, group_id, last_event_id):
+        """SSE：发送响应头后把连接交给 EVENT_HUB。
+
+        池化引擎下处理线程立即返回，连接由推送线程管理；线程模式下本线程等待连接结束，
+        同时订阅数受 SSE_THREADED_MAX_SUBSCRIBERS 限制，超出时返回 503，前端退回轮询。
+        """
+        detach = getattr(self.server, 'detaches_streams', False)
+        if not detach and not THREADED_SSE_SLOTS.acquire(blocking=False):
+            self.send_json({'error': '推送连接已满，请稍后重试'}, 503)
+            return
+        try:
+            self._stream_events(group_id, last_event_id, detach)
+        finally:
+            if not detach:
+                THREADED_SSE_SLOTS.release()
+
+    def _stream_events(self, group_id, last_event_id, detach):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.flush()
+
+        done = threading.Event()
+        subscriber = EVENT_HUB.subscribe(
+            group_id, self.connection, last_event_id, self.close if detach else done.set
+        )
+        if subscriber is None:
+            return
+        if detach:
+            self.detached = True
+        else:
+            done.wait()
+
+    def not_modified(self, etag):
+        """请求带的 If-None-Match 与当前版本一致时直接回 304，不再读取和序列化数据"""
+        tags = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if etag not in tags and '*' not in tags:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        return True
+
+    def wants_slim(self):
+        return parse_qs(urlparse(self.path).query).get('slim', [''])[0] in ('1', 'true')
+
+    def send_book(self, book, user_id):
+        """书籍变更的响应：带 slim=1 时只返回汇总字段，不回传整本书"""
+        if self.wants_slim():
+            self.send_json(project_book(book, user_id, SLIM_BOOK_FIELDS))
+        else:
+            self.send_json(book)
+
     def read_body(self):
         """读取请求体 JSON"""
         length = int(self.headers.get('Content-Length', 0))
@@ -1466,17 +5974,31 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
         query_params = parse_qs(parsed.query)
 
         if path == '/api/books':
-            data = read_data()
             group_id = query_params.get('groupId', [''])[0].strip()
             user_id = query_params.get('userId', [''])[0].strip()
-            books = get_books_by_group(data, group_id)
-            result = []
-            for book in books:
-                item = dict(book)
-                user_statuses = book.get('userStatuses') or {}
-                item['status'] = user_statuses.get(user_id, 'candidate') if user_id else book.get('status', 'candidate')
-                result.append(item)
-            self.send_json(result)
+            etag = STORE.etag(group_id)
+            if self.not_modified(etag):
+                return
+            fields = parse_fields(query_params)
+            since = query_params.get('since', [None])[0]
+            if since is not None:
+                self.send_json(get_books_delta(group_id, user_id, since, fields), etag=etag)
+                return
+            data = read_data()
+            limit = query_params.get('limit', [''])[0].strip()
+            cursor = query_params.get('cursor', [''])[0].strip()
+            if limit or cursor:
+                # 分页时返回 {books, nextCursor}；不分页时保持原来的数组格式
+                try:
+                    limit = max(1, min(int(limit or BOOKS_PAGE_MAX), BOOKS_PAGE_MAX))
+                    result = get_books_page(data, group_id, user_id, fields, limit, cursor)
+                except ValueError:
+                    self.send_json({'error': 'limit 或 cursor 无效'}, 400)
+                    return
+                self.send_json(result, etag=etag)
+                return
+            result = [project_book(book, user_id, fields) for book in get_books_by_group(data, group_id)]
+            self.send_json(result, etag=etag)
         elif path == '/api/search-book':
             # 搜索书籍信息
             title = query_params.get('title', [''])[0]
@@ -1491,7 +6013,8 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             if len(query) < 2:
                 self.send_json([])
                 return
-            self.send_json(autocomplete_book(query))
+            group_id = query_params.get('groupId', [''])[0].strip()
+            self.send_json(autocomplete_book(query, group_id))
         elif path.startswith('/api/users/') and path.endswith('/profile'):
             parts = path.strip('/').split('/')
             user_id = parts[2] if len(parts) >= 4 else ''
@@ -1499,8 +6022,11 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             if not user_id or not group_id:
                 self.send_json({'error': '缺少 userId 或 groupId'}, 400)
                 return
+            etag = STORE.etag(group_id)
+            if self.not_modified(etag):
+                return
             data = read_data()
-            self.send_json(build_user_profile(data, user_id, group_id))
+            self.send_json(build_user_profile(data, user_id, group_id), etag=etag)
         elif path.startswith('/api/users/') and path.endswith('/groups'):
             parts = path.strip('/').split('/')
             user_id = parts[2] if len(parts) >= 4 else ''
@@ -1515,15 +6041,85 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             if not group_id:
                 self.send_json({'error': '缺少 groupId'}, 400)
                 return
+            etag = STORE.etag(group_id)
+            if self.not_modified(etag):
+                return
             data = read_data()
-            self.send_json(build_group_overview(data, group_id))
+            self.send_json(build_group_overview(data, group_id), etag=etag)
+        elif path.startswith('/api/groups/') and path.endswith('/search'):
+            parts = path.strip('/').split('/')
+            group_id = urllib.parse.unquote(parts[2]) if len(parts) >= 4 else ''
+            query = query_params.get('q', [''])[0].strip()
+            if not group_id or not query:
+                self.send_json({'error': '缺少 groupId 或 q'}, 400)
+                return
+            try:
+                offset = max(0, int(query_params.get('offset', ['0'])[0] or 0))
+                limit = max(1, min(int(query_params.get('limit', ['20'])[0] or 20), 100))
+            except ValueError:
+                self.send_json({'error': 'offset 或 limit 无效'}, 400)
+                return
+            self.send_json(search_group(group_id, query, offset, limit))
+        elif path.startswith('/api/groups/') and path.endswith('/events'):
+            parts = path.strip('/').split('/')
+            group_id = urllib.parse.unquote(parts[2]) if len(parts) >= 4 else ''
+            if not group_id:
+                self.send_json({'error': '缺少 groupId'}, 400)
+                return
+            last_event_id = self.headers.get('Last-Event-ID') or query_params.get('lastEventId', [''])[0]
+            self.open_event_stream(group_id, last_event_id.strip())
+        elif path.startswith('/api/books/bulk/'):
+            job = BULK_IMPORTS.get(path.rsplit('/', 1)[-1])
+            if not job:
+                self.send_json({'error': '导入任务未找到'}, 404)
+                return
+            self.send_json(BULK_IMPORTS.summary(job))
+        elif path.startswith('/api/books/') and path.count('/') == 3:
+            # 单本书详情（书评、评论、资源等），列表使用 view=summary 时按需获取
+            book_id = path.rsplit('/', 1)[-1]
+            user_id = query_params.get('userId', [''])[0].strip()
+            group_id = book_group_id(book_id)
+            if not group_id:
+                self.send_json({"error": "书籍未找到"}, 404)
+                return
+            etag = STORE.etag(group_id)
+            if self.not_modified(etag):
+                return
+            book = find_book(read_data(), book_id)
+            if not book:
+                self.send_json({"error": "书籍未找到"}, 404)
+                return
+            self.send_json(project_book(book, user_id, parse_fields(query_params)), etag=etag)
         elif path.startswith('/api/'):
             self.send_json({"error": "未找到"}, 404)
         else:
             # 静态文件
-            super().do_GET()
+            self.send_static(path)
+
+    def do_HEAD(self):
+        path = urlparse(self.path).path
+        if path.startswith('/api/'):
+            self.send_error(405)
+            return
+        self.send_static(path, head_only=True)
+
+    def run_write(self, handler):
+        """执行写请求；RequestError 在事务退出之后才转换成错误响应，写回慢客户端时不占用群组锁"""
+        try:
+            handler()
+        except RequestError as e:
+            self.send_json({'error': str(e)}, e.status)
 
     def do_POST(self):
+        self.run_write(self._post)
+
+    def do_PUT(self):
+        self.run_write(self._put)
+
+    def do_DELETE(self):
+        self.run_write(self._delete)
+
+    def _post(self):
         parsed = urlparse(self.path)
         path = parsed.path
 
@@ -1534,14 +6130,12 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             if not user_id:
                 self.send_json({'error': 'userId 不能为空'}, 400)
                 return
-            data = read_data()
-            group_id = generate_group_id(data)
-            ensure_group(data, group_id)
-            if group_name:
-                data['groups'][group_id]['name'] = group_name[:50]
-            ensure_member(data, group_id, user_id)
-            write_data(data)
-            self.send_json({'groupId': group_id, 'groupName': data['groups'][group_id].get('name') or group_id, 'owner': user_id, 'success': True})
+            group_id = generate_group_id(read_data())
+            now = datetime.now(timezone.utc).isoformat()
+            with data_transaction(group_id) as tx:
+                group = tx.apply({'op': 'group.create', 'groupId': group_id, 'name': group_name[:50], 'createdAt': now})
+                tx.apply({'op': 'member.add', 'groupId': group_id, 'userId': user_id, 'createdAt': now})
+            self.send_json({'groupId': group_id, 'groupName': group.get('name') or group_id, 'owner': user_id, 'success': True})
             return
 
         if path == '/api/session/join':
@@ -1551,32 +6145,31 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             if not user_id or not group_id:
                 self.send_json({'error': 'userId 和 groupId 不能为空'}, 400)
                 return
-            data = read_data()
-            ensure_member(data, group_id, user_id)
-            write_data(data)
+            with data_transaction(group_id) as tx:
+                for op in member_ops(tx.data, group_id, user_id):
+                    tx.apply(op)
             self.send_json({'userId': user_id, 'groupId': group_id, 'success': True})
             return
 
         # 添加书籍
         if path == '/api/books':
             body = self.read_body()
-            data = read_data()
             added_by = str(body.get('addedBy', '匿名')).strip() or '匿名'
             group_id = str(body.get('groupId', '')).strip() or f"solo:{added_by}"
-            ensure_member(data, group_id, added_by)
             auto_match = body.get('autoMatch', True)
             payload = dict(body)
             if auto_match:
                 payload = enrich_single_book_payload(payload)
             book = create_book_record(payload, added_by, group_id)
-            data['books'].append(book)
-            write_data(data)
-            self.send_json(book)
+            with data_transaction(group_id) as tx:
+                for op in member_ops(tx.data, group_id, added_by):
+                    tx.apply(op)
+                tx.apply({'op': 'book.add', 'book': book})
+            self.send_book(book, added_by)
             return
 
         if path == '/api/books/bulk':
             body = self.read_body()
-            data = read_data()
             added_by = str(body.get('addedBy', '匿名')).strip() or '匿名'
             group_id = str(body.get('groupId', '')).strip() or f"solo:{added_by}"
             auto_match = body.get('autoMatch', True)
@@ -1585,77 +6178,9 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_json({'error': 'entries 不能为空'}, 400)
                 return
 
-            ensure_member(data, group_id, added_by)
-            created = []
-            skipped = []
-            invalid = []
-            failed = []
-
-            existing = {
-                (str(b.get('groupId', '')).strip(), normalize_key(b.get('title', ''), b.get('author', '')))
-                for b in data.get('books', [])
-            }
-
-            for raw in entries:
-                title = ''
-                author = ''
-                if isinstance(raw, dict):
-                    title = str(raw.get('title', '')).strip()
-                    author = str(raw.get('author', '')).strip()
-                else:
-                    title, author = parse_bulk_line(raw)
-
-                if not title:
-                    invalid.append({'raw': str(raw), 'reason': '书名为空'})
-                    continue
-
-                duplicate_key = (group_id, normalize_key(title, author))
-                if duplicate_key in existing:
-                    skipped.append({'title': title, 'author': author, 'reason': '已存在'})
-                    continue
-
-                payload = {
-                    'title': title,
-                    'author': author,
-                    'category': '文学小说',
-                    'synopsis': '暂不自动抓取简介与评分，可点击下方豆瓣链接查看详情。',
-                    'rating': None,
-                    'ratingSource': '',
-                    'cover': '',
-                    'resources': [
-                        {
-                            'name': '豆瓣读书检索',
-                            'url': f"https://m.douban.com/search/?query={urllib.parse.quote(f'{title} {author}'.strip())}&type=book",
-                            'type': '检索'
-                        }
-                    ]
-                }
-
-                if auto_match:
-                    payload = enrich_single_book_payload(payload)
-
-                final_key = (group_id, normalize_key(payload.get('title', ''), payload.get('author', '')))
-                if final_key in existing:
-                    skipped.append({'title': payload.get('title', title), 'author': payload.get('author', author), 'reason': '批量内重复/已存在'})
-                    continue
-
-                try:
-                    book = create_book_record(payload, added_by, group_id)
-                    data['books'].append(book)
-                    existing.add((group_id, normalize_key(book.get('title', ''), book.get('author', ''))))
-                    created.append({'id': book['id'], 'title': book['title'], 'author': book['author']})
-                except Exception as e:
-                    failed.append({'title': payload.get('title', title), 'author': payload.get('author', author), 'reason': str(e)})
-
-            write_data(data)
-            self.send_json({
-                'created': created,
-                'skipped': skipped,
-                'invalid': invalid,
-                'failed': failed,
-                'count': len(created),
-                'success': True
-            })
+            # 补全信息耗时较长，转为后台任务；前端通过 /api/books/bulk/{jobId} 查询进度
+            job = BULK_IMPORTS.create(read_data(), group_id, added_by, auto_match, entries)
+            self.send_json(BULK_IMPORTS.summary(job), 202)
             return
 
         # 投票
@@ -1663,32 +6188,21 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
         if len(parts) == 4 and parts[0] == 'api' and parts[1] == 'books' and parts[3] == 'vote':
             book_id = parts[2]
             body = self.read_body()
-            data = read_data()
-            book = next((b for b in data['books'] if b['id'] == book_id), None)
-            if not book:
-                self.send_json({"error": "书籍未找到"}, 404)
-                return
             user_id = body.get("userId", "匿名")
-            if user_id in book.get('votes', {}):
-                del book['votes'][user_id]
-            else:
-                if 'votes' not in book:
-                    book['votes'] = {}
-                book['votes'][user_id] = True
-            ensure_member(data, book.get('groupId', 'default'), user_id)
-            write_data(data)
-            self.send_json(book)
+            with data_transaction(book_group_id(book_id)) as tx:
+                book = find_book(tx.data, book_id)
+                if not book:
+                    raise RequestError("书籍未找到", 404)
+                book = tx.apply({'op': 'vote.set', 'bookId': book_id, 'userId': user_id, 'value': user_id not in (book.get('votes') or {})})
+                for op in member_ops(tx.data, book.get('groupId', 'default'), user_id):
+                    tx.apply(op)
+            self.send_book(book, user_id)
             return
 
         # 添加书评
         if len(parts) == 4 and parts[0] == 'api' and parts[1] == 'books' and parts[3] == 'reviews':
             book_id = parts[2]
             body = self.read_body()
-            data = read_data()
-            book = next((b for b in data['books'] if b['id'] == book_id), None)
-            if not book:
-                self.send_json({"error": "书籍未找到"}, 404)
-                return
             review = {
                 "id": str(uuid.uuid4()),
                 "userId": body.get("userId", "匿名"),
@@ -1697,11 +6211,13 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
                 "createdAt": datetime.now(timezone.utc).isoformat(),
                 "comments": []
             }
-            ensure_member(data, book.get('groupId', 'default'), review['userId'])
-            if 'reviews' not in book:
-                book['reviews'] = []
-            book['reviews'].append(review)
-            write_data(data)
+            with data_transaction(book_group_id(book_id)) as tx:
+                book = find_book(tx.data, book_id)
+                if not book:
+                    raise RequestError("书籍未找到", 404)
+                for op in member_ops(tx.data, book.get('groupId', 'default'), review['userId']):
+                    tx.apply(op)
+                tx.apply({'op': 'review.add', 'bookId': book_id, 'review': review})
             self.send_json(review)
             return
 
@@ -1710,31 +6226,25 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             book_id = parts[2]
             review_id = parts[4]
             body = self.read_body()
-            data = read_data()
-            book = next((b for b in data['books'] if b['id'] == book_id), None)
-            if not book:
-                self.send_json({"error": "书籍未找到"}, 404)
-                return
-            review = next((r for r in book.get('reviews', []) if r['id'] == review_id), None)
-            if not review:
-                self.send_json({"error": "书评未找到"}, 404)
-                return
             comment = {
                 "id": str(uuid.uuid4()),
                 "userId": body.get("userId", "匿名"),
                 "content": body.get("content", ""),
                 "createdAt": datetime.now(timezone.utc).isoformat()
             }
-            if 'comments' not in review:
-                review['comments'] = []
-            review['comments'].append(comment)
-            write_data(data)
+            with data_transaction(book_group_id(book_id)) as tx:
+                if not find_book(tx.data, book_id):
+                    raise RequestError("书籍未找到", 404)
+                review_book_id, review = find_review(tx.data, review_id)
+                if review_book_id != book_id:
+                    raise RequestError("书评未找到", 404)
+                tx.apply({'op': 'comment.add', 'bookId': book_id, 'reviewId': review_id, 'comment': comment})
             self.send_json(comment)
             return
 
         self.send_json({"error": "未找到"}, 404)
 
-    def do_PUT(self):
+    def _put(self):
         parsed = urlparse(self.path)
         path = parsed.path
         parts = path.strip('/').split('/')
@@ -1748,46 +6258,42 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             if not new_name:
                 self.send_json({'error': 'groupName 不能为空'}, 400)
                 return
-            data = read_data()
-            ensure_group(data, group_id)
-            members = data['groups'][group_id].get('members', [])
-            if user_id and user_id not in members:
-                self.send_json({'error': '仅群组成员可修改群名'}, 403)
-                return
-            data['groups'][group_id]['name'] = new_name[:50]
-            write_data(data)
-            self.send_json({'groupId': group_id, 'groupName': data['groups'][group_id]['name'], 'success': True})
+            with data_transaction(group_id) as tx:
+                members = ((tx.data.get('groups') or {}).get(group_id) or {}).get('members', [])
+                if user_id and user_id not in members:
+                    raise RequestError('仅群组成员可修改群名', 403)
+                tx.apply({
+                    'op': 'group.rename',
+                    'groupId': group_id,
+                    'name': new_name[:50],
+                    'createdAt': datetime.now(timezone.utc).isoformat()
+                })
+            self.send_json({'groupId': group_id, 'groupName': new_name[:50], 'success': True})
             return
 
         # 更新书籍
         if len(parts) == 3 and parts[0] == 'api' and parts[1] == 'books':
             book_id = parts[2]
             body = self.read_body()
-            data = read_data()
-            book = next((b for b in data['books'] if b['id'] == book_id), None)
-            if not book:
-                self.send_json({"error": "书籍未找到"}, 404)
-                return
             allowed = ['title', 'author', 'synopsis', 'rating', 'ratingSource', 'category', 'cover', 'status']
-            for key in allowed:
-                if key in body:
-                    book[key] = body[key]
-
-            # 用户维度状态
-            user_id = str(body.get('userId', '')).strip()
-            if user_id and body.get('status') in ('candidate', 'reading', 'finished'):
-                if 'userStatuses' not in book or not isinstance(book['userStatuses'], dict):
-                    book['userStatuses'] = {}
-                book['userStatuses'][user_id] = body.get('status')
-                ensure_member(data, book.get('groupId', 'default'), user_id)
-
-            write_data(data)
-            self.send_json(book)
+            fields = {key: body[key] for key in allowed if key in body}
+            with data_transaction(book_group_id(book_id)) as tx:
+                if not find_book(tx.data, book_id):
+                    raise RequestError("书籍未找到", 404)
+                book = tx.apply({'op': 'book.update', 'bookId': book_id, 'fields': fields})
+
+                # 用户维度状态
+                user_id = str(body.get('userId', '')).strip()
+                if user_id and body.get('status') in ('candidate', 'reading', 'finished'):
+                    book = tx.apply({'op': 'status.set', 'bookId': book_id, 'userId': user_id, 'status': body.get('status')})
+                    for op in member_ops(tx.data, book.get('groupId', 'default'), user_id):
+                        tx.apply(op)
+            self.send_book(book, user_id)
             return
 
         self.send_json({"error": "未找到"}, 404)
 
-    def do_DELETE(self):
+    def _delete(self):
         parsed = urlparse(self.path)
         path = parsed.path
         parts = path.strip('/').split('/')
@@ -1795,31 +6301,26 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
         # 删除书籍
         if len(parts) == 3 and parts[0] == 'api' and parts[1] == 'books':
             book_id = parts[2]
-            data = read_data()
-            idx = next((i for i, b in enumerate(data['books']) if b['id'] == book_id), None)
-            if idx is None:
-                self.send_json({"error": "书籍未找到"}, 404)
-                return
-            removed = data['books'].pop(idx)
-            write_data(data)
-            self.send_json(removed)
+            with data_transaction(book_group_id(book_id)) as tx:
+                if not find_book(tx.data, book_id):
+                    raise RequestError("书籍未找到", 404)
+                removed = tx.apply({'op': 'book.delete', 'bookId': book_id})
+            if self.wants_slim():
+                self.send_json({'id': book_id, 'success': True})
+            else:
+                self.send_json(removed)
             return
 
         # 删除书评
         if len(parts) == 5 and parts[0] == 'api' and parts[1] == 'books' and parts[3] == 'reviews':
             book_id = parts[2]
             review_id = parts[4]
-            data = read_data()
-            book = next((b for b in data['books'] if b['id'] == book_id), None)
-            if not book:
-                self.send_json({"error": "书籍未找到"}, 404)
-                return
-            idx = next((i for i, r in enumerate(book.get('reviews', [])) if r['id'] == review_id), None)
-            if idx is None:
-                self.send_json({"error": "书评未找到"}, 404)
-                return
-            book['reviews'].pop(idx)
-            write_data(data)
+            with data_transaction(book_group_id(book_id)) as tx:
+                if not find_book(tx.data, book_id):
+                    raise RequestError("书籍未找到", 404)
+                if find_review(tx.data, review_id)[0] != book_id:
+                    raise RequestError("书评未找到", 404)
+                tx.apply({'op': 'review.delete', 'bookId': book_id, 'reviewId': review_id})
             self.send_json({"success": True})
             return
 
@@ -1828,21 +6329,15 @@ class BookHandler(http.server.SimpleHTTPRequestHandler):
             book_id = parts[2]
             review_id = parts[4]
             comment_id = parts[6]
-            data = read_data()
-            book = next((b for b in data['books'] if b['id'] == book_id), None)
-            if not book:
-                self.send_json({"error": "书籍未找到"}, 404)
-                return
-            review = next((r for r in book.get('reviews', []) if r['id'] == review_id), None)
-            if not review:
-                self.send_json({"error": "书评未找到"}, 404)
-                return
-            idx = next((i for i, c in enumerate(review.get('comments', [])) if c['id'] == comment_id), None)
-            if idx is None:
-                self.send_json({"error": "评论未找到"}, 404)
-                return
-            review['comments'].pop(idx)
-            write_data(data)
+            with data_transaction(book_group_id(book_id)) as tx:
+                if not find_book(tx.data, book_id):
+                    raise RequestError("书籍未找到", 404)
+                review_book_id, review = find_review(tx.data, review_id)
+                if review_book_id != book_id:
+                    raise RequestError("书评未找到", 404)
+                if not any(c['id'] == comment_id for c in review.get('comments', [])):
+                    raise RequestError("评论未找到", 404)
+                tx.apply({'op': 'comment.delete', 'bookId': book_id, 'reviewId': review_id, 'commentId': comment_id})
             self.send_json({"success": True})
             return
 
@@ -1854,14 +6349,270 @@ class ThreadedServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
     allow_reuse_address = True
 
 
+# 慢请求（会访问外部数据源）的请求行前缀，池化引擎中由单独的线程池处理
+SLOW_REQUEST_PREFIXES = (
+    b'GET /api/search-book',
+    b'GET /api/search-suggest',
+    b'POST /api/books ',
+    b'POST /api/books?',
+)
+
+
+class PooledBookHandler(BookHandler):
+    """池化引擎使用的处理器：连接在请求之间保持打开，由 PooledHTTPServer 逐个请求调度"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def read_body(self):
+        self._body_consumed = True
+        return super().read_body()
+
+    def handle_request_once(self):
+        self.detached = False
+        self._body_consumed = False
+        self.headers = None
+        self.handle_one_request()
+        if self.close_connection or self._body_consumed or self.headers is None:
+            return
+        # 没有读取的请求体会被当成下一个请求，先丢弃
+        try:
+            length = int(self.headers.get('Content-Length', 0) or 0)
+        except ValueError:
+            self.close_connection = True
+            return
+        if length:
+            self.rfile.read(length)
+
+    def buffered_head(self):
+        """不阻塞地查看连接上是否已有下一个请求（流水线请求）"""
+        try:
+            self.connection.settimeout(0)
+            return self.rfile.peek(64)
+        except OSError:
+            return b''
+        finally:
+            self.connection.settimeout(REQUEST_TIMEOUT)
+
+    def close(self):
+        try:
+            super().finish()
+        except OSError:
+            pass
+        self.server.shutdown_request(self.connection)
+
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """有界的服务引擎（SERVER_ENGINE=pool）。
+
+    一个选择器线程负责 accept 并等待空闲长连接上的下一个请求；请求到达后按请求行分到
+    两个固定大小的线程池：访问外部数据源的慢请求进 slow 池，其余进 fast 池，搜索高峰
+    不会占满处理投票和读取的线程。池的等待队列满时直接返回 503。
+    """
+
+    allow_reuse_address = True
+    request_queue_size = SERVER_BACKLOG
+    detaches_streams = True
+
+    def __init__(self, server_address, handler_class):
+        super().__init__(server_address, handler_class)
+        self._selector = selectors.DefaultSelector()
+        self._idle = {}
+        self._returns = queue.SimpleQueue()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._running = True
+        self._pools = {
+            'fast': self._start_pool('fast', SERVER_WORKERS),
+            'slow': self._start_pool('slow', SEARCH_WORKERS),
+        }
+
+    def _start_pool(self, name, workers):
+        pool = queue.Queue(maxsize=SERVER_QUEUE_SIZE)
+        for index in range(max(1, workers)):
+            threading.Thread(target=self._worker, args=(pool,), name=f'http-{name}-{index}', daemon=True).start()
+        return pool
+
+    def serve_forever(self, poll_interval=0.5):
+        self.socket.setblocking(False)
+        self._selector.register(self.socket, selectors.EVENT_READ, 'accept')
+        self._selector.register(self._wake_r, selectors.EVENT_READ, 'wake')
+        while self._running:
+            for key, _ in self._selector.select(timeout=poll_interval):
+                if key.data == 'accept':
+                    self._accept()
+                elif key.data == 'wake':
+                    self._take_returns()
+                else:
+                    self._selector.unregister(key.fileobj)
+                    self._idle.pop(key.fileobj, None)
+                    self._readable(key.data)
+            self._expire_idle()
+
+    def shutdown(self):
+        self._running = False
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def _accept(self):
+        while True:
+            try:
+                sock, client_address = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            sock.setblocking(True)
+            try:
+                handler = self.RequestHandlerClass(sock, client_address, self)
+            except Exception:
+                self.shutdown_request(sock)
+                continue
+            self._watch(handler)
+
+    def _watch(self, handler):
+        if len(self._idle) >= MAX_IDLE_CONNECTIONS:
+            oldest = min(self._idle, key=lambda s: self._idle[s][1])
+            self._drop(oldest)
+        sock = handler.connection
+        self._selector.register(sock, selectors.EVENT_READ, handler)
+        self._idle[sock] = (handler, time.monotonic())
+
+    def _drop(self, sock):
+        handler, _ = self._idle.pop(sock)
+        self._selector.unregister(sock)
+        handler.close()
+
+    def _expire_idle(self):
+        cutoff = time.monotonic() - KEEPALIVE_TIMEOUT
+        for sock in [s for s, (_, since) in self._idle.items() if since < cutoff]:
+            self._drop(sock)
+
+    def _take_returns(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except OSError:
+            pass
+        while True:
+            try:
+                handler = self._returns.get_nowait()
+            except queue.Empty:
+                return
+            self._watch(handler)
+
+    def _readable(self, handler):
+        try:
+            head = handler.connection.recv(64, socket.MSG_PEEK)
+        except OSError:
+            head = b''
+        if not head:
+            handler.close()
+            return
+        self._dispatch(handler, head)
+
+    @staticmethod
+    def _is_slow(head):
+        """按请求行开头分池。只查看了已到达的字节，请求行被拆成几段到达时，
+        已到达部分若可能是慢请求的开头就按慢请求处理，宁可占用 slow 池也不挤占 fast 池"""
+        if head.startswith(SLOW_REQUEST_PREFIXES):
+            return True
+        return b'\n' not in head and any(prefix.startswith(head) for prefix in SLOW_REQUEST_PREFIXES)
+
+    def _dispatch(self, handler, head):
+        pool = self._pools['slow' if self._is_slow(head) else 'fast']
+        try:
+            pool.put_nowait(handler)
+        except queue.Full:
+            self._reject(handler)
+
+    def _reject(self, handler):
+        body = json.dumps({'error': '服务器繁忙，请稍后重试'}, ensure_ascii=False).encode('utf-8')
+        head = (
+            'HTTP/1.1 503 Service Unavailable\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Retry-After: 1\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode('ascii')
+        # 在选择器线程上执行：只做一次非阻塞 send，发不完就直接关闭，不等慢客户端
+        try:
+            handler.connection.setblocking(False)
+            handler.connection.send(head + body)
+        except OSError:
+            pass
+        handler.close()
+
+    def _worker(self, pool):
+        while True:
+            handler = pool.get()
+            if handler is None:
+                return
+            try:
+                handler.connection.settimeout(REQUEST_TIMEOUT)
+                handler.handle_request_once()
+            except Exception:
+                handler.close_connection = True
+            if handler.detached:
+                # SSE 连接已交给 EVENT_HUB
+                continue
+            if handler.close_connection:
+                handler.close()
+                continue
+            head = handler.buffered_head()
+            if head:
+                self._dispatch(handler, head)
+                continue
+            self._returns.put(handler)
+            self._wake()
+
+    def server_close(self):
+        self._running = False
+        for pool in self._pools.values():
+            for _ in range(SERVER_WORKERS + SEARCH_WORKERS):
+                try:
+                    pool.put_nowait(None)
+                except queue.Full:
+                    break
+        for sock in list(self._idle):
+            self._drop(sock)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        super().server_close()
+
+
+def create_server():
+    if SERVER_ENGINE == 'pool':
+        return PooledHTTPServer(('0.0.0.0', PORT), PooledBookHandler)
+    return ThreadedServer(('0.0.0.0', PORT), BookHandler)
+
+
 if __name__ == '__main__':
     try:
+        CPU_POOL.start()
         _init_postgres_schema()
+        read_data()
+        STORE.start_background_tasks()
+        BULK_IMPORTS.resume()
+        STATIC_ASSETS.load_all()
+        threading.Thread(target=RESOLVED_TITLES.load, args=(LOOKUP_CACHE,), name='title-index', daemon=True).start()
     except Exception as e:
         print(f'❌ 数据存储初始化失败: {e}')
         raise
 
-    server = ThreadedServer(('0.0.0.0', PORT), BookHandler)
+    server = create_server()
     print(f'📚 阅读计划管理工具已启动!')
     print(f'   本地访问: http://localhost:{PORT}')
     print(f'   按 Ctrl+C 停止服务器')
@@ -1870,3 +6621,6 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         print('\n👋 服务器已停止')
         server.server_close()
+        close_postgres_pool()
+        UPSTREAM_HTTP.close()
+        CPU_POOL.close()
@@ -0,0 +1,69 @@
+"""书籍游标分页：按群组维护的 (addedAt, id) 有序键与二分定位"""
+import os
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def book(book_id, group_id, added_at):
+    return {
+        'id': book_id,
+        'title': f'书 {book_id}',
+        'author': '',
+        'groupId': group_id,
+        'addedAt': added_at,
+        'userStatuses': {},
+        'votes': {},
+        'reviews': [],
+        'resources': []
+    }
+
+
+def all_pages_from(data, group_id, limit, cursor):
+    ids = []
+    while cursor:
+        page = server.get_books_page(data, group_id, 'u1', None, limit, cursor)
+        ids.extend(b['id'] for b in page['books'])
+        cursor = page['nextCursor']
+    return ids
+
+
+def all_pages(data, group_id, limit):
+    first = server.get_books_page(data, group_id, 'u1', None, limit)
+    return [b['id'] for b in first['books']] + all_pages_from(data, group_id, limit, first['nextCursor'])
+
+
+class BooksPageTest(unittest.TestCase):
+    def setUp(self):
+        books = [book(f'b{i}', 'g1' if i % 2 else 'g2', f'2024-01-{30 - i:02d}') for i in range(10)]
+        self.raw = {'books': books, 'groups': {}}
+        self.data = server.Dataset(self.raw)
+
+    def test_pages_match_sorted_order(self):
+        expected = [b['id'] for b in sorted(server.get_books_by_group(self.data, 'g1'), key=server.DataIndex.page_key)]
+        self.assertEqual(all_pages(self.data, 'g1', 2), expected)
+        self.assertEqual(len(all_pages(self.data, '', 3)), 10)
+
+    def test_without_index_falls_back_to_sorting(self):
+        self.assertEqual(all_pages(self.raw, 'g1', 2), all_pages(self.data, 'g1', 2))
+
+    def test_keys_follow_mutations(self):
+        first = server.get_books_page(self.data, 'g1', 'u1', None, 2)
+        server.apply_mutation(self.data, {'op': 'book.add', 'book': book('new', 'g1', '2023-12-31')})
+        server.apply_mutation(self.data, {'op': 'book.delete', 'bookId': 'b9'})
+        server.apply_mutation(self.data, {'op': 'book.update', 'bookId': 'b1', 'fields': {'addedAt': '2025-01-01'}})
+        rest = all_pages_from(self.data, 'g1', 2, first['nextCursor'])
+        ids = [b['id'] for b in first['books']] + rest
+        self.assertEqual(ids, ['b9', 'b7', 'b5', 'b3', 'b1'])
+        self.assertEqual(self.data.index.page_keys['g1'], sorted(map(server.DataIndex.page_key, server.get_books_by_group(self.data, 'g1'))))
+        self.assertEqual(self.data.index.all_page_keys, sorted(map(server.DataIndex.page_key, self.data['books'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""DataIndex 的书籍位置：删除只记墓碑，位置换算与重建后仍与列表一致"""
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def book(book_id, group_id='g1'):
+    return {
+        'id': book_id,
+        'title': f'书 {book_id}',
+        'author': '',
+        'groupId': group_id,
+        'addedAt': '2024-01-01T00:00:00+00:00',
+        'userStatuses': {},
+        'votes': {},
+        'reviews': [],
+        'resources': []
+    }
+
+
+class BookPositionTest(unittest.TestCase):
+    def assert_positions(self, data):
+        index = data.index
+        for pos, b in enumerate(data['books']):
+            self.assertEqual(index.position(b['id']), pos)
+        ids = [b['id'] for b in data['books']]
+        self.assertEqual(index.ordered(reversed(ids)), ids)
+
+    def test_positions_survive_deletes_and_compaction(self):
+        rng = random.Random(7)
+        data = server.Dataset({'books': [book(f'b{i}', f'g{i % 3}') for i in range(300)], 'groups': {}})
+        next_id = 300
+        compacted = False
+        for _ in range(600):
+            ids = [b['id'] for b in data['books']]
+            roll = rng.random()
+            if roll < 0.5 and ids:
+                server.apply_mutation(data, {'op': 'book.delete', 'bookId': rng.choice(ids)})
+                compacted = compacted or not data.index._removed
+            elif roll < 0.8:
+                server.apply_mutation(data, {'op': 'book.add', 'book': book(f'b{next_id}')})
+                next_id += 1
+            elif ids:
+                book_id = rng.choice(ids)
+                server.apply_mutation(data, {'op': 'vote.set', 'bookId': book_id, 'userId': 'u1', 'value': True})
+                self.assertEqual(server.find_book(data, book_id)['votes'], {'u1': True})
+            self.assertLessEqual(len(data.index._removed), max(64, len(data['books']) ** 0.5))
+        self.assertTrue(compacted)
+        self.assert_positions(data)
+
+    def test_delete_keeps_other_books_in_order(self):
+        data = server.Dataset({'books': [book(f'b{i}') for i in range(5)], 'groups': {}})
+        server.apply_mutation(data, {'op': 'book.delete', 'bookId': 'b1'})
+        server.apply_mutation(data, {'op': 'book.delete', 'bookId': 'b3'})
+        server.apply_mutation(data, {'op': 'book.add', 'book': book('b5')})
+        self.assertEqual([b['id'] for b in data['books']], ['b0', 'b2', 'b4', 'b5'])
+        self.assertEqual(data.index._removed, [1, 3])
+        self.assert_positions(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
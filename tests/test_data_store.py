@@ -0,0 +1,430 @@
+"""DataStore 事务：未提交数据的可见性、落盘内容、群组锁、版本冲突重试与重新加载"""
+import copy
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='reading-club-test-')
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def book(book_id, group_id='g1', title=None):
+    return {
+        'id': book_id,
+        'title': title or f'书 {book_id}',
+        'author': '作者',
+        'groupId': group_id,
+        'addedAt': '2024-01-01T00:00:00+00:00',
+        'userStatuses': {},
+        'votes': {},
+        'reviews': [],
+        'resources': []
+    }
+
+
+def add_op(book_id, group_id='g1'):
+    return {'op': 'book.add', 'book': book(book_id, group_id)}
+
+
+class FailingFileBackend(server.JsonFileBackend):
+    def __init__(self, path):
+        super().__init__(path)
+        self.fail = False
+
+    def persist(self, data, ops):
+        if self.fail:
+            raise OSError('磁盘已满')
+        return super().persist(data, ops)
+
+
+class FakeHandle:
+    def __init__(self, db, group_id):
+        self.db = db
+        self.group_id = group_id
+        self.version = db.versions.get(group_id, 0)
+
+    def commit(self, ops):
+        if self.db.fail_commit:
+            raise ConnectionError('连接中断')
+        for op in ops:
+            server.apply_mutation(self.db.data, op)
+        self.db.versions[self.group_id] = self.version + 1
+        self.db.stamp_value += 1
+        return self.version + 1, self.db.stamp_value
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+
+class FakeDatabase:
+    """模拟 PostgresBackend：begin() 前可以插入“其它实例”的提交"""
+
+    refresh_interval = 0
+
+    def __init__(self):
+        self.data = {'books': [], 'groups': {}}
+        self.versions = {}
+        self.stamp_value = 0
+        self.loads = 0
+        self.rollbacks = 0
+        self.foreign_writes = 0
+        self.fail_commit = False
+
+    def load(self):
+        self.loads += 1
+        return copy.deepcopy(self.data), self.stamp_value, dict(self.versions)
+
+    def stamp(self):
+        return self.stamp_value
+
+    def begin(self, group_id):
+        if self.foreign_writes:
+            self.foreign_writes -= 1
+            self.versions[group_id] = self.versions.get(group_id, 0) + 1
+            self.stamp_value += 1
+        return FakeHandle(self, group_id)
+
+
+class FileStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='reading-club-store-')
+        self.path = os.path.join(self.tmp, 'books.json')
+        self.backend = FailingFileBackend(self.path)
+        self.store = server.DataStore(self.backend)
+
+    def read_file_ids(self):
+        with open(self.path, encoding='utf-8') as f:
+            return [b['id'] for b in json.load(f)['books']]
+
+    def run_in_thread(self, fn):
+        result = {}
+
+        def target():
+            try:
+                result['value'] = fn()
+            except BaseException as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        return thread, result
+
+
+class TransactionVisibilityTest(FileStoreTestCase):
+    def test_uncommitted_changes_are_private(self):
+        applied = threading.Event()
+        release = threading.Event()
+
+        def writer():
+            with self.store.transaction('g1') as tx:
+                tx.apply(add_op('a'))
+                self.assertIsNotNone(server.find_book(tx.data, 'a'))
+                applied.set()
+                release.wait(5)
+
+        thread, result = self.run_in_thread(writer)
+        self.assertTrue(applied.wait(5))
+        self.assertIsNone(server.find_book(self.store.get(), 'a'))
+        release.set()
+        thread.join(5)
+        self.assertNotIn('error', result)
+        self.assertIsNotNone(server.find_book(self.store.get(), 'a'))
+        self.assertEqual(self.read_file_ids(), ['a'])
+
+    def test_other_group_commit_does_not_persist_uncommitted_changes(self):
+        applied = threading.Event()
+        release = threading.Event()
+
+        def failing_writer():
+            with self.store.transaction('g1') as tx:
+                tx.apply(add_op('a', 'g1'))
+                applied.set()
+                release.wait(5)
+                raise ValueError('处理失败')
+
+        thread, result = self.run_in_thread(failing_writer)
+        self.assertTrue(applied.wait(5))
+        with self.store.transaction('g2') as tx:
+            tx.apply(add_op('b', 'g2'))
+        self.assertEqual(self.read_file_ids(), ['b'])
+
+        release.set()
+        thread.join(5)
+        self.assertIsInstance(result.get('error'), ValueError)
+        data = self.store.get()
+        self.assertIsNone(server.find_book(data, 'a'))
+        self.assertIsNotNone(server.find_book(data, 'b'))
+        self.assertEqual(self.read_file_ids(), ['b'])
+
+    def test_failed_persist_leaves_memory_unchanged(self):
+        with self.store.transaction('g1') as tx:
+            tx.apply(add_op('a'))
+        self.backend.fail = True
+        with self.assertRaises(OSError):
+            with self.store.transaction('g1') as tx:
+                tx.apply(add_op('b'))
+                tx.apply({'op': 'vote.set', 'bookId': 'a', 'userId': 'u1', 'value': True})
+        self.backend.fail = False
+        data = self.store.get()
+        self.assertIsNone(server.find_book(data, 'b'))
+        self.assertEqual(server.find_book(data, 'a')['votes'], {})
+        self.assertEqual(self.read_file_ids(), ['a'])
+
+    def test_index_follows_published_changes(self):
+        with self.store.transaction('g1') as tx:
+            tx.apply(add_op('a'))
+            tx.apply({'op': 'member.add', 'groupId': 'g1', 'userId': 'u1'})
+        data = self.store.get()
+        self.assertEqual([b['id'] for b in server.get_books_by_group(data, 'g1')], ['a'])
+        self.assertEqual(data.index.user_groups.get('u1'), frozenset({'g1'}))
+        self.assertEqual(self.store.group_version('g1'), 1)
+
+
+class TransactionIndexTest(FileStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.store.transaction('g2') as tx:
+            tx.apply(add_op('x', 'g2'))
+        with self.store.transaction('g1') as tx:
+            for book_id in ('a', 'b', 'c'):
+                tx.apply(add_op(book_id))
+
+    def test_lookups_after_apply_use_the_overlay_index(self):
+        with self.store.transaction('g1') as tx:
+            tx.apply(add_op('d'))
+            self.assertIsInstance(tx.data.index, server.TransactionIndex)
+            tx.apply({'op': 'book.delete', 'bookId': 'b'})
+            tx.apply({'op': 'review.add', 'bookId': 'c',
+                      'review': {'id': 'r1', 'userId': 'u1', 'content': '好', 'rating': 5, 'comments': []}})
+            tx.apply({'op': 'member.add', 'groupId': 'g1', 'userId': 'u1'})
+            self.assertIsNone(server.find_book(tx.data, 'b'))
+            self.assertEqual(server.find_review(tx.data, 'r1')[0], 'c')
+            self.assertTrue(server.has_duplicate_book(tx.data, 'g1', '书 d', '作者'))
+            self.assertFalse(server.has_duplicate_book(tx.data, 'g1', '书 b', '作者'))
+            self.assertEqual([b['id'] for b in server.get_books_by_group(tx.data, 'g1')], ['a', 'c', 'd'])
+            self.assertEqual(tx.data.index.user_groups.get('u1'), frozenset({'g1'}))
+            # 已提交的数据与索引不受影响
+            committed = self.store.get()
+            self.assertIsNotNone(server.find_book(committed, 'b'))
+            self.assertIsNone(server.find_review(committed, 'r1')[0])
+        data = self.store.get()
+        self.assertEqual([b['id'] for b in data['books']], ['x', 'a', 'c', 'd'])
+        self.assertEqual(server.find_book(data, 'c')['reviews'][0]['id'], 'r1')
+
+    def test_positions_survive_deletes_in_other_groups(self):
+        applied = threading.Event()
+        release = threading.Event()
+
+        def writer():
+            with self.store.transaction('g1') as tx:
+                tx.apply({'op': 'vote.set', 'bookId': 'a', 'userId': 'u1', 'value': True})
+                applied.set()
+                release.wait(5)
+                tx.apply({'op': 'vote.set', 'bookId': 'c', 'userId': 'u1', 'value': True})
+                self.assertEqual(server.find_book(tx.data, 'c')['votes'], {'u1': True})
+
+        thread, result = self.run_in_thread(writer)
+        self.assertTrue(applied.wait(5))
+        # 其它群组删掉排在前面的书，已提交列表中的位置整体前移
+        with self.store.transaction('g2') as tx:
+            tx.apply({'op': 'book.delete', 'bookId': 'x'})
+        release.set()
+        thread.join(5)
+        self.assertNotIn('error', result)
+        data = self.store.get()
+        self.assertEqual([b['id'] for b in data['books']], ['a', 'b', 'c'])
+        self.assertEqual(server.find_book(data, 'c')['votes'], {'u1': True})
+
+
+class TransactionLockingTest(FileStoreTestCase):
+    def hold_transaction(self, group_id):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def holder():
+            with self.store.transaction(group_id):
+                entered.set()
+                release.wait(5)
+
+        thread, _ = self.run_in_thread(holder)
+        self.assertTrue(entered.wait(5))
+        return thread, release
+
+    def test_same_group_transactions_are_serialized(self):
+        thread, release = self.hold_transaction('g1')
+        entered = threading.Event()
+
+        def second():
+            with self.store.transaction('g1'):
+                entered.set()
+
+        other, _ = self.run_in_thread(second)
+        self.assertFalse(entered.wait(0.2))
+        release.set()
+        self.assertTrue(entered.wait(5))
+        thread.join(5)
+        other.join(5)
+
+    def test_other_groups_are_not_blocked(self):
+        thread, release = self.hold_transaction('g1')
+        try:
+            with self.store.transaction('g2') as tx:
+                tx.apply(add_op('b', 'g2'))
+        finally:
+            release.set()
+            thread.join(5)
+        self.assertIsNotNone(server.find_book(self.store.get(), 'b'))
+
+    def test_request_error_releases_group_lock(self):
+        with self.assertRaises(server.RequestError) as ctx:
+            with self.store.transaction('g1'):
+                raise server.RequestError('书籍未找到', 404)
+        self.assertEqual(ctx.exception.status, 404)
+        thread, release = self.hold_transaction('g1')
+        release.set()
+        thread.join(5)
+
+
+class ReloadTest(FileStoreTestCase):
+    def test_external_file_change_is_reloaded(self):
+        with self.store.transaction('g1') as tx:
+            tx.apply(add_op('a'))
+        server._write_json_atomic(self.path, {'books': [book('x'), book('y')], 'groups': {}})
+        data = self.store.get()
+        self.assertIsNone(server.find_book(data, 'a'))
+        self.assertEqual([b['id'] for b in data['books']], ['x', 'y'])
+
+
+class VersionRetryTest(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDatabase()
+        self.store = server.DataStore(self.db)
+        self.store.get()
+
+    def test_foreign_commit_triggers_reload_and_retry(self):
+        self.db.foreign_writes = 1
+        with self.store.transaction('g1') as tx:
+            tx.apply(add_op('a'))
+        self.assertEqual(self.db.rollbacks, 1)
+        self.assertEqual(self.db.loads, 2)
+        self.assertEqual(self.store.group_version('g1'), 2)
+        self.assertIsNotNone(server.find_book(self.store.get(), 'a'))
+
+    def test_gives_up_after_repeated_conflicts(self):
+        self.db.foreign_writes = 3
+        with self.assertRaises(RuntimeError):
+            with self.store.transaction('g1') as tx:
+                tx.apply(add_op('a'))
+        self.assertEqual(self.db.rollbacks, 3)
+        self.assertIsNone(server.find_book(self.store.get(), 'a'))
+
+    def test_failed_commit_is_not_rolled_back_again(self):
+        self.db.fail_commit = True
+        with self.assertRaises(ConnectionError):
+            with self.store.transaction('g1') as tx:
+                tx.apply(add_op('a'))
+        self.assertEqual(self.db.rollbacks, 0)
+        self.assertIsNone(server.find_book(self.store.get(), 'a'))
+
+
+class IncrementalDatabase(FakeDatabase):
+    """带 load_groups 的 FakeDatabase：按间隔检查版本号，只读取版本号变了的群组"""
+
+    refresh_interval = 0.01
+
+    def __init__(self):
+        super().__init__()
+        self.group_loads = []
+        self.stamp_under_lock = []
+
+    def stamp(self):
+        # 另一个线程能拿到 DATA_LOCK，说明查询版本号时调用方没有持有它
+        acquired = []
+        probe = threading.Thread(target=lambda: acquired.append(server.DATA_LOCK.acquire(timeout=1)))
+        probe.start()
+        probe.join()
+        if acquired[0]:
+            server.DATA_LOCK.release()
+        self.stamp_under_lock.append(not acquired[0])
+        return self.stamp_value
+
+    def load_groups(self, known_versions):
+        changed = [gid for gid, v in self.versions.items() if known_versions.get(gid, 0) != v]
+        self.group_loads.append(changed)
+        data = copy.deepcopy(self.data)
+        loaded = {gid: (data['groups'].get(gid), [b for b in data['books'] if b['groupId'] == gid]) for gid in changed}
+        return self.stamp_value, dict(self.versions), loaded
+
+    def foreign_commit(self, group_id, *ops):
+        for op in ops:
+            server.apply_mutation(self.data, op)
+        self.versions[group_id] = self.versions.get(group_id, 0) + 1
+        self.stamp_value += 1
+
+
+class IncrementalReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.db = IncrementalDatabase()
+        self.db.foreign_commit('g1', add_op('a', 'g1'))
+        self.db.foreign_commit('g2', add_op('b', 'g2'))
+        self.store = server.DataStore(self.db)
+        self.store.get()
+
+    def wait_for_poll(self):
+        threading.Event().wait(self.db.refresh_interval * 2)
+        return self.store.get()
+
+    def test_only_changed_groups_are_reloaded(self):
+        untouched = server.find_book(self.store.get(), 'a')
+        self.db.foreign_commit('g2', add_op('c', 'g2'), {'op': 'book.delete', 'bookId': 'b'},
+                               {'op': 'member.add', 'groupId': 'g2', 'userId': 'u1'})
+        data = self.wait_for_poll()
+        self.assertEqual(self.db.loads, 1)
+        self.assertEqual(self.db.group_loads, [['g2']])
+        self.assertEqual([b['id'] for b in server.get_books_by_group(data, 'g2')], ['c'])
+        self.assertIsNone(server.find_book(data, 'b'))
+        self.assertIs(server.find_book(data, 'a'), untouched)
+        self.assertEqual(data.index.user_groups.get('u1'), frozenset({'g2'}))
+        self.assertEqual(self.store.group_version('g2'), 2)
+        self.assertTrue(self.db.stamp_under_lock)
+        self.assertFalse(any(self.db.stamp_under_lock))
+
+    def test_own_commits_do_not_trigger_reload(self):
+        with self.store.transaction('g1') as tx:
+            tx.apply(add_op('d', 'g1'))
+        self.wait_for_poll()
+        self.assertEqual(self.db.group_loads, [])
+        self.assertEqual(self.db.loads, 1)
+
+    def test_etags_change_after_foreign_commit(self):
+        etag, group_etag = self.store.etag(), self.store.etag('g2')
+        self.db.foreign_commit('g2', add_op('c', 'g2'))
+        threading.Event().wait(self.db.refresh_interval * 2)
+        self.assertNotEqual(self.store.etag('g2'), group_etag)
+        self.assertNotEqual(self.store.etag(), etag)
+        self.assertEqual(self.db.loads, 1)
+
+    def test_delta_tokens_expire_after_foreign_commit(self):
+        token, _ = self.store.changes_since('g2', '')
+        self.db.foreign_commit('g2', add_op('c', 'g2'))
+        threading.Event().wait(self.db.refresh_interval * 2)
+        self.assertIsNone(self.store.changes_since('g2', token)[1])
+
+    def test_conflict_retry_reloads_only_that_group(self):
+        self.db.foreign_writes = 1
+        with self.store.transaction('g1') as tx:
+            tx.apply(add_op('e', 'g1'))
+        self.assertEqual(self.db.loads, 1)
+        self.assertEqual(self.db.group_loads, [['g1']])
+        self.assertEqual(self.db.rollbacks, 1)
+        self.assertIsNotNone(server.find_book(self.store.get(), 'e'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""豆瓣详情页下载缓冲：分块喂入时的停止位置与拼接出的文本"""
+import os
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+PAGE = '''<html><head><meta property="og:title" content="三体" /></head><body>
+<h1><span property="v:itemreviewed">三体</span></h1>
+<div id="info"><span class="pl">作者</span>: <a>刘慈欣</a><br/></div>
+<strong class="ll rating_num" property="v:average"> 9.3 </strong>
+<h2><span>豆瓣成员常用的标签</span></h2><div>科幻</div>
+<h2><span class="">内容简介</span></h2>
+<div class="related_info"><div class="intro"><p>文化大革命如火如荼进行的同时……</p></div></div>
+<h2><span>作者简介</span></h2>
+<div class="intro"><p>刘慈欣，科幻作家。</p></div>
+''' + '<p>填充</p>' * 2000 + '</body></html>'
+
+
+def feed(buffer, data, size):
+    for i in range(0, len(data), size):
+        if buffer.feed_bytes(data[i:i + size]):
+            return i + size
+    return None
+
+
+class DoubanDetailBufferTest(unittest.TestCase):
+    def test_stops_where_extractor_stops(self):
+        data = PAGE.encode('utf-8')
+        for size in (1, 7, 64, 4096):
+            buffer = server.DoubanDetailBuffer()
+            extractor = server.DoubanDetailExtractor()
+            # 缓冲在读到 "<h2" 时即停止，解析器要等到整个标签，最多早一个分块
+            stop = feed(buffer, data, size)
+            self.assertIn(feed(extractor, data, size) - stop, (0, size))
+            self.assertTrue(buffer.done)
+            self.assertEqual(buffer.text, data[:len(buffer.text.encode('utf-8'))].decode('utf-8'))
+            self.assertEqual(server.extract_douban_detail(buffer.text), extractor.result())
+
+    def test_scan_tail_stays_small(self):
+        buffer = server.DoubanDetailBuffer()
+        data = ('<p>无关内容</p>' * 5000).encode('utf-8')
+        feed(buffer, data, 100)
+        self.assertFalse(buffer.done)
+        self.assertLessEqual(len(buffer._tail), 2)
+        self.assertEqual(buffer.text.encode('utf-8'), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
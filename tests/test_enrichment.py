@@ -0,0 +1,83 @@
+"""搜索候选的并发补充：补充数量、作品简介、资源合并与时限"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def candidate(i, **fields):
+    item = {'title': f'Book {i}', 'author': 'Someone', 'synopsis': '', 'cover': '', 'rating': None,
+            'category': '', 'resources': [], '_work_key': f'/works/OL{i}W'}
+    item.update(fields)
+    return item
+
+
+GB_ITEM = {'volumeInfo': {'description': 'A long enough description of the book.', 'categories': ['Fiction'],
+                          'imageLinks': {'thumbnail': 'https://example.com/c.jpg'}, 'averageRating': 4.2},
+           'id': 'gb1'}
+OL_DOC = {'key': '/works/OL1W', 'title': 'Book', 'subject': ['Fiction'], 'cover_i': 1}
+
+
+class Calls:
+    def __init__(self, result):
+        self.result = result
+        self.args = []
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.args.append(args)
+        return self.result
+
+
+class EnrichCandidatesTest(unittest.TestCase):
+    def patched(self, gb, ol, work):
+        return mock.patch.multiple(server, fetch_googlebooks_best_item=gb, fetch_openlibrary_best_doc=ol,
+                                   fetch_work_description=work, source_available=lambda source: True)
+
+    def test_only_first_candidates_are_enriched_and_rest_get_work_descriptions(self):
+        gb, ol, work = Calls(None), Calls(None), Calls('Work description')
+        items = [candidate(i) for i in range(8)]
+        with self.patched(gb, ol, work):
+            results = server.enrich_candidates(items, 'Book', '', limit=6, describe_rest=True)
+        self.assertEqual(sorted(args[0] for args in gb.args), [f'Book {i}' for i in range(6)])
+        self.assertEqual([r['synopsis'] for r in results[6:]], ['Work description'] * 2)
+
+    def test_resources_are_merged_after_core_fields_are_complete(self):
+        gb, ol, work = Calls(GB_ITEM), Calls(OL_DOC), Calls('')
+        with self.patched(gb, ol, work):
+            result = server.enrich_candidates([candidate(1)], 'Book', '')[0]
+        names = [r.get('name') for r in result['resources']]
+        self.assertIn('Open Library 页面', names)
+        self.assertEqual(result['synopsis'], GB_ITEM['volumeInfo']['description'])
+
+    def test_queries_queued_past_the_deadline_are_not_sent(self):
+        session = server.EnrichmentSession(0)
+        fn = Calls('x')
+        future = session.submit('googlebooks.best', 'k', fn)
+        with self.assertRaises(Exception):
+            future.result(5)
+        self.assertEqual(fn.args, [])
+
+    def test_abandon_cancels_queued_queries(self):
+        session = server.EnrichmentSession(5)
+        release = threading.Event()
+        blockers = [session.submit('block', i, release.wait, 5) for i in range(server.LOOKUP_EXECUTOR._max_workers)]
+        queued = session.submit('googlebooks.best', 'k', Calls('x'))
+        session.abandon()
+        release.set()
+        self.assertTrue(queued.cancelled())
+        for future in blockers:
+            future.result(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""SSE 推送：threaded 引擎下并发订阅数受限，断开后名额归还"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def open_stream(port):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    sock.sendall(b'GET /api/groups/g1/events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    return sock, sock.recv(4096)
+
+
+class ThreadedSubscriberLimitTest(unittest.TestCase):
+    def setUp(self):
+        self.httpd = server.ThreadedServer(('127.0.0.1', 0), server.BookHandler)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        patcher = mock.patch.object(server, 'THREADED_SSE_SLOTS', threading.BoundedSemaphore(1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.httpd.server_close)
+        self.addCleanup(self.httpd.shutdown)
+
+    def test_extra_subscriber_gets_503_until_a_slot_frees(self):
+        first, head = open_stream(self.port)
+        self.assertIn(b' 200 ', head.split(b'\r\n', 1)[0])
+        second, head = open_stream(self.port)
+        second.close()
+        self.assertIn(b' 503 ', head.split(b'\r\n', 1)[0])
+        first.close()
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            # 推送线程发现连接断开后归还名额
+            server.EVENT_HUB._wake()
+            if server.THREADED_SSE_SLOTS.acquire(timeout=0.1):
+                server.THREADED_SSE_SLOTS.release()
+                break
+        else:
+            self.fail('订阅名额没有归还')
+
+
+if __name__ == '__main__':
+    unittest.main()
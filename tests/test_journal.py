@@ -0,0 +1,63 @@
+"""日志式存储：压缩快照期间的读请求不应把本进程写入的快照当成外部修改"""
+import os
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def book(book_id, group_id='g1'):
+    return {
+        'id': book_id,
+        'title': f'书 {book_id}',
+        'author': '作者',
+        'groupId': group_id,
+        'addedAt': '2024-01-01T00:00:00+00:00',
+        'userStatuses': {},
+        'votes': {},
+        'reviews': [],
+        'resources': []
+    }
+
+
+class CompactionTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp(prefix='reading-club-journal-')
+        self.backend = server.JournalBackend(os.path.join(tmp, 'books.json'), os.path.join(tmp, 'books.journal'))
+        self.store = server.DataStore(self.backend)
+        self.loads = 0
+        load = self.backend.load
+
+        def counting_load():
+            self.loads += 1
+            return load()
+
+        self.backend.load = counting_load
+
+    def test_reads_during_snapshot_write_do_not_reload(self):
+        with self.store.transaction('g1') as tx:
+            tx.apply({'op': 'book.add', 'book': book('a')})
+        loads = self.loads
+        seen = []
+        write_snapshot = self.backend.write_snapshot
+
+        def write_and_read(view):
+            write_snapshot(view)
+            # 快照已替换、版本戳尚未记录时的读请求
+            seen.append([b['id'] for b in self.store.get()['books']])
+
+        self.backend.write_snapshot = write_and_read
+        self.store.compact()
+        self.assertEqual(seen, [['a']])
+        self.assertEqual(self.loads, loads)
+        self.assertEqual([b['id'] for b in self.store.get()['books']], ['a'])
+        self.assertEqual(self.loads, loads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""SERVER_ENGINE=pool 的选择器线程：按请求行分池，以及不阻塞地返回 503"""
+import os
+import socket
+import sys
+import tempfile
+import time
+import unittest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+class FakeHandler:
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        self.connection.close()
+
+
+class DispatchTest(unittest.TestCase):
+    def test_complete_request_lines(self):
+        self.assertTrue(server.PooledHTTPServer._is_slow(b'GET /api/search-book?title=x HTTP/1.1\r\n'))
+        self.assertFalse(server.PooledHTTPServer._is_slow(b'GET /api/books?groupId=g HTTP/1.1\r\n'))
+
+    def test_partial_request_line_that_may_be_slow(self):
+        self.assertTrue(server.PooledHTTPServer._is_slow(b'GET /api/sea'))
+        self.assertTrue(server.PooledHTTPServer._is_slow(b'POST /api/bo'))
+        self.assertFalse(server.PooledHTTPServer._is_slow(b'GET /api/gr'))
+        self.assertFalse(server.PooledHTTPServer._is_slow(b'PUT /api/bo'))
+
+
+class RejectTest(unittest.TestCase):
+    def test_reject_does_not_wait_for_slow_clients(self):
+        ours, client = socket.socketpair()
+        try:
+            # 客户端不读取：先把发送缓冲区塞满
+            ours.setblocking(False)
+            try:
+                while True:
+                    ours.send(b'x' * 65536)
+            except BlockingIOError:
+                pass
+            handler = FakeHandler(ours)
+            started = time.monotonic()
+            server.PooledHTTPServer._reject(None, handler)
+            self.assertLess(time.monotonic() - started, 0.5)
+            self.assertTrue(handler.closed)
+        finally:
+            client.close()
+
+    def test_reject_sends_503(self):
+        ours, client = socket.socketpair()
+        try:
+            server.PooledHTTPServer._reject(None, FakeHandler(ours))
+            self.assertTrue(client.recv(4096).startswith(b'HTTP/1.1 503 '))
+        finally:
+            client.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""群组内全文检索：单个汉字查询走建索引时维护的字到词映射"""
+import os
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def book(book_id, title, synopsis='', group_id='g1'):
+    return {'id': book_id, 'title': title, 'author': '', 'synopsis': synopsis, 'groupId': group_id,
+            'reviews': [], 'userStatuses': {}, 'votes': {}}
+
+
+class SingleCharacterSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.index = server.SearchIndex()
+        for b in [book('a', '三体', '地球往事'), book('b', '活着', '福贵的一生'), book('c', '地球', '', 'g2')]:
+            self.index.update_book(None, b)
+
+    def ids(self, query, group_id='g1'):
+        return sorted(hit['bookId'] for hit in self.index.search(group_id, query)[1])
+
+    def test_single_character_matches_terms_containing_it(self):
+        self.assertEqual(self.ids('地'), ['a'])
+        self.assertEqual(self.ids('生'), ['b'])
+        self.assertEqual(self.ids('地', 'g2'), ['c'])
+
+    def test_char_map_follows_updates(self):
+        old = book('b', '活着', '福贵的一生')
+        self.index.update_book(old, book('b', '活着', '人间'))
+        self.assertEqual(self.ids('生'), [])
+        self.assertNotIn('生', self.index.char_terms['g1'])
+        self.index.update_book(book('a', '三体', '地球往事'), None)
+        self.assertEqual(self.ids('地'), [])
+        self.assertEqual(self.ids('地', 'g2'), ['c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""SingleFlight：并发相同调用的合并、异常的分发，以及搜索查询的合并键"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+class Blocking:
+    """第一个调用阻塞到 release 被设置，用来让其它调用成为等待者"""
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.calls += 1
+            first = self.calls == 1
+        if first:
+            self.started.set()
+            self.release.wait(5)
+        return self.outcome(first, *args)
+
+
+def run_concurrently(flight, key, fn, waiters):
+    results = [None] * (waiters + 1)
+
+    def call(i):
+        try:
+            results[i] = ('ok', flight.do(key, fn))
+        except BaseException as e:
+            results[i] = ('error', e)
+
+    leader = threading.Thread(target=call, args=(0,))
+    leader.start()
+    assert fn.started.wait(5)
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(1, waiters + 1)]
+    for thread in threads:
+        thread.start()
+    # 等待者都已挂上同一个调用
+    while flight._calls[key]['waiters'] < waiters:
+        threading.Event().wait(0.01)
+    fn.release.set()
+    for thread in [leader] + threads:
+        thread.join(5)
+    return results
+
+
+class StatusError(server.UpstreamLookupError):
+    """带额外属性、__init__ 参数与 args 不一致的异常，检验复制后属性不丢"""
+
+    def __init__(self, status, url):
+        super().__init__(f'HTTP {status}: {url}')
+        self.status = status
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_waiters_share_result_copies(self):
+        flight = server.SingleFlight()
+        fn = Blocking(lambda first: {'items': [1, 2]})
+        results = run_concurrently(flight, 'k', fn, 3)
+        self.assertEqual(fn.calls, 1)
+        values = [value for _, value in results]
+        self.assertTrue(all(value == {'items': [1, 2]} for value in values))
+        self.assertEqual(len({id(value) for value in values}), 4)
+
+    def test_each_waiter_gets_its_own_exception(self):
+        flight = server.SingleFlight()
+
+        def fail(first):
+            raise StatusError(503, 'https://example.com')
+
+        fn = Blocking(fail)
+        results = run_concurrently(flight, 'k', fn, 3)
+        self.assertEqual(fn.calls, 1)
+        errors = [error for kind, error in results]
+        self.assertTrue(all(kind == 'error' for kind, _ in results))
+        self.assertTrue(all(isinstance(error, StatusError) for error in errors))
+        self.assertTrue(all(error.status == 503 and str(error) == str(errors[0]) for error in errors))
+        self.assertEqual(len({id(error) for error in errors}), 4)
+        for error in errors[1:]:
+            self.assertIs(error.__cause__, errors[0])
+
+    def test_base_exception_stays_with_leader(self):
+        flight = server.SingleFlight()
+
+        def outcome(first):
+            if first:
+                raise KeyboardInterrupt()
+            return 'retried'
+
+        fn = Blocking(outcome)
+        results = run_concurrently(flight, 'k', fn, 2)
+        self.assertEqual(results[0][0], 'error')
+        self.assertIsInstance(results[0][1], KeyboardInterrupt)
+        self.assertEqual([value for _, value in results[1:]], ['retried', 'retried'])
+
+
+class SearchKeyTest(unittest.TestCase):
+    def test_queries_differing_only_in_punctuation_are_not_merged(self):
+        fn = Blocking(lambda first, title, author: [{'title': title}])
+        with mock.patch.object(server, '_search_book_info', fn):
+            first = {}
+            thread = threading.Thread(target=lambda: first.update(value=server.search_book_info('C++', '')))
+            thread.start()
+            self.assertTrue(fn.started.wait(5))
+            second = server.search_book_info('C#', '')
+            fn.release.set()
+            thread.join(5)
+        self.assertEqual(fn.calls, 2)
+        self.assertEqual(first['value'], [{'title': 'C++'}])
+        self.assertEqual(second, [{'title': 'C#'}])
+
+    def test_case_and_whitespace_variants_are_merged(self):
+        fn = Blocking(lambda first, title, author: [{'title': title}])
+        with mock.patch.object(server, '_search_book_info', fn):
+            first = {}
+            thread = threading.Thread(target=lambda: first.update(value=server.search_book_info('Dune', 'Frank Herbert')))
+            thread.start()
+            self.assertTrue(fn.started.wait(5))
+            key = ('search', 'dune', 'frank herbert')
+            result = {}
+            waiter = threading.Thread(target=lambda: result.update(value=server.search_book_info('  DUNE ', 'frank herbert')))
+            waiter.start()
+            while server.INFLIGHT._calls[key]['waiters'] < 1:
+                threading.Event().wait(0.01)
+            fn.release.set()
+            thread.join(5)
+            waiter.join(5)
+        self.assertEqual(fn.calls, 1)
+        self.assertEqual(result['value'], [{'title': 'Dune'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
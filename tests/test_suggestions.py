@@ -0,0 +1,78 @@
+"""书名联想的本地索引：按群组的书名前缀索引与有界的外部书名索引"""
+import os
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='reading-club-test-'))
+os.environ.pop('DATABASE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server  # noqa: E402
+
+
+def book(book_id, group_id, title):
+    return {
+        'id': book_id,
+        'title': title,
+        'author': '',
+        'groupId': group_id,
+        'addedAt': '2024-01-01T00:00:00+00:00',
+        'userStatuses': {},
+        'votes': {},
+        'reviews': [],
+        'resources': []
+    }
+
+
+class GroupTitlesTest(unittest.TestCase):
+    def test_group_books_found_behind_other_groups(self):
+        books = [book(f'o{i}', 'other', f'Harry Potter {i:04d}') for i in range(600)]
+        books.append(book('mine', 'g1', 'Harry Potter Zzz'))
+        data = server.Dataset({'books': books, 'groups': {}})
+        titles = [info['title'] for info in data.index.titles['g1'].complete('harry')]
+        self.assertEqual(titles, ['Harry Potter Zzz'])
+
+    def test_titles_follow_mutations(self):
+        data = server.Dataset({'books': [book('a', 'g1', 'Dune')], 'groups': {}})
+        server.apply_mutation(data, {'op': 'book.add', 'book': book('b', 'g1', 'Dune Messiah')})
+        server.apply_mutation(data, {'op': 'book.update', 'bookId': 'a', 'fields': {'title': 'Children of Dune'}})
+        server.apply_mutation(data, {'op': 'book.delete', 'bookId': 'b'})
+        titles = data.index.titles['g1']
+        self.assertEqual([info['title'] for info in titles.complete('dune')], ['Children of Dune'])
+        self.assertEqual(titles.complete('messiah'), [])
+
+
+class FakeCache:
+    def __init__(self, values):
+        self.values = values
+        self.limits = []
+
+    def hits(self, limit):
+        self.limits.append(limit)
+        return iter(self.values[::-1][:limit])
+
+
+class ResolvedTitlesTest(unittest.TestCase):
+    def test_oldest_titles_are_evicted(self):
+        index = server.ResolvedTitles(3)
+        for title in ['Alpha', 'Beta', 'Gamma', 'Delta']:
+            index.add_resolved({'title': title, 'author': 'X'})
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.complete('alpha'), [])
+        index.add_resolved({'title': 'Beta', 'author': 'X'})
+        index.add_resolved({'title': 'Epsilon', 'author': 'X'})
+        self.assertEqual([info['title'] for info in index.complete('beta')], ['Beta'])
+        self.assertEqual(index.complete('gamma'), [])
+        self.assertEqual(len(index._keys), sum(len(keys) for keys, _ in index._entries.values()))
+
+    def test_load_reads_only_recent_hits(self):
+        cache = FakeCache([{'title': f'Book {i}', 'author': ''} for i in range(10)])
+        index = server.ResolvedTitles(4)
+        self.assertEqual(index.load(cache), 4)
+        self.assertEqual(cache.limits, [4])
+        self.assertEqual(sorted(info['title'] for info in index.complete('book')), ['Book 6', 'Book 7', 'Book 8', 'Book 9'])
+
+
+if __name__ == '__main__':
+    unittest.main()